@@ -4,11 +4,45 @@ Bao gồm:
 - WarpingProcessor: Xử lý hình học ảnh.
 - OMREngine: Nhận diện đáp án.
 - GradeManager: Chấm điểm và xử lý kết quả.
+- ReportGenerator: Xuất thẻ điểm.
+- OverlayCache: Bộ nhớ đệm ảnh kết quả trong phiên.
+- BubbleAtlasStore: Ảnh cắt các câu cần review của phiên.
+- RobustRecognizer: Tier nhận dạng dự phòng (chạy lại khi tier nhanh lỗi / kém tin cậy).
+- SessionStore: Kết quả chấm của phiên (lưu theo cột, phần nặng spill xuống đĩa).
+- BufferPool: Bộ đệm ảnh trung gian dùng lại giữa các tờ.
+- SheetLayout: Bố cục phiếu trả lời (config/layouts), biên dịch sẵn thành mảng chỉ số.
+
+Các lớp được import khi truy cập lần đầu (PEP 562): dùng nhận dạng không phải nạp PIL
+của ReportGenerator, process xuất thẻ điểm không phải nạp phần nhận dạng.
 """
+from typing import TYPE_CHECKING
+from src.utils.lazy_import import lazy_exports
+
+_EXPORTS = {
+    'WarpingProcessor': '.warp_processor',
+    'OMREngine': '.omr_engine',
+    'GradeManager': '.grade_manager',
+    'ReportGenerator': '.report_generator',
+    'OverlayCache': '.overlay_cache',
+    'BubbleAtlasStore': '.bubble_atlas',
+    'RobustRecognizer': '.robust_recognizer',
+    'SessionStore': '.session_store',
+    'BufferPool': '.buffer_pool',
+    'SheetLayout': '.sheet_layout',
+}
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
 
-from .warp_processor import WarpingProcessor
-from .omr_engine import OMREngine
-from .grade_manager import GradeManager
-from .report_generator import ReportGenerator
+if TYPE_CHECKING:
+    from .warp_processor import WarpingProcessor
+    from .omr_engine import OMREngine
+    from .grade_manager import GradeManager
+    from .report_generator import ReportGenerator
+    from .overlay_cache import OverlayCache
+    from .bubble_atlas import BubbleAtlasStore
+    from .robust_recognizer import RobustRecognizer
+    from .session_store import SessionStore
+    from .buffer_pool import BufferPool
+    from .sheet_layout import SheetLayout
 
-__all__ = ['WarpingProcessor', 'OMREngine', 'GradeManager', 'ReportGenerator']
\ No newline at end of file
+__all__ = ['WarpingProcessor', 'OMREngine', 'GradeManager', 'ReportGenerator', 'OverlayCache', 'BubbleAtlasStore',
+           'RobustRecognizer', 'SessionStore', 'BufferPool', 'SheetLayout']
@@ -0,0 +1,131 @@
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+
+def is_uncertain(answer: str, confidence: float, threshold: float) -> bool:
+    """Câu cần người xem lại: độ tin cậy dưới ngưỡng, hoặc bỏ trống với độ tin cậy dưới 2 lần ngưỡng."""
+    return confidence < threshold or (answer == '0' and confidence < threshold * 2)
+
+class BubbleAtlas:
+    """
+    Ảnh cắt (xám) 4 bubble A-D của các câu cần review trên 1 tờ bài, xếp chồng thành
+    1 mảng (n, h, w) cùng kích thước -> vài KB/câu thay vì giữ cả ảnh tờ bài.
+    """
+
+    __slots__ = ('name', 'questions', 'answers', 'confidences', 'crops')
+
+    def __init__(self, name: str, questions: np.ndarray, answers: List[str], confidences: np.ndarray, crops: np.ndarray):
+        self.name = name
+        self.questions = questions       # Chỉ số câu (0-based), int16
+        self.answers = answers           # Đáp án máy đọc được
+        self.confidences = confidences   # float32
+        self.crops = crops               # uint8 (n, h, w)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    @property
+    def nbytes(self) -> int:
+        return self.crops.nbytes + self.questions.nbytes + self.confidences.nbytes
+
+    def crop(self, question: int) -> Optional[np.ndarray]:
+        hits = np.flatnonzero(self.questions == question)
+        return self.crops[hits[0]] if len(hits) else None
+
+def build_atlas(name: str, detection: Dict[str, Any], img_warped_bgr: np.ndarray,
+                answers: Sequence[str], confidences: Sequence[float], threshold: float, pad: int = 4) -> BubbleAtlas:
+    """
+    Cắt vùng các bubble (A-D...) của các câu cần review từ ảnh đã warp (chưa vẽ lưới).
+    Hàng / cột của câu q lấy từ bố cục phiếu (layout.cell_rows, layout.cell_cols).
+    """
+    R = detection['R']
+    x_centers = np.asarray(detection['x_centers'])
+    y_centers = detection['y_centers']
+    layout = detection['layout']
+    # Cột lựa chọn đầu / cuối của từng câu
+    first_x = x_centers[layout.cell_cols[:, 0]]
+    last_x = x_centers[layout.cell_cols[:, -1]]
+
+    questions = [q for q, (ans, conf) in enumerate(zip(answers, confidences)) if is_uncertain(ans, conf, threshold)]
+
+    # Kích thước ô cắt cố định cho cả tờ (nhóm rộng nhất) để xếp chồng thành 1 mảng
+    half_w = int(np.max(last_x - first_x) // 2) + R + pad
+    half_h = R + pad
+    crops = np.full((len(questions), 2 * half_h, 2 * half_w), 255, dtype=np.uint8)
+
+    if questions:
+        gray = cv2.cvtColor(img_warped_bgr, cv2.COLOR_BGR2GRAY) if img_warped_bgr.ndim == 3 else img_warped_bgr
+        H, W = gray.shape
+        for i, q in enumerate(questions):
+            cx = int(first_x[q] + last_x[q]) // 2
+            cy = int(y_centers[layout.cell_rows[q]])
+            x0, y0 = cx - half_w, cy - half_h
+            # Ô sát biên ảnh: phần nằm ngoài giữ màu trắng
+            sx0, sy0 = max(0, x0), max(0, y0)
+            sx1, sy1 = min(W, x0 + 2 * half_w), min(H, y0 + 2 * half_h)
+            if sx1 > sx0 and sy1 > sy0:
+                crops[i, sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = gray[sy0:sy1, sx0:sx1]
+
+    return BubbleAtlas(
+        name=name,
+        questions=np.asarray(questions, dtype=np.int16),
+        answers=[answers[q] for q in questions],
+        confidences=np.asarray([confidences[q] for q in questions], dtype=np.float32),
+        crops=crops
+    )
+
+class BubbleAtlasStore:
+    """
+    Atlas của mọi tờ trong phiên (key theo tên học viên), ScoringWorker ghi và
+    ReviewQueue đọc. Toàn bộ thao tác được khoá (ghi từ worker, đọc từ GUI).
+    """
+
+    def __init__(self):
+        self._items: Dict[str, BubbleAtlas] = {}
+        self._lock = threading.Lock()
+
+    def put(self, atlas: BubbleAtlas):
+        with self._lock:
+            self._items[atlas.name] = atlas
+
+    def get(self, name: str) -> Optional[BubbleAtlas]:
+        with self._lock:
+            return self._items.get(name)
+
+    def resolve(self, name: str, questions: Sequence[int]):
+        """Bỏ các câu đã được người xem quyết định khỏi atlas (không xuất hiện lại trong hàng đợi)."""
+        with self._lock:
+            atlas = self._items.get(name)
+            if atlas is None:
+                return
+            keep = ~np.isin(atlas.questions, np.asarray(list(questions), dtype=np.int16))
+            if keep.all():
+                return
+            self._items[name] = BubbleAtlas(name, atlas.questions[keep], [a for a, k in zip(atlas.answers, keep) if k],
+                                            atlas.confidences[keep], atlas.crops[keep])
+
+    def discard(self, name: str):
+        with self._lock:
+            self._items.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def queue(self, names: Optional[Sequence[str]] = None) -> List[Tuple[float, str, int]]:
+        """Mọi câu cần review của phiên: (confidence, tên, chỉ số câu), tăng dần theo confidence."""
+        with self._lock:
+            atlases = [self._items[n] for n in names if n in self._items] if names is not None else list(self._items.values())
+        items = [(float(conf), atlas.name, int(q))
+                 for atlas in atlases for q, conf in zip(atlas.questions, atlas.confidences)]
+        items.sort()
+        return items
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(atlas.nbytes for atlas in self._items.values())
+
+    def __len__(self) -> int:
+        return len(self._items)
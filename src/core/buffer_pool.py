@@ -0,0 +1,68 @@
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+class BufferPool:
+    """
+    Bộ đệm ảnh trung gian dùng lại giữa các tờ, key theo (tên, shape, dtype).
+
+    get() trả về cùng 1 mảng cho cùng key (nội dung cũ còn nguyên, caller ghi đè qua
+    tham số dst= của OpenCV hoặc out= của NumPy); chỉ cấp phát khi gặp key mới
+    (tờ đầu tiên, hoặc ảnh đầu vào đổi kích thước).
+
+    Mảng lấy từ pool chỉ hợp lệ tới lần gọi get() kế tiếp với cùng tên: dữ liệu cần giữ
+    qua tờ sau (ảnh overlay, atlas...) phải copy ra. Không khoá: mỗi thread dùng pool riêng
+    (1 WarpingProcessor / OMREngine cho 1 ScoringWorker).
+    """
+
+    def __init__(self, max_shapes_per_name: int = 2):
+        # Ảnh khác kích thước luân phiên (VD: 2 máy scan) -> giữ vài shape / tên, bỏ shape cũ nhất
+        self.max_shapes_per_name = max_shapes_per_name
+        self._buffers: Dict[str, Dict[Tuple[Tuple[int, ...], np.dtype], np.ndarray]] = {}
+        self.reset_stats()
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype: Any = np.uint8) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        shapes = self._buffers.setdefault(name, {})
+        key = (tuple(shape), dtype)
+        buffer = shapes.get(key)
+        self.requests += 1
+        if buffer is not None:
+            self.reused_bytes += buffer.nbytes
+            return buffer
+        if len(shapes) >= self.max_shapes_per_name:
+            shapes.pop(next(iter(shapes)))
+        buffer = shapes[key] = np.empty(key[0], dtype=dtype)
+        self.allocations += 1
+        self.allocated_bytes += buffer.nbytes
+        return buffer
+
+    def like(self, name: str, image: np.ndarray) -> np.ndarray:
+        """Bộ đệm cùng shape + dtype với image."""
+        return self.get(name, image.shape, image.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for shapes in self._buffers.values() for buffer in shapes.values())
+
+    def stats(self) -> Dict[str, int]:
+        """Số lần lấy bộ đệm, số lần phải cấp phát mới và dung lượng tương ứng (từ lần reset_stats gần nhất)."""
+        return {
+            'requests': self.requests,
+            'allocations': self.allocations,
+            'allocated_bytes': self.allocated_bytes,
+            'reused_bytes': self.reused_bytes,
+            'resident_bytes': self.nbytes
+        }
+
+    def reset_stats(self):
+        self.requests = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.reused_bytes = 0
+
+    def clear(self):
+        self._buffers.clear()
+
+def pooled(pool: Optional[BufferPool], name: str, shape: Tuple[int, ...], dtype: Any = np.uint8) -> Optional[np.ndarray]:
+    """Bộ đệm từ pool, hoặc None (OpenCV tự cấp phát mảng mới) khi không dùng pool."""
+    return pool.get(name, shape, dtype) if pool is not None else None
@@ -0,0 +1,235 @@
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+import cv2
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from src.utils.logger import app_logger
+from .buffer_pool import BufferPool, pooled
+
+@lru_cache(maxsize=64)
+def circle_mask(roi_h: int, roi_w: int, R: int) -> Tuple[np.ndarray, int]:
+    """
+    Mặt nạ tròn bán kính R-2 tâm (roi_w // 2, roi_h // 2) trong ô roi_h x roi_w (bool, chỉ đọc) + số pixel của nó.
+    Mọi ô trong tờ (trừ ô sát biên) cùng kích thước -> tạo 1 lần thay vì 800 lần / tờ.
+    """
+    mask = np.zeros((roi_h, roi_w), dtype=np.uint8)
+    cv2.circle(mask, (roi_w // 2, roi_h // 2), R - 2, 255, -1)
+    mask = mask == 255
+    mask.flags.writeable = False
+    return mask, int(np.count_nonzero(mask))
+
+def fill_density_reference(img_binary: np.ndarray, center_x: int, center_y: int, R: int) -> float:
+    """
+    Lấy giá trị density (độ đậm) của ô (thuật toán gốc: mặt nạ tròn bán kính R-2 trong ô 2R x 2R).
+    """
+    H, W = img_binary.shape
+    r_start = max(0, center_y - R)
+    r_end = min(H, center_y + R)
+    c_start = max(0, center_x - R)
+    c_end = min(W, center_x + R)
+
+    roi = img_binary[r_start:r_end, c_start:c_end]
+
+    if roi.size == 0: return 0.0
+
+    roi_h = r_end - r_start
+    roi_w = c_end - c_start
+
+    mask, total_circle_pixels = circle_mask(roi_h, roi_w, R)
+    if total_circle_pixels == 0:
+        return 0.0
+
+    # Pixel = 255 nằm trong mặt nạ (như bitwise_and(roi, roi, mask) == 255, không tạo ảnh trung gian)
+    filled_pixels_in_circle = np.count_nonzero((roi == 255) & mask)
+    return filled_pixels_in_circle / total_circle_pixels
+
+class DensityBackend:
+    """
+    Giao diện chung: tính ma trận density (rows x cols) cho lưới tâm ô (x_centers, y_centers).
+
+    tolerance: Sai lệch tuyệt đối tối đa so với thuật toán gốc (fill_density_reference)
+    mà backend cam kết, được kiểm chứng bằng parity test / golden corpus.
+    """
+
+    name = ""
+    tolerance = 0.0
+
+    def compute(self, img_binary: np.ndarray, x_centers: Sequence[int], y_centers: Sequence[int], R: int,
+                pool: Optional[BufferPool] = None) -> np.ndarray:
+        """pool: bộ đệm cho ảnh trung gian cỡ cả tờ (của OMREngine gọi, dùng lại giữa các tờ)."""
+        raise NotImplementedError
+
+class ReferenceBackend(DensityBackend):
+    """Thuật toán gốc, duyệt từng ô (chậm nhất, dùng làm chuẩn so sánh)."""
+
+    name = "reference"
+    tolerance = 0.0
+
+    def compute(self, img_binary, x_centers, y_centers, R, pool=None):
+        density_matrix = np.zeros((len(y_centers), len(x_centers)), dtype=float)
+        for i, center_y in enumerate(y_centers):
+            for j, center_x in enumerate(x_centers):
+                density_matrix[i, j] = fill_density_reference(img_binary, center_x, center_y, R)
+        return density_matrix
+
+class CircleBackend(DensityBackend):
+    """
+    Mặt nạ tròn chính xác như bản gốc nhưng vector hoá: cắt toàn bộ ô bằng sliding window view
+    và đếm pixel trong 1 lần. Ô chạm biên ảnh (mặt nạ bị cắt) được tính lại bằng bản gốc.
+    """
+
+    name = "circle"
+    tolerance = 0.0
+
+    def compute(self, img_binary, x_centers, y_centers, R, pool=None):
+        H, W = img_binary.shape
+        xs = np.asarray(x_centers, dtype=np.intp)
+        ys = np.asarray(y_centers, dtype=np.intp)
+        size = 2 * R
+
+        mask, total = circle_mask(size, size, R)
+        if total == 0 or H < size or W < size:
+            return ReferenceBackend().compute(img_binary, x_centers, y_centers, R)
+
+        filled = np.equal(img_binary, 255, out=pooled(pool, 'density_filled', img_binary.shape, bool))
+        windows = sliding_window_view(filled, (size, size))
+        row_idx = np.clip(ys - R, 0, H - size)
+        col_idx = np.clip(xs - R, 0, W - size)
+        rois = windows[row_idx[:, None], col_idx[None, :]]
+        density_matrix = np.count_nonzero(rois & mask, axis=(2, 3)) / total
+
+        # Ô sát biên: kích thước ROI khác -> dùng lại logic gốc cho đúng tuyệt đối
+        row_edge = (ys - R < 0) | (ys + R > H)
+        col_edge = (xs - R < 0) | (xs + R > W)
+        if row_edge.any() or col_edge.any():
+            for i, j in zip(*np.nonzero(row_edge[:, None] | col_edge[None, :])):
+                density_matrix[i, j] = fill_density_reference(img_binary, int(xs[j]), int(ys[i]), R)
+        return density_matrix
+
+class IntegralBackend(DensityBackend):
+    """
+    Xấp xỉ bằng ô vuông cùng diện tích với hình tròn, tính qua ảnh tích phân (4 phép tra cứu/ô).
+    Nhanh nhất nhưng lệch so với mặt nạ tròn ở các ô tô không kín.
+    """
+
+    name = "integral"
+    tolerance = 0.1
+
+    def compute(self, img_binary, x_centers, y_centers, R, pool=None):
+        H, W = img_binary.shape
+        filled = np.equal(img_binary, 255, out=pooled(pool, 'density_filled', img_binary.shape, bool))
+        integral = cv2.integral(filled.view(np.uint8), sum=pooled(pool, 'density_integral', (H + 1, W + 1), np.int32))
+        half = max(1, int(round((R - 2) * np.sqrt(np.pi) / 2)))
+
+        xs = np.asarray(x_centers, dtype=np.intp)
+        ys = np.asarray(y_centers, dtype=np.intp)
+        x0, x1 = np.clip(xs - half, 0, W), np.clip(xs + half, 0, W)
+        y0, y1 = np.clip(ys - half, 0, H), np.clip(ys + half, 0, H)
+
+        filled = (integral[y1[:, None], x1[None, :]] - integral[y0[:, None], x1[None, :]]
+                  - integral[y1[:, None], x0[None, :]] + integral[y0[:, None], x0[None, :]])
+        area = (y1 - y0)[:, None] * (x1 - x0)[None, :]
+        return np.divide(filled, area, out=np.zeros(filled.shape, dtype=float), where=area > 0)
+
+class ConvolutionBackend(DensityBackend):
+    """
+    Tương quan ảnh nhị phân với kernel hình đĩa (giống mặt nạ gốc) bằng cv2.filter2D,
+    rồi lấy mẫu tại tâm các ô. Khác bản gốc chỉ ở sai số float và ô sát biên ảnh.
+    """
+
+    name = "convolution"
+    tolerance = 1e-4
+
+    def compute(self, img_binary, x_centers, y_centers, R, pool=None):
+        size = 2 * R
+        mask, total = circle_mask(size, size, R)
+        if total == 0:
+            return np.zeros((len(y_centers), len(x_centers)), dtype=float)
+        kernel = mask.astype(np.float32)
+
+        # Không có pool vẫn phải là float32: np.equal(out=None) trả về mảng bool (filter2D ra thang 0-255)
+        filled = pooled(pool, 'density_filled_f32', img_binary.shape, np.float32)
+        if filled is None:
+            filled = np.empty(img_binary.shape, dtype=np.float32)
+        np.equal(img_binary, 255, out=filled, casting='unsafe')
+        response = cv2.filter2D(filled, cv2.CV_32F, kernel / np.float32(total), anchor=(R, R),
+                                borderType=cv2.BORDER_CONSTANT,
+                                dst=pooled(pool, 'density_response', img_binary.shape, np.float32))
+
+        H, W = img_binary.shape
+        xs = np.clip(np.asarray(x_centers, dtype=np.intp), 0, W - 1)
+        ys = np.clip(np.asarray(y_centers, dtype=np.intp), 0, H - 1)
+        return response[ys[:, None], xs[None, :]].astype(float)
+
+DENSITY_BACKENDS: Dict[str, Type[DensityBackend]] = {
+    cls.name: cls for cls in (ReferenceBackend, CircleBackend, IntegralBackend, ConvolutionBackend)
+}
+
+class AutoDensityBackend(DensityBackend):
+    """
+    Chọn backend nhanh nhất đạt chuẩn độ chính xác trên máy hiện tại.
+    Ở lần gọi đầu tiên, chạy thử mọi backend trên chính ảnh đầu vào, so với bản gốc
+    (sai lệch <= tolerance) và đo thời gian; kết quả được dùng lại cho cả process.
+    """
+
+    name = "auto"
+    REPEATS = 3
+
+    _selected: Dict[float, DensityBackend] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, tolerance: float = 0.02):
+        self.tolerance = tolerance
+
+    @property
+    def selected(self) -> Optional[DensityBackend]:
+        return self._selected.get(self.tolerance)
+
+    def compute(self, img_binary, x_centers, y_centers, R, pool=None):
+        backend = self.selected
+        if backend is None:
+            with self._lock:
+                backend = self.selected or self._select(img_binary, x_centers, y_centers, R)
+                self._selected[self.tolerance] = backend
+        return backend.compute(img_binary, x_centers, y_centers, R, pool)
+
+    def _select(self, img_binary, x_centers, y_centers, R) -> DensityBackend:
+        reference = ReferenceBackend().compute(img_binary, x_centers, y_centers, R)
+        best, best_time = None, float('inf')
+        for cls in DENSITY_BACKENDS.values():
+            backend = cls()
+            try:
+                result = backend.compute(img_binary, x_centers, y_centers, R)
+                drift = float(np.max(np.abs(result - reference)))
+                if drift > self.tolerance:
+                    app_logger.debug(f"Density backend '{backend.name}' rejected: drift {drift:.4f} > {self.tolerance}")
+                    continue
+                timings = []
+                for _ in range(self.REPEATS):
+                    t0 = time.perf_counter()
+                    backend.compute(img_binary, x_centers, y_centers, R)
+                    timings.append(time.perf_counter() - t0)
+            except Exception as e:
+                app_logger.warning(f"Density backend '{backend.name}' failed during selection: {e}")
+                continue
+            elapsed = min(timings)
+            app_logger.debug(f"Density backend '{backend.name}': {elapsed * 1000:.2f} ms, drift {drift:.2e}")
+            if elapsed < best_time:
+                best, best_time = backend, elapsed
+
+        best = best or ReferenceBackend()
+        app_logger.info(f"Density backend auto-selected: {best.name} ({best_time * 1000:.2f} ms/sheet)")
+        return best
+
+def get_density_backend(name: str = "reference", tolerance: float = 0.02) -> DensityBackend:
+    """Tạo backend theo tên trong ALGORITHM_CONFIG.density_backend ('auto' = tự chọn)."""
+    if name == "auto":
+        return AutoDensityBackend(tolerance)
+    if name not in DENSITY_BACKENDS:
+        raise ValueError(f"Density backend không hỗ trợ: '{name}'. Chọn một trong: auto, {', '.join(DENSITY_BACKENDS)}")
+    return DENSITY_BACKENDS[name]()
+
+def available_backends() -> List[str]:
+    return list(DENSITY_BACKENDS)
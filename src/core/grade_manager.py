@@ -1,9 +1,9 @@
 import json
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 from pathlib import Path
-import cv2
 import numpy as np
-from src.utils import app_logger, OMRUtils
+from src.utils import app_logger, OMRUtils, tracer
+from src.utils.image_codec import ImageOutputPolicy
 
 class GradeManager:
     """
@@ -15,12 +15,14 @@ class GradeManager:
     """
 
     def __init__(self, key_answer: str, scoring_ref: Dict[str, Dict[int, int]], 
-                 set_name: str, test_id: str, test_date: str = "", class_name: str = ""):
+                 set_name: str, test_id: str, test_date: str = "", class_name: str = "",
+                 output_policy: Optional[ImageOutputPolicy] = None):
         """
         Args:
             key_answer: Chuỗi đáp án chuẩn (VD: "ABCD...").
             scoring_ref: Bảng quy đổi điểm (Loaded từ JSON).
             set_name, test_id, test_date: Metadata của bài thi.
+            output_policy: Định dạng/mức nén ảnh kết quả (mặc định PNG mức nén 1).
         """
         self.key = self._process_key(key_answer)
         self.scoring_ref = scoring_ref
@@ -28,6 +30,7 @@ class GradeManager:
         self.test_id = test_id
         self.class_name = class_name
         self.test_date = test_date
+        self.output_policy = output_policy or ImageOutputPolicy()
         self.weight_matrix = self._load_skill_matrix()
         app_logger.debug(f"GradeManager initialized for Test ID: {test_id} (Length: {len(self.key)})")
 
@@ -154,7 +157,7 @@ class GradeManager:
         skill_stats = self._calculate_skills(correct_vector)
         parts_stats.update(skill_stats)
         
-        app_logger.info(f"Grading finished. Score: {total_score} (LC: {lc_score}, RC: {rc_score})")
+        app_logger.info("Grading finished. Score: %s (LC: %s, RC: %s)", total_score, lc_score, rc_score)
         return parts_stats
 
     def format_result(self, base_name: str, parts: Dict[str, int], answers_list: List[str], conf_stats: Dict[str, Any] = None, process_time: float=0.0) -> Dict[str, Any]:
@@ -207,19 +210,17 @@ class GradeManager:
             if not result_dir.exists():
                 result_dir.mkdir(parents=True, exist_ok=True)
                 
-            save_path = result_dir / f"{base_name}.png"
+            policy = self.output_policy
+            save_path = result_dir / f"{base_name}{policy.extension}"
             
-            # Sử dụng cv2.imencode để hỗ trợ đường dẫn tiếng Việt (Windows)
+            # Mã hoá trong bộ nhớ rồi ghi bằng open() để hỗ trợ đường dẫn tiếng Việt (Windows)
             # cv2.imwrite thường lỗi với unicode path trên Windows
-            success, buffer = cv2.imencode(".png", image)
-            if success:
-                with open(save_path, "wb") as f:
-                    f.write(buffer)
-                app_logger.debug(f"Saved result image: {save_path.name}")
-                return True
-            else:
-                app_logger.error("Failed to encode image for saving.")
-                return False
+            with tracer.span('encode'):
+                buffer = policy.encode_bgr(image)
+            with tracer.span('write'):
+                policy.write_bytes(save_path, buffer)
+            app_logger.debug("Saved result image: %s (%s, %d bytes)", save_path.name, policy.fmt, len(buffer))
+            return True
                 
         except Exception as e:
             app_logger.error(f"Error saving result image {base_name}: {e}")
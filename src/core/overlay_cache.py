@@ -0,0 +1,88 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+from src.utils.logger import app_logger
+
+class OverlayCache:
+    """
+    Bộ nhớ đệm (LRU, giới hạn theo dung lượng) chứa ảnh kết quả đã vẽ lưới chấm (BGR)
+    của phiên làm việc hiện tại, key theo tên học viên.
+
+    ScoringWorker đẩy ảnh vào ngay sau khi chấm; ReportGenerator lấy ra để dán lên thẻ điểm
+    mà không phải đọc lại file PNG từ đĩa. Khi vượt ngân sách, ảnh cũ nhất bị loại
+    và luồng xuất báo cáo tự fallback về đọc đĩa.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._nbytes = 0
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def put(self, name: str, image: np.ndarray):
+        """Lưu ảnh (không copy, caller chuyển quyền sở hữu mảng cho cache)."""
+        if image is None or image.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(name, None)
+            self._digests.pop(name, None)
+            if old is not None:
+                self._nbytes -= old.nbytes
+            self._items[name] = image
+            self._nbytes += image.nbytes
+
+            # Loại bỏ phần tử ít dùng nhất cho tới khi về lại ngân sách
+            while self._nbytes > self.max_bytes and self._items:
+                evicted_name, evicted = self._items.popitem(last=False)
+                self._digests.pop(evicted_name, None)
+                self._nbytes -= evicted.nbytes
+                app_logger.debug("Overlay cache evicted: %s", evicted_name)
+
+    def get(self, name: str) -> Optional[np.ndarray]:
+        with self._lock:
+            image = self._items.get(name)
+            if image is not None:
+                self._items.move_to_end(name)
+            return image
+
+    def get_with_digest(self, name: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+        """
+        (ảnh, mã băm nội dung) lấy trong cùng 1 lần khoá; mã băm tính 1 lần, dùng để nhận biết thẻ điểm có cần render lại.
+        (None, None) nếu ảnh không có trong cache.
+        """
+        with self._lock:
+            image = self._items.get(name)
+            if image is None:
+                return None, None
+            self._items.move_to_end(name)
+            digest = self._digests.get(name)
+            if digest is None:
+                digest = hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16).hexdigest()
+                self._digests[name] = digest
+            return image, digest
+
+    def discard(self, name: str):
+        with self._lock:
+            self._digests.pop(name, None)
+            image = self._items.pop(name, None)
+            if image is not None:
+                self._nbytes -= image.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._digests.clear()
+            self._nbytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._items
@@ -1,11 +1,97 @@
+import hashlib
+import io
+import json
+import math
+import os
 import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
-from src.utils import app_logger
+from typing import Callable, Dict, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from src.utils import app_logger, OMRUtils
+from src.utils.pdf_writer import PdfStreamWriter
+from src.utils.image_codec import ImageOutputPolicy
+
+if TYPE_CHECKING:
+    from .overlay_cache import OverlayCache
+
+# --- CACHE CẤP PROCESS ---
+# Template đã decode + khung tĩnh (badge), key theo (đường dẫn, mtime) để tự làm mới khi template đổi
+_BASE_CACHE: Dict[Tuple[str, int], Image.Image] = {}
+
+@lru_cache(maxsize=None)
+def _load_font(path: str, size: int):
+    """Load TrueType font một lần cho mỗi process (fallback font mặc định nếu thiếu file)."""
+    try:
+        return ImageFont.truetype(path, size)
+    except Exception:
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=1024)
+def _text_length(text: str, font) -> float:
+    return font.getlength(text)
+
+@lru_cache(maxsize=1024)
+def _text_stamp(text: str, font, fill: str, start: Tuple[float, float] = (0.0, 0.0)) -> Tuple[Image.Image, int, int]:
+    """
+    Render sẵn 1 chuỗi thành 'con dấu' RGBA (nền trong suốt cùng màu chữ).
+    Các chuỗi lặp lại nhiều (điểm "495", phần trăm "80%"...) chỉ render 1 lần.
+
+    start: phần lẻ của toạ độ vẽ. draw.text đặt chữ tại int(x), int(y) và rasterize glyph lệch
+    thêm phần lẻ đó (sub-pixel) -> con dấu được render với cùng phần lẻ để khớp từng pixel.
+    Trả về: (ảnh, offset_x, offset_y) so với int() của toạ độ vẽ.
+    """
+    left, top, right, bottom = font.getbbox(text)
+    # Gốc vẽ trong con dấu là số dương (int() + phần lẻ như draw.text), +1 px cho phần lẻ
+    origin_x, origin_y = max(0, -left), max(0, -top)
+    canvas = Image.new("RGBA", (origin_x + max(1, right) + 1, origin_y + max(1, bottom) + 1),
+                       ImageColor.getrgb(fill)[:3] + (0,))
+    ImageDraw.Draw(canvas).text((origin_x + start[0], origin_y + start[1]), text, font=font, fill=fill)
+    bbox = canvas.getbbox()
+    if bbox is None:
+        return canvas.crop((0, 0, 1, 1)), 0, 0
+    return canvas.crop(bbox), bbox[0] - origin_x, bbox[1] - origin_y
+
+# Instance ReportGenerator riêng của mỗi process con trong pool (khởi tạo 1 lần/process)
+_worker_generator: Optional['ReportGenerator'] = None
+
+def _init_report_worker(template_path: str, output_cfg: Optional[dict]):
+    """Initializer của ProcessPool: dựng ReportGenerator một lần cho mỗi process con."""
+    global _worker_generator
+    _worker_generator = ReportGenerator(template_path, output_cfg)
+
+def _render_report_task(student_data: dict, output_dir: Path, image_source_dir: Path,
+                        overlay: Optional[np.ndarray] = None) -> bool:
+    """Task chạy trong process con: xuất thẻ điểm của 1 học viên."""
+    return _worker_generator.generate_single_report(student_data, output_dir, image_source_dir, overlay)
+
+def _render_page_task(student_data: dict, image_source_dir: Path, overlay: Optional[np.ndarray],
+                      jpeg_quality: int, card_dir: Optional[Path] = None) -> Tuple[Optional[Tuple[bytes, int, int]], bool]:
+    """Task chạy trong process con: render thẻ điểm, nén JPEG cho 1 trang PDF (và ghi file thẻ nếu có card_dir)."""
+    return _worker_generator.render_page(student_data, image_source_dir, overlay, jpeg_quality, card_dir)
 
 class ReportGenerator:
-    def __init__(self, template_path: str = "docs/report_template.png"):
+    # Tăng khi thay đổi cách vẽ thẻ điểm để buộc xuất lại toàn bộ ở chế độ incremental
+    RENDER_VERSION = 2
+    MANIFEST_NAME = ".report_manifest.json"
+    FINGERPRINT_FIELDS = ('Name', 'Date', 'Total', 'LC', 'RC',
+                          'lc_skill_1', 'lc_skill_2', 'lc_skill_3', 'lc_skill_4',
+                          'rc_skill_1', 'rc_skill_2', 'rc_skill_3', 'rc_skill_4', 'rc_skill_5')
+
+    def __init__(self, template_path: str = "docs/report_template.png", output_cfg: Optional[dict] = None):
+        """
+        Args:
+            template_path: Ảnh nền thẻ điểm (tương đối với thư mục chạy).
+            output_cfg: OUTPUT_CONFIG['report_image'] - định dạng/mức nén thẻ điểm PNG/JPEG/WebP.
+        """
+        self.template_arg = template_path
         self.template_path = Path.cwd()/template_path
+        self.output_cfg = output_cfg
+        self.output_policy = ImageOutputPolicy.from_config(output_cfg or {'png_level': 6})
+        self.last_batch_stats = {'rendered': 0, 'skipped': 0, 'failed': 0}
         self.coords = {
             "main_bars": {
                 "LC": {"x": 312, "y": 1081, "w": 448, "h": 28},
@@ -23,27 +109,42 @@ class ReportGenerator:
                 {"x": 1190, "y": 1339, "w": 270, "h": 16},
                 {"x": 1190, "y": 1415, "w": 270, "h": 16},
                 {"x": 1190, "y": 1483, "w": 270, "h": 16}
-            ]
+            ],
+            "badge": {"x": 1270, "y": 40, "w": 180, "h": 150},
+            "paper": {"x": 140, "y": 120, "w": 1320, "h": 869}
         }
         # --- Config Tọa Độ & Kích Thước ---
         self.color_main, self.color_date = "#1a1a1a", "#666666"
         self.color_lc, self.color_rc = "#1E88E5", "#2E7D32"
 
-        # Load Font
-        def load_font(path, size):
-            try:
-                return ImageFont.truetype(path, size)
-            except Exception:
-                return ImageFont.load_default()
-
+        # Load Font (cache theo process, các lần tạo ReportGenerator sau dùng lại)
         self.fonts = {
-            "h1": load_font("src/fonts/SF-Pro-Display-Semibold.otf", 32),
-            "date": load_font("src/fonts/SF-Compact-Display-Light.otf", 26),
-            "score_medium": load_font("src/fonts/SF-Pro-Text-Semibold.otf", 32),
-            "percentage": load_font("src/fonts/SF-Pro-Display-Regular.otf", 20),
-            "badge_score": load_font("src/fonts/SF-Pro-Text-Bold.otf", 56)
+            "h1": _load_font("src/fonts/SF-Pro-Display-Semibold.otf", 32),
+            "date": _load_font("src/fonts/SF-Compact-Display-Light.otf", 26),
+            "score_medium": _load_font("src/fonts/SF-Pro-Text-Semibold.otf", 32),
+            "percentage": _load_font("src/fonts/SF-Pro-Display-Regular.otf", 20),
+            "badge_score": _load_font("src/fonts/SF-Pro-Text-Bold.otf", 56)
         }
 
+    def _get_base(self) -> Image.Image:
+        """Template RGBA đã vẽ sẵn phần tĩnh (vòng badge). Caller phải .copy() trước khi vẽ."""
+        key = (str(self.template_path), self.template_path.stat().st_mtime_ns)
+        base = _BASE_CACHE.get(key)
+        if base is None:
+            base = Image.open(self.template_path).convert("RGBA")
+            badge = self.coords["badge"]
+            ImageDraw.Draw(base).ellipse([badge["x"], badge["y"], badge["x"]+badge["w"], badge["y"]+badge["h"]], 
+                                         fill=None, outline=self.color_main, width=3)
+            _BASE_CACHE.clear() # Chỉ giữ phiên bản template mới nhất
+            _BASE_CACHE[key] = base
+        return base
+
+    def _draw_text(self, bg: Image.Image, xy: Tuple[float, float], text: str, font, fill: str):
+        """Vẽ chuỗi lặp lại qua cache 'con dấu' thay vì rasterize lại mỗi thẻ (cùng vị trí pixel như draw.text)."""
+        x, y = xy
+        stamp, left, top = _text_stamp(text, font, fill, (math.modf(x)[0], math.modf(y)[0]))
+        bg.alpha_composite(stamp, (int(x) + left, int(y) + top))
+
     def _normalize_name(self, text: str) -> str:
         """Loại bỏ dấu tiếng Việt và chuyển thành IN HOA"""
         if not text: return "UNKNOWN"
@@ -51,7 +152,7 @@ class ReportGenerator:
         s = unicodedata.normalize('NFD', text).encode('ascii', 'ignore').decode("utf-8")
         return s.upper()
 
-    def _draw_fill(self, draw, box, ratio, color, is_main=False):
+    def _draw_fill(self, bg, draw, box, ratio, color, is_main=False):
         """Hàm nội bộ chỉ chuyên nhận tọa độ để đổ màu và in chữ số"""
         x, y, w, h = box["x"], box["y"], box["w"], box["h"]
         fill_w = int(w * ratio)
@@ -65,73 +166,184 @@ class ReportGenerator:
         text_val = str(int(ratio * 495)) if is_main else f"{int(ratio*100)}%"
         text_y = y - font.size - (12 if is_main else 6)
         
-        text_w = draw.textlength(text_val, font=font)
+        text_w = _text_length(text_val, font)
         text_x = max(x, min(x + fill_w - (text_w / 2), x + w - text_w)) # Ép lề
             
-        draw.text((text_x, text_y), text_val, font=font, fill=color)
+        self._draw_text(bg, (text_x, text_y), text_val, font, color)
+
+    def _load_paper(self, raw_name: str, image_source_dir: Optional[Path],
+                    overlay: Optional[np.ndarray]) -> Optional[Image.Image]:
+        """
+        Lấy ảnh bài làm để dán: ưu tiên ảnh BGR trong bộ nhớ của phiên hiện tại,
+        chỉ đọc file ảnh từ đĩa khi không có (VD: xuất lại báo cáo của phiên cũ).
+        """
+        if overlay is not None:
+            return Image.fromarray(np.ascontiguousarray(overlay[:, :, ::-1]), "RGB")
+
+        if image_source_dir is None:
+            return None
+        img_path = ImageOutputPolicy.find_existing(image_source_dir, raw_name)
+        if img_path is None:
+            return None
+        paper = Image.open(img_path).convert("RGB")
+        # Ảnh kết quả có thể đã được lưu thu nhỏ (OUTPUT_CONFIG.scale) -> phóng về khung chuẩn
+        box = self.coords["paper"]
+        if paper.width < box["w"]:
+            paper = paper.resize((box["w"], int(paper.height * box["w"] / paper.width)), Image.Resampling.BILINEAR)
+        return paper
+
+    def render_card(self, student_data: dict, image_source_dir: Optional[Path],
+                    overlay: Optional[np.ndarray] = None) -> Image.Image:
+        """
+        Render thẻ điểm của 1 học viên thành ảnh RGB (dùng chung cho xuất PNG và PDF).
+        
+        Args:
+            overlay: Ảnh kết quả BGR trong bộ nhớ (nếu có), tránh đọc lại từ image_source_dir.
+        """
+        bg = self._get_base().copy()
+        draw = ImageDraw.Draw(bg)
+        raw_name = student_data.get("Name", "UNKNOWN")
+        
+        # --- BƯỚC 1: Dán ảnh bài làm ---
+        try:
+            paper = self._load_paper(raw_name, image_source_dir, overlay)
+            if paper is not None:
+                bg.paste(paper, (self.coords["paper"]["x"], self.coords["paper"]["y"]))
+        except Exception as e:
+            app_logger.warning(f"Lỗi dán ảnh: {e}")
+
+        # --- BƯỚC 2: Chuyển tên In Hoa Không Dấu & In Ngày ---
+        processed_name = self._normalize_name(raw_name)
+        draw.text((140, 70), processed_name, font=self.fonts["h1"], fill=self.color_main)
+        
+        name_w = draw.textlength(processed_name, font=self.fonts["h1"])
+        y_offset = 70 + (self.fonts["h1"].size - self.fonts["date"].size) - 2
+        self._draw_text(bg, (140 + name_w + 20, y_offset), f"|  {student_data.get('Date', '')}", self.fonts["date"], self.color_date)
+
+        # --- BƯỚC 3: Total Score (vòng Ellipse đã có sẵn trong template cache) ---
+        badge = self.coords["badge"]
+        cx, cy = badge["x"] + badge["w"]/2, badge["y"] + badge["h"]/2
+                  
+        tot_str = str(student_data.get("Total", 0))
+        self._draw_text(bg, (cx - _text_length(tot_str, self.fonts["badge_score"])/2, cy - 18), 
+                        tot_str, self.fonts["badge_score"], self.color_main)
+
+        # --- BƯỚC 4: In Thanh Bar và Chỉ Số ---
+        self._draw_fill(bg, draw, self.coords["main_bars"]["LC"], student_data.get("LC", 0)/495.0, self.color_lc, is_main=True)
+        self._draw_fill(bg, draw, self.coords["main_bars"]["RC"], student_data.get("RC", 0)/495.0, self.color_rc, is_main=True)
+
+        for i, box in enumerate(self.coords["lc_skills"], start=1):
+            self._draw_fill(bg, draw, box, float(student_data.get(f"lc_skill_{i}", 0.0)), self.color_lc)
+            
+        for i, box in enumerate(self.coords["rc_skills"], start=1):
+            self._draw_fill(bg, draw, box, float(student_data.get(f"rc_skill_{i}", 0.0)), self.color_rc)
+
+        return bg.convert("RGB")
 
-    def generate_single_report(self, student_data: dict, output_dir: Path, image_source_dir: Path):
+    def generate_single_report(self, student_data: dict, output_dir: Path, image_source_dir: Optional[Path],
+                               overlay: Optional[np.ndarray] = None) -> bool:
+        """Xuất thẻ điểm của 1 học viên (định dạng theo output_policy). Trả về True nếu đã lưu file thành công."""
         if not self.template_path.exists():
             app_logger.error(f"Lỗi Template tại: {self.template_path.resolve()}")
-            return
+            return False
             
         try:
-            bg = Image.open(self.template_path).convert("RGBA")
-            draw = ImageDraw.Draw(bg)
-            raw_name = student_data.get("Name", "UNKNOWN")
-            
-            # --- BƯỚC 1: Dán ảnh bài làm ---
-            img_path = image_source_dir / f"{raw_name}.png"
-            if img_path.exists():
-                try:
-                    paper = Image.open(img_path).convert("RGBA")
-                    bg.paste(paper, (140, 120), paper)
-                except Exception as e:
-                    app_logger.warning(f"Lỗi dán ảnh: {e}")
-
-            # --- BƯỚC 2: Chuyển tên In Hoa Không Dấu & In Ngày ---
-            processed_name = self._normalize_name(raw_name)
-            draw.text((140, 70), processed_name, font=self.fonts["h1"], fill=self.color_main)
-            
-            name_w = draw.textlength(processed_name, font=self.fonts["h1"])
-            y_offset = 70 + (self.fonts["h1"].size - self.fonts["date"].size) - 2
-            draw.text((140 + name_w + 20, y_offset), f"|  {student_data.get('Date', '')}", font=self.fonts["date"], fill=self.color_date)
-
-            # --- BƯỚC 3: Vòng Ellipse & Total Score ---
-            badge = {"x": 1270, "y": 40, "w": 180, "h": 150}
-            draw.ellipse([badge["x"], badge["y"], badge["x"]+badge["w"], badge["y"]+badge["h"]], 
-                         fill=None, outline=self.color_main, width=3)
-            
-            cx, cy = badge["x"] + badge["w"]/2, badge["y"] + badge["h"]/2
-                      
-            tot_str = str(student_data.get("Total", 0))
-            draw.text((cx - draw.textlength(tot_str, font=self.fonts["badge_score"])/2, cy - 18), 
-                      tot_str, font=self.fonts["badge_score"], fill=self.color_main)
-
-            # --- BƯỚC 4: In Thanh Bar và Chỉ Số ---
-            self._draw_fill(draw, self.coords["main_bars"]["LC"], student_data.get("LC", 0)/495.0, self.color_lc, is_main=True)
-            self._draw_fill(draw, self.coords["main_bars"]["RC"], student_data.get("RC", 0)/495.0, self.color_rc, is_main=True)
-
-            for i, box in enumerate(self.coords["lc_skills"], start=1):
-                self._draw_fill(draw, box, float(student_data.get(f"lc_skill_{i}", 0.0)), self.color_lc)
-                
-            for i, box in enumerate(self.coords["rc_skills"], start=1):
-                self._draw_fill(draw, box, float(student_data.get(f"rc_skill_{i}", 0.0)), self.color_rc)
-
-            # --- LƯU FILE ---
+            card = self.render_card(student_data, image_source_dir, overlay)
+        except Exception as e:
+            app_logger.error(f"Lỗi Report ({student_data.get('Name', 'UNKNOWN')}): {e}")
+            return False
+        return self._save_card(card, student_data, output_dir)
+
+    def _save_card(self, card: Image.Image, student_data: dict, output_dir: Path) -> bool:
+        """Ghi thẻ đã render thành file Report_<tên> (định dạng theo output_policy)."""
+        raw_name = student_data.get("Name", "UNKNOWN")
+        try:
             output_dir.mkdir(parents=True, exist_ok=True)
-            bg.convert("RGB").save(output_dir / f"Report_{raw_name}.png")
-            
+            policy = self.output_policy
+            policy.write_bytes(output_dir / f"Report_{raw_name}{policy.extension}", policy.encode_pil(card))
+            return True
         except Exception as e:
-            app_logger.error(f"Lỗi Report: {e}")
-    def generate_batch(self, results: list) -> tuple:
+            app_logger.error(f"Lỗi Report ({raw_name}): {e}")
+            return False
+
+    def render_page(self, student_data: dict, image_source_dir: Optional[Path],
+                    overlay: Optional[np.ndarray] = None, jpeg_quality: int = 85,
+                    card_dir: Optional[Path] = None) -> Tuple[Optional[Tuple[bytes, int, int]], bool]:
         """
-        Xử lý xuất thẻ điểm hàng loạt. Tự động tạo cây thư mục.
-        Trả về: (số_lượng_thành_công, đường_dẫn_thư_mục_lưu)
+        Render thẻ điểm 1 lần và nén JPEG cho 1 trang PDF; card_dir: đồng thời ghi file thẻ vào thư mục đó
+        (xuất 'both' không phải render lại).
+        Trả về: ((jpeg_bytes, w, h) hoặc None nếu lỗi, True nếu đã ghi file thẻ / không cần ghi).
+        """
+        try:
+            card = self.render_card(student_data, image_source_dir, overlay)
+        except Exception as e:
+            app_logger.error(f"Lỗi Report ({student_data.get('Name', 'UNKNOWN')}): {e}")
+            return None, card_dir is None
+        card_ok = self._save_card(card, student_data, card_dir) if card_dir is not None else True
+        try:
+            buffer = io.BytesIO()
+            card.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+            return (buffer.getvalue(), card.width, card.height), card_ok
+        except Exception as e:
+            app_logger.error(f"Lỗi Report ({student_data.get('Name', 'UNKNOWN')}): {e}")
+            return None, card_ok
+
+    # --- XUẤT LẠI THEO THAY ĐỔI (INCREMENTAL) ---
+    def _template_version(self) -> str:
+        """Phiên bản của mọi thứ ảnh hưởng tới thẻ ngoài dữ liệu học viên: code vẽ, template, định dạng."""
+        stat = self.template_path.stat() if self.template_path.exists() else None
+        template_sig = f"{stat.st_mtime_ns}:{stat.st_size}" if stat else "missing"
+        return f"{self.RENDER_VERSION}|{template_sig}|{self.output_policy.describe()}"
+
+    @staticmethod
+    def _disk_overlay_digest(image_source_dir: Optional[Path], name: str) -> str:
+        """Dấu vân tay ảnh bài làm trên đĩa (kích thước + mtime, không cần đọc nội dung)."""
+        img_path = ImageOutputPolicy.find_existing(image_source_dir, name) if image_source_dir else None
+        if img_path is None:
+            return "none"
+        stat = img_path.stat()
+        return f"{img_path.name}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    @classmethod
+    def _card_fingerprint(cls, student_data: dict, overlay_digest: str, template_version: str) -> str:
+        payload = {field: student_data.get(field) for field in cls.FINGERPRINT_FIELDS}
+        payload['overlay'] = overlay_digest
+        payload['template'] = template_version
+        raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _load_manifest(self, reports_dir: Path) -> Dict[str, str]:
+        manifest_path = reports_dir / self.MANIFEST_NAME
+        if not manifest_path.exists():
+            return {}
+        try:
+            return json.loads(manifest_path.read_text(encoding="utf-8"))
+        except Exception as e:
+            app_logger.warning(f"Manifest báo cáo lỗi, xuất lại toàn bộ: {e}")
+            return {}
+
+    def _save_manifest(self, reports_dir: Path, manifest: Dict[str, str]):
+        manifest_path = reports_dir / self.MANIFEST_NAME
+        tmp_path = manifest_path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp_path, manifest_path)
+        except Exception as e:
+            app_logger.warning(f"Không thể lưu manifest báo cáo: {e}")
+
+    @staticmethod
+    def resolve_workers(max_workers: Optional[int], n_tasks: int) -> int:
+        """Số process thực tế. max_workers <= 0 hoặc None: tự chọn theo số CPU."""
+        if not max_workers or max_workers <= 0:
+            max_workers = max(1, (os.cpu_count() or 2) - 1)
+        return max(1, min(max_workers, n_tasks))
+
+    def _resolve_output_dirs(self, results: list, image_source_dir: Optional[Path] = None) -> Tuple[Path, Path, str]:
+        """
+        Suy ra thư mục lưu báo cáo và thư mục ảnh kết quả từ metadata của bản ghi đầu tiên.
+        Trả về: (reports_dir, image_source_dir, class_name)
         """
         app_dir = Path.cwd()
-        if not results:
-            return 0, None
 
         # 1. Trích xuất Metadata để tạo tên thư mục
         first_record = results[0]
@@ -153,13 +365,230 @@ class ReportGenerator:
         reports_dir = app_dir / "data" / report_folder_name
         reports_dir.mkdir(parents=True, exist_ok=True)
         
-        log_folder_name = f"{yyyymmdd}_{set_name.replace(" ", "")}_{test_id}_{class_name}"
-        images_source_dir = app_dir / "logs" / log_folder_name
+        # Thư mục ảnh kết quả dùng đúng quy tắc đặt tên mà Worker đã ghi
+        if image_source_dir is None:
+            log_folder_name = OMRUtils.get_session_dir_name(date_str, set_name, test_id, class_name)
+            image_source_dir = app_dir / "logs" / log_folder_name
+
+        return reports_dir, image_source_dir, class_name
+
+    def generate_batch(self, results: list,
+                       progress_callback: Optional[Callable[[int, int], None]] = None,
+                       max_workers: Optional[int] = None,
+                       overlays: Optional['OverlayCache'] = None,
+                       image_source_dir: Optional[Path] = None,
+                       incremental: bool = True) -> Tuple[int, Optional[Path]]:
+        """
+        Xử lý xuất thẻ điểm hàng loạt. Tự động tạo cây thư mục.
+        Các thẻ được render song song trên ProcessPool; lỗi ở 1 học viên không dừng cả lô.
+        Ở chế độ incremental, thẻ có đầu vào (điểm, kỹ năng, tên, ngày, ảnh bài làm, phiên bản template)
+        không đổi so với lần xuất trước sẽ được bỏ qua. Thống kê chi tiết nằm ở self.last_batch_stats.
+        
+        Args:
+            results: Danh sách dict kết quả.
+            progress_callback: Hàm (số_đã_xong, tổng) gọi sau mỗi thẻ (chạy trên thread gọi hàm này).
+            max_workers: Số process tối đa (None/0: tự động; 1: chạy tuần tự).
+            overlays: Cache ảnh kết quả trong phiên (ưu tiên dùng thay vì đọc đĩa).
+            image_source_dir: Thư mục ảnh kết quả trên đĩa (mặc định suy ra từ metadata).
+            incremental: Bỏ qua thẻ không thay đổi (dựa trên file manifest trong thư mục báo cáo).
+        Trả về: (số_lượng_thành_công (gồm cả thẻ bỏ qua), đường_dẫn_thư_mục_lưu)
+        """
+        if not results:
+            return 0, None
+
+        reports_dir, image_source_dir, _ = self._resolve_output_dirs(results, image_source_dir)
 
-        # 3. Chạy vòng lặp xuất ảnh
+        # 3. Lập kế hoạch: bỏ qua thẻ có dấu vân tay đầu vào trùng với file đã xuất
+        total = len(results)
+        manifest, tasks, skipped_count = self._plan_cards(results, reports_dir, image_source_dir, overlays, incremental)
+
+        done = skipped_count
         success_count = 0
+        if progress_callback and skipped_count:
+            progress_callback(done, total)
+
+        def on_finished(file_name: str, fingerprint: str, ok: bool):
+            nonlocal done, success_count
+            if ok:
+                success_count += 1
+                manifest[file_name] = fingerprint
+            else:
+                manifest.pop(file_name, None)
+            done += 1
+            if progress_callback:
+                progress_callback(done, total)
+
+        # 4. Xuất ảnh (tuần tự nếu chỉ có 1 process để tránh chi phí khởi tạo pool)
+        n_workers = self.resolve_workers(max_workers, len(tasks))
+
+        if n_workers == 1:
+            for student_data, overlay, file_name, fingerprint in tasks:
+                on_finished(file_name, fingerprint, self.generate_single_report(student_data, reports_dir, image_source_dir, overlay))
+        else:
+            app_logger.info(f"Generating {len(tasks)} reports with {n_workers} processes...")
+            # Giới hạn số task đang chờ để ảnh overlay (đã pickle) không dồn hết vào RAM
+            max_in_flight = n_workers * 2
+            pending = {}
+            queue = iter(tasks)
+            with ProcessPoolExecutor(max_workers=n_workers,
+                                     initializer=_init_report_worker,
+                                     initargs=(self.template_arg, self.output_cfg)) as executor:
+                while True:
+                    for student_data, overlay, file_name, fingerprint in queue:
+                        future = executor.submit(_render_report_task, student_data, reports_dir, image_source_dir, overlay)
+                        pending[future] = (student_data.get('Name', 'UNKNOWN'), file_name, fingerprint)
+                        if len(pending) >= max_in_flight:
+                            break
+                    if not pending:
+                        break
+
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name, file_name, fingerprint = pending.pop(future)
+                        try:
+                            ok = bool(future.result())
+                        except Exception as e:
+                            app_logger.error(f"Lỗi Report ({name}): {e}")
+                            ok = False
+                        on_finished(file_name, fingerprint, ok)
+
+        if incremental:
+            self._save_manifest(reports_dir, manifest)
+
+        self._finish_batch_stats(success_count, skipped_count, len(tasks), total)
+        return success_count + skipped_count, reports_dir
+
+    def _plan_cards(self, results: list, reports_dir: Path, image_source_dir: Optional[Path],
+                    overlays: Optional['OverlayCache'], incremental: bool) -> Tuple[Dict[str, str], list, int]:
+        """
+        Các thẻ cần render lại (dấu vân tay đầu vào khác lần xuất trước hoặc file đã mất).
+        Trả về: (manifest, [(student_data, overlay, file_name, fingerprint)], số_thẻ_bỏ_qua)
+        """
+        manifest = self._load_manifest(reports_dir) if incremental else {}
+        template_version = self._template_version()
+        tasks = []
+        skipped_count = 0
         for student_data in results:
-            self.generate_single_report(student_data, reports_dir, images_source_dir)
-            success_count += 1
+            name = student_data.get('Name', 'UNKNOWN')
+            overlay, overlay_digest = overlays.get_with_digest(name) if overlays is not None else (None, None)
+            if overlay is None:
+                overlay_digest = self._disk_overlay_digest(image_source_dir, name)
+            fingerprint = self._card_fingerprint(student_data, overlay_digest, template_version)
+            file_name = f"Report_{name}{self.output_policy.extension}"
+
+            if incremental and manifest.get(file_name) == fingerprint and (reports_dir / file_name).exists():
+                skipped_count += 1
+                continue
+            tasks.append((student_data, overlay, file_name, fingerprint))
+        return manifest, tasks, skipped_count
+
+    def _finish_batch_stats(self, success_count: int, skipped_count: int, n_tasks: int, total: int):
+        self.last_batch_stats = {
+            'rendered': success_count,
+            'skipped': skipped_count,
+            'failed': n_tasks - success_count
+        }
+        app_logger.info(f"Reports finished. Rendered: {success_count}, Skipped (unchanged): {skipped_count}, "
+                        f"Failed: {n_tasks - success_count} / {total}")
 
-        return success_count, reports_dir
\ No newline at end of file
+    def export_class_pdf(self, results: list,
+                         pdf_path: Optional[Path] = None,
+                         progress_callback: Optional[Callable[[int, int], None]] = None,
+                         max_workers: Optional[int] = None,
+                         overlays: Optional['OverlayCache'] = None,
+                         image_source_dir: Optional[Path] = None,
+                         jpeg_quality: int = 85,
+                         dpi: int = 150,
+                         with_cards: bool = False,
+                         incremental: bool = True) -> Tuple[int, Optional[Path]]:
+        """
+        Xuất toàn bộ thẻ điểm của lớp thành 1 file PDF nhiều trang (theo thứ tự danh sách).
+        Dùng chung đường render với generate_single_report; mỗi trang được nén JPEG và ghi
+        ngay xuống đĩa, số trang đang render song song bị giới hạn nên RAM không tăng theo sĩ số.
+
+        with_cards: đồng thời ghi file thẻ từng học viên (như generate_batch, kể cả incremental) từ
+        chính lần render của trang PDF -> mỗi thẻ chỉ render 1 lần. Thống kê thẻ ở self.last_batch_stats.
+        
+        Trả về: (số_trang_thành_công, đường_dẫn_file_pdf)
+        """
+        if not results:
+            return 0, None
+
+        reports_dir, image_source_dir, class_name = self._resolve_output_dirs(results, image_source_dir)
+        if pdf_path is None:
+            pdf_path = reports_dir / f"Reports_{class_name.replace(' ', '')}.pdf"
+
+        total = len(results)
+        n_workers = self.resolve_workers(max_workers, total)
+        done = 0
+
+        # Thẻ cần ghi file: name -> (file_name, fingerprint); thẻ không đổi chỉ render cho PDF
+        card_plan: Dict[str, Tuple[str, str]] = {}
+        manifest, skipped_count, cards_ok = {}, 0, 0
+        if with_cards:
+            manifest, tasks, skipped_count = self._plan_cards(results, reports_dir, image_source_dir, overlays, incremental)
+            card_plan = {data.get('Name', 'UNKNOWN'): (file_name, fingerprint) for data, _, file_name, fingerprint in tasks}
+
+        def overlay_of(student_data):
+            return overlays.get(student_data.get('Name', '')) if overlays is not None else None
+
+        def card_dir_of(student_data):
+            return reports_dir if student_data.get('Name', 'UNKNOWN') in card_plan else None
+
+        with PdfStreamWriter(pdf_path, dpi=dpi) as pdf:
+            def write_page(name, result):
+                nonlocal done, cards_ok
+                page, card_ok = result
+                if page is not None:
+                    pdf.add_jpeg_page(*page)
+                if name in card_plan:
+                    file_name, fingerprint = card_plan[name]
+                    if card_ok:
+                        cards_ok += 1
+                        manifest[file_name] = fingerprint
+                    else:
+                        manifest.pop(file_name, None)
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total)
+
+            if n_workers == 1:
+                for student_data in results:
+                    write_page(student_data.get('Name', 'UNKNOWN'),
+                               self.render_page(student_data, image_source_dir, overlay_of(student_data), jpeg_quality,
+                                                card_dir_of(student_data)))
+            else:
+                app_logger.info(f"Exporting {total} pages to PDF with {n_workers} processes...")
+                # Cửa sổ trượt theo đúng thứ tự trang: chỉ tối đa n_workers*2 trang nằm trong RAM
+                max_in_flight = n_workers * 2
+                pending = deque()
+                with ProcessPoolExecutor(max_workers=n_workers,
+                                         initializer=_init_report_worker,
+                                         initargs=(self.template_arg, self.output_cfg)) as executor:
+                    for student_data in results:
+                        pending.append((student_data.get('Name', 'UNKNOWN'), executor.submit(
+                            _render_page_task, student_data, image_source_dir, overlay_of(student_data), jpeg_quality,
+                            card_dir_of(student_data))))
+                        if len(pending) >= max_in_flight:
+                            name, future = pending.popleft()
+                            write_page(name, self._page_result(name, future))
+                    while pending:
+                        name, future = pending.popleft()
+                        write_page(name, self._page_result(name, future))
+
+            success_count = pdf.page_count
+
+        if with_cards:
+            if incremental:
+                self._save_manifest(reports_dir, manifest)
+            self._finish_batch_stats(cards_ok, skipped_count, len(card_plan), total)
+        app_logger.info(f"PDF export finished. Pages: {success_count}/{total} -> {pdf_path}")
+        return success_count, pdf_path
+
+    @staticmethod
+    def _page_result(name: str, future) -> Tuple[Optional[Tuple[bytes, int, int]], bool]:
+        try:
+            return future.result()
+        except Exception as e:
+            app_logger.error(f"Lỗi Report ({name}): {e}")
+            return None, False
\ No newline at end of file
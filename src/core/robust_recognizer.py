@@ -0,0 +1,56 @@
+from typing import Any, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from src.utils.logger import app_logger
+from src.utils.tracing import tracer
+from .warp_processor import WarpingProcessor
+from .omr_engine import OMREngine
+
+class RobustRecognizer:
+    """
+    Nhận dạng 2 tầng: tier 'fast' (WarpingProcessor + OMREngine như cũ) chạy cho mọi tờ,
+    tier 'robust' chỉ chạy khi tier nhanh lỗi (thiếu marker / vạch định vị) hoặc độ tin cậy
+    trung bình dưới conf_floor.
+
+    Tier robust thử lần lượt các cách nhị phân hoá dự phòng (WarpingProcessor.robust_candidates)
+    và giữ kết quả có độ tin cậy trung bình cao nhất (dừng sớm khi đạt conf_floor).
+    """
+
+    def __init__(self, warp_processor: WarpingProcessor, omr_engine: OMREngine, config: Dict[str, Any]):
+        self.warp_processor = warp_processor
+        self.omr_engine = omr_engine
+        cfg = config.get('robust_tier', {})
+        self.enabled = bool(cfg.get('enabled', True))
+        self.conf_floor = float(cfg.get('conf_floor', 0.6))
+
+    def needs_retry(self, conf_stats: Dict[str, Any]) -> bool:
+        """Kết quả tier nhanh có cần chạy lại bằng tier robust không (độ tin cậy trung bình thấp)."""
+        return self.enabled and conf_stats['confidence'] < self.conf_floor
+
+    def recognize(self, img_bgr: np.ndarray, baseline_conf: float = -1.0) -> Optional[Tuple[str, tuple, Dict[str, Any], List[str], Dict[str, Any]]]:
+        """
+        Chạy tier robust. Trả về (label, (warped_bgr, warped_binary, warped_marker), detection, answers, conf_stats)
+        của cách tốt nhất, hoặc None nếu không cách nào thành công hay tốt hơn baseline_conf.
+        """
+        if not self.enabled:
+            return None
+        best = None
+        with tracer.span('robust'):
+            img_gray = img_bgr if img_bgr.ndim == 2 else cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+            for label, img_binary_marker, img_binary_bubble in self.warp_processor.robust_candidates(img_gray):
+                try:
+                    warped = self.warp_processor.warp_with(img_bgr, img_binary_marker, img_binary_bubble)
+                    detection = self.omr_engine.detect(warped[2], warped[1])
+                    answers, conf_stats = self.omr_engine.summarize(detection)
+                except Exception as e:
+                    app_logger.debug("Robust candidate '%s' failed: %s", label, e)
+                    continue
+                app_logger.debug("Robust candidate '%s': avg conf %.3f", label, conf_stats['confidence'])
+                if best is None or conf_stats['confidence'] > best[4]['confidence']:
+                    best = (label, warped, detection, answers, conf_stats)
+                if conf_stats['confidence'] >= self.conf_floor:
+                    break
+
+        if best is None or best[4]['confidence'] <= baseline_conf:
+            return None
+        return best
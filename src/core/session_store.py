@@ -0,0 +1,294 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from src.utils.logger import app_logger
+
+class SessionStore:
+    """
+    Kết quả chấm của phiên, lưu theo cột thay vì 1 dict / tờ (dict + list 200 float ~ 8 KB/tờ).
+
+    - Cột nhẹ (điểm, kỹ năng, độ tin cậy, đã review, Date/Class/Set/Test) là mảng numpy, luôn ở RAM.
+    - Phần nặng của mỗi tờ (conf 200 số, detected_ans, ground_truth) là 1 bản ghi bytes trong
+      LRU giới hạn max_bytes; vượt ngân sách thì bản ghi ít dùng nhất được chuyển xuống
+      SQLite (file tạm trong spill_dir) và nạp lại khi cần (Review, xuất CSV).
+
+    get() trả về dict giống hệt GradeManager.format_result (mỗi lần gọi là 1 dict mới);
+    summary() trả về dict không có phần nặng (hiển thị bảng, xuất thẻ điểm).
+    Ảnh kết quả không nằm ở đây (OverlayCache / ReviewImageCache có ngân sách riêng).
+    """
+
+    META_FIELDS = ('Date', 'Class', 'Set', 'Test')
+    INT_FIELDS = ('Total', 'LC', 'RC', 'part_1', 'part_2', 'part_3', 'part_4', 'part_5', 'part_6', 'part_7')
+    SKILL_FIELDS = ('lc_skill_1', 'lc_skill_2', 'lc_skill_3', 'lc_skill_4',
+                    'rc_skill_1', 'rc_skill_2', 'rc_skill_3', 'rc_skill_4', 'rc_skill_5')
+    FLOAT_FIELDS = SKILL_FIELDS + ('process_time', 'Confidence', 'LowestConf')
+    # Thứ tự khoá của dict kết quả (cột CSV) như GradeManager.format_result
+    FIELD_ORDER = META_FIELDS + ('Name',) + INT_FIELDS + SKILL_FIELDS + (
+        'detected_ans', 'conf', 'process_time', 'ground_truth', 'is_reviewed', 'Confidence', 'LowestConf')
+
+    INITIAL_CAPACITY = 256
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, spill_dir: Optional[Path] = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_path: Optional[Path] = None
+        self._reset()
+
+    def _reset(self):
+        capacity = self.INITIAL_CAPACITY
+        self._names: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._ints = np.zeros((capacity, len(self.INT_FIELDS)), dtype=np.int32)
+        self._floats = np.zeros((capacity, len(self.FLOAT_FIELDS)), dtype=np.float64)
+        self._reviewed = np.zeros(capacity, dtype=bool)
+        self._meta_ids = np.zeros(capacity, dtype=np.int32)
+        self._metas: List[Tuple[str, ...]] = []
+        self._meta_index: Dict[Tuple[str, ...], int] = {}
+        # Phần nặng: row -> (conf float64 bytes, detected_ans, ground_truth); LRU
+        self._payloads: 'OrderedDict[int, Tuple[bytes, bytes, bytes]]' = OrderedDict()
+        self._payload_bytes = 0
+        self._spilled = 0
+
+    # --- GHI ---
+    def add(self, result: Dict[str, Any]):
+        """Thêm (hoặc thay thế theo Name) kết quả của 1 tờ."""
+        with self._lock:
+            name = result['Name']
+            row = self._rows.get(name)
+            if row is None:
+                row = len(self._names)
+                self._ensure_capacity(row + 1)
+                self._names.append(name)
+                self._rows[name] = row
+            elif row not in self._payloads:
+                # Thay thế tờ có phần nặng đã spill: bản cũ trên đĩa không còn dùng
+                self._drop_spilled(row)
+            meta = tuple(str(result.get(field, '')) for field in self.META_FIELDS)
+            meta_id = self._meta_index.get(meta)
+            if meta_id is None:
+                meta_id = self._meta_index[meta] = len(self._metas)
+                self._metas.append(meta)
+            self._meta_ids[row] = meta_id
+            self._write_light(row, result)
+            self._put_payload(row, (
+                np.asarray(result.get('conf', []), dtype=np.float64).tobytes(),
+                result.get('detected_ans', '').encode('latin-1'),
+                result.get('ground_truth', '').encode('latin-1')
+            ))
+
+    def update(self, name: str, fields: Dict[str, Any]):
+        """Cập nhật 1 số trường của tờ đã có (VD: điểm + ground_truth sau khi review)."""
+        with self._lock:
+            row = self._rows.get(name)
+            if row is None:
+                raise KeyError(name)
+            self._write_light(row, fields)
+            if 'conf' in fields or 'detected_ans' in fields or 'ground_truth' in fields:
+                conf, detected, truth = self._payload(row)
+                if 'conf' in fields:
+                    conf = np.asarray(fields['conf'], dtype=np.float64).tobytes()
+                if 'detected_ans' in fields:
+                    detected = fields['detected_ans'].encode('latin-1')
+                if 'ground_truth' in fields:
+                    truth = fields['ground_truth'].encode('latin-1')
+                self._put_payload(row, (conf, detected, truth))
+
+    def discard(self, name: str):
+        with self._lock:
+            row = self._rows.pop(name, None)
+            if row is None:
+                return
+            self._names[row] = None
+            payload = self._payloads.pop(row, None)
+            if payload is not None:
+                self._payload_bytes -= self._payload_size(payload)
+            else:
+                self._drop_spilled(row)
+
+    def clear(self):
+        with self._lock:
+            self._close_db()
+            self._reset()
+
+    def _write_light(self, row: int, fields: Dict[str, Any]):
+        for i, field in enumerate(self.INT_FIELDS):
+            if field in fields:
+                self._ints[row, i] = fields[field]
+        for i, field in enumerate(self.FLOAT_FIELDS):
+            if field in fields:
+                self._floats[row, i] = fields[field]
+        if 'is_reviewed' in fields:
+            self._reviewed[row] = bool(fields['is_reviewed'])
+
+    def _ensure_capacity(self, size: int):
+        capacity = len(self._reviewed)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        self._ints = np.resize(self._ints, (capacity, self._ints.shape[1]))
+        self._floats = np.resize(self._floats, (capacity, self._floats.shape[1]))
+        self._reviewed = np.resize(self._reviewed, capacity)
+        self._meta_ids = np.resize(self._meta_ids, capacity)
+
+    # --- ĐỌC ---
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rows
+
+    def summary(self, name: str) -> Optional[Dict[str, Any]]:
+        """Kết quả không kèm conf / detected_ans / ground_truth (không chạm tới phần đã spill)."""
+        with self._lock:
+            row = self._rows.get(name)
+            return None if row is None else self._light_dict(row)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Kết quả đầy đủ (dict mới, sửa dict không ảnh hưởng store -> dùng update())."""
+        with self._lock:
+            row = self._rows.get(name)
+            if row is None:
+                return None
+            return self._full_dict(row, self._payload(row))
+
+    def names(self, unreviewed_only: bool = False) -> List[str]:
+        """Tên các tờ theo thứ tự thêm vào."""
+        with self._lock:
+            return [name for row, name in enumerate(self._names)
+                    if name is not None and not (unreviewed_only and self._reviewed[row])]
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Danh sách kết quả rút gọn (xuất thẻ điểm chỉ cần điểm + kỹ năng)."""
+        with self._lock:
+            return [self._light_dict(row) for row, name in enumerate(self._names) if name is not None]
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Lần lượt từng kết quả đầy đủ (xuất CSV); phần đã spill được đọc theo lô, không nạp lại vào LRU."""
+        for name in self.names():
+            with self._lock:
+                row = self._rows.get(name)
+                if row is None:
+                    continue
+                payload = self._payloads.get(row) or self._load_spilled(row)
+                yield self._full_dict(row, payload)
+
+    def _light_dict(self, row: int) -> Dict[str, Any]:
+        result: Dict[str, Any] = dict(zip(self.META_FIELDS, self._metas[self._meta_ids[row]]))
+        result['Name'] = self._names[row]
+        ints, floats = self._ints[row].tolist(), self._floats[row].tolist()
+        result.update(zip(self.INT_FIELDS, ints))
+        result.update(zip(self.FLOAT_FIELDS, floats))
+        result['is_reviewed'] = bool(self._reviewed[row])
+        return result
+
+    def _full_dict(self, row: int, payload: Tuple[bytes, bytes, bytes]) -> Dict[str, Any]:
+        values = self._light_dict(row)
+        conf, detected, truth = payload
+        values['conf'] = np.frombuffer(conf, dtype=np.float64).tolist()
+        values['detected_ans'] = detected.decode('latin-1')
+        values['ground_truth'] = truth.decode('latin-1')
+        return {field: values[field] for field in self.FIELD_ORDER}
+
+    # --- PHẦN NẶNG: LRU + SPILL ---
+    @staticmethod
+    def _payload_size(payload: Tuple[bytes, bytes, bytes]) -> int:
+        return sum(len(part) for part in payload)
+
+    def _light_bytes(self) -> int:
+        return self._ints.nbytes + self._floats.nbytes + self._reviewed.nbytes + self._meta_ids.nbytes
+
+    @property
+    def nbytes(self) -> int:
+        """Dung lượng dữ liệu đang ở RAM (cột nhẹ + phần nặng chưa spill)."""
+        return self._light_bytes() + self._payload_bytes
+
+    @property
+    def spilled(self) -> int:
+        """Số tờ có phần nặng đang nằm trên đĩa."""
+        return self._spilled
+
+    def _payload(self, row: int) -> Tuple[bytes, bytes, bytes]:
+        payload = self._payloads.get(row)
+        if payload is not None:
+            self._payloads.move_to_end(row)
+            return payload
+        # Tờ đã spill: nạp lại vào LRU (được dùng lại -> không còn "lạnh")
+        payload = self._load_spilled(row)
+        self._drop_spilled(row)
+        self._put_payload(row, payload)
+        return payload
+
+    def _put_payload(self, row: int, payload: Tuple[bytes, bytes, bytes]):
+        old = self._payloads.pop(row, None)
+        if old is not None:
+            self._payload_bytes -= self._payload_size(old)
+        self._payloads[row] = payload
+        self._payload_bytes += self._payload_size(payload)
+        if self.nbytes > self.max_bytes:
+            self._spill()
+
+    def _spill(self):
+        """Chuyển phần nặng ít dùng nhất xuống SQLite tới khi còn 90% ngân sách (ghi theo lô)."""
+        target = self.max_bytes * 0.9
+        batch = []
+        while self.nbytes > target and len(self._payloads) > 1:
+            row, payload = self._payloads.popitem(last=False)
+            self._payload_bytes -= self._payload_size(payload)
+            batch.append((row, *payload))
+        if not batch:
+            return
+        db = self._ensure_db()
+        db.executemany("INSERT OR REPLACE INTO payload (row, conf, detected, truth) VALUES (?, ?, ?, ?)", batch)
+        db.commit()
+        self._spilled += len(batch)
+        app_logger.debug("Session store spilled %d records (%d on disk)", len(batch), self._spilled)
+
+    def _drop_spilled(self, row: int):
+        """Xoá bản ghi đã spill của row (nếu có) và cập nhật bộ đếm."""
+        if self._db is not None:
+            self._spilled -= self._db.execute("DELETE FROM payload WHERE row = ?", (row,)).rowcount
+
+    def _load_spilled(self, row: int) -> Tuple[bytes, bytes, bytes]:
+        found = self._db.execute("SELECT conf, detected, truth FROM payload WHERE row = ?", (row,)).fetchone()
+        if found is None:
+            raise KeyError(row)
+        return found
+
+    def _ensure_db(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.spill_dir is not None:
+                self.spill_dir.mkdir(parents=True, exist_ok=True)
+            fd, path = tempfile.mkstemp(prefix="omr_session_", suffix=".sqlite",
+                                        dir=str(self.spill_dir) if self.spill_dir else None)
+            os.close(fd)
+            self._db_path = Path(path)
+            # Ghi/đọc từ GUI thread và ReportWorker (đã khoá bằng _lock)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode = OFF")
+            self._db.execute("PRAGMA synchronous = OFF")
+            self._db.execute("CREATE TABLE payload (row INTEGER PRIMARY KEY, conf BLOB, detected BLOB, truth BLOB)")
+            app_logger.info(f"Session store spilling to {path}")
+        return self._db
+
+    def _close_db(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._db_path is not None:
+            try:
+                self._db_path.unlink()
+            except OSError:
+                pass
+            self._db_path = None
+
+    def close(self):
+        with self._lock:
+            self._close_db()
@@ -0,0 +1,189 @@
+import ast
+import math
+from fractions import Fraction
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from src.utils.file_io import FileHandler
+from src.utils.logger import app_logger
+
+LAYOUT_DIR = Path("config/layouts")
+DEFAULT_LAYOUT = "toeic_200"
+QUESTION_ORDERS = ('column_major', 'row_major')
+
+class _LinearExpr:
+    """
+    Biên dịch công thức toạ độ cột (chuỗi trong file bố cục) thành hệ số tuyến tính (Fraction)
+    theo tâm các vạch biên trên S[0..n-1] + hằng số. Chỉ cho phép phép toán tuyến tính:
+    S[i], C[i] (cột đã khai báo trước), tên đại lượng trong 'derived', số, + - * /, mean(...).
+    """
+
+    def __init__(self, n_marks: int, names: Dict[str, List[Fraction]], columns: List[List[Fraction]]):
+        self.n = n_marks
+        self.names = names
+        self.columns = columns
+
+    def compile(self, source: str) -> List[Fraction]:
+        try:
+            return self._eval(ast.parse(source, mode='eval').body)
+        except (SyntaxError, ValueError, IndexError, KeyError, ZeroDivisionError) as e:
+            raise ValueError(f"Công thức bố cục không hợp lệ '{source}': {e}")
+
+    def _const(self, value) -> List[Fraction]:
+        return [Fraction(0)] * self.n + [Fraction(value)]
+
+    @staticmethod
+    def _is_const(vec: List[Fraction]) -> bool:
+        return not any(vec[:-1])
+
+    def _eval(self, node) -> List[Fraction]:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return self._const(Fraction(node.value).limit_denominator(1000))
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name):
+            index = node.slice
+            if not (isinstance(index, ast.Constant) and isinstance(index.value, int)):
+                raise ValueError("chỉ số phải là số nguyên")
+            if node.value.id == 'S':
+                if not 0 <= index.value < self.n:
+                    raise IndexError(f"S[{index.value}] ngoài {self.n} vạch")
+                vec = [Fraction(0)] * (self.n + 1)
+                vec[index.value] = Fraction(1)
+                return vec
+            if node.value.id == 'C':
+                if not 0 <= index.value < len(self.columns):
+                    raise IndexError(f"C[{index.value}] chưa được khai báo")
+                return list(self.columns[index.value])
+            raise ValueError(f"không hỗ trợ '{node.value.id}[...]'")
+        if isinstance(node, ast.Name):
+            return list(self.names[node.id])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            vec = self._eval(node.operand)
+            return [-v for v in vec] if isinstance(node.op, ast.USub) else vec
+        if isinstance(node, ast.BinOp):
+            left, right = self._eval(node.left), self._eval(node.right)
+            if isinstance(node.op, ast.Add):
+                return [a + b for a, b in zip(left, right)]
+            if isinstance(node.op, ast.Sub):
+                return [a - b for a, b in zip(left, right)]
+            if isinstance(node.op, ast.Mult):
+                if self._is_const(left):
+                    left, right = right, left
+                if not self._is_const(right):
+                    raise ValueError("chỉ nhân với hằng số")
+                return [a * right[-1] for a in left]
+            if isinstance(node.op, ast.Div):
+                if not self._is_const(right):
+                    raise ValueError("chỉ chia cho hằng số")
+                return [a / right[-1] for a in left]
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'mean' and node.args:
+            values = [self._eval(arg) for arg in node.args]
+            return [sum(parts, Fraction(0)) / len(values) for parts in zip(*values)]
+        raise ValueError(f"biểu thức không hỗ trợ: {ast.dump(node)}")
+
+class SheetLayout:
+    """
+    Bố cục phiếu trả lời (config/layouts/<tên>.json), biên dịch 1 lần thành các mảng chỉ số:
+
+    - Bộ lọc vạch định vị biên trên / biên trái (số lượng, kích thước) và độ dày dải quét.
+    - column_numerators / column_denominator: toạ độ x các cột bubble = tổ hợp tuyến tính (số hữu tỉ
+      chính xác) của tâm các vạch biên trên, tính cho cả tờ bằng 1 phép nhân ma trận nguyên.
+    - cell_rows (Q,), cell_cols (Q, K): hàng + các cột lựa chọn của từng câu theo thứ tự câu;
+      ma trận density (hàng x cột) được gom thành (Q, K) bằng 1 phép gather.
+
+    Hàng bubble trùng với các vạch biên trái (side_marks.count hàng).
+    """
+
+    def __init__(self, spec: Dict[str, Any], name: str = ""):
+        self.name = spec.get('name', name)
+        top = spec['top_marks']
+        side = spec['side_marks']
+        self.scan_thickness = int(spec.get('scan_thickness', 50))
+        self.top_count = int(top['count'])
+        self.top_size = tuple(top['size'])
+        self.top_ratio = tuple(top.get('ratio', (0.8, 1.2)))
+        self.rows = int(side['count'])
+        self.side_width = tuple(side['width'])
+        self.side_height = tuple(side['height'])
+        self.choices = str(spec.get('choices', 'ABCD'))
+        # Toạ độ tham chiếu trên phiếu mẫu (không gian warp): dùng để sinh phiếu tổng hợp
+        self.reference = spec.get('reference', {})
+
+        self.column_numerators, self.column_denominator = self._compile_columns(spec)
+        self.cols = len(self.column_numerators)
+        self.cell_rows, self.cell_cols = self._compile_questions(spec)
+        self.questions = len(self.cell_rows)
+        # Thứ tự vẽ overlay: theo hàng rồi theo cột (như duyệt lưới từ trên xuống)
+        self.draw_order = np.lexsort((self.cell_cols[:, 0], self.cell_rows))
+        for array in (self.column_numerators, self.cell_rows, self.cell_cols, self.draw_order):
+            array.flags.writeable = False
+
+    def _compile_columns(self, spec: Dict[str, Any]) -> Tuple[np.ndarray, int]:
+        names: Dict[str, List[Fraction]] = {}
+        columns: List[List[Fraction]] = []
+        compiler = _LinearExpr(self.top_count, names, columns)
+        for key, source in spec.get('derived', {}).items():
+            if not key.startswith('//'):
+                names[key] = compiler.compile(source)
+        for source in spec['columns']:
+            columns.append(compiler.compile(source))
+        if not columns:
+            raise ValueError(f"Bố cục '{self.name}' không có cột nào.")
+        # Mẫu số chung -> hệ số nguyên: x = (A @ [S, 1]) // D, không sai số làm tròn float
+        denominator = 1
+        for value in (v for column in columns for v in column):
+            denominator = denominator * value.denominator // math.gcd(denominator, value.denominator)
+        numerators = np.array([[int(v * denominator) for v in column] for column in columns], dtype=np.int64)
+        return numerators, denominator
+
+    def _compile_questions(self, spec: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        k = len(self.choices)
+        if self.cols % k:
+            raise ValueError(f"Bố cục '{self.name}': {self.cols} cột không chia hết cho {k} lựa chọn.")
+        groups = self.cols // k
+        order = spec.get('question_order', 'column_major')
+        if order not in QUESTION_ORDERS:
+            raise ValueError(f"Bố cục '{self.name}': question_order phải là một trong {QUESTION_ORDERS}.")
+        capacity = groups * self.rows
+        count = int(spec.get('questions', capacity))
+        if not 0 < count <= capacity:
+            raise ValueError(f"Bố cục '{self.name}': {count} câu vượt quá {capacity} ô ({groups} nhóm x {self.rows} hàng).")
+
+        q = np.arange(count)
+        if order == 'column_major':
+            # Hết các hàng của nhóm 1 rồi sang nhóm 2 (phiếu TOEIC: câu 1-25 ở nhóm đầu tiên)
+            group, row = np.divmod(q, self.rows)
+        else:
+            row, group = np.divmod(q, groups)
+        cell_cols = group[:, None] * k + np.arange(k)[None, :]
+        return row.astype(np.intp), cell_cols.astype(np.intp)
+
+    def column_x(self, top_centers: Sequence[int]) -> List[int]:
+        """Toạ độ x của các cột bubble từ tâm các vạch biên trên (cắt phần thập phân như int())."""
+        values = np.append(np.asarray(top_centers, dtype=np.int64), 1)
+        scaled = self.column_numerators @ values
+        return (np.sign(scaled) * (np.abs(scaled) // self.column_denominator)).tolist()
+
+    def gather(self, matrix: np.ndarray) -> np.ndarray:
+        """Ma trận theo lưới (hàng x cột) -> (câu, lựa chọn) theo thứ tự câu."""
+        return matrix[self.cell_rows[:, None], self.cell_cols]
+
+    @classmethod
+    def load(cls, name_or_path: str) -> 'SheetLayout':
+        """Nạp bố cục theo tên (config/layouts/<tên>.json) hoặc đường dẫn file; dùng chung trong process."""
+        path = Path(name_or_path)
+        if path.suffix.lower() != '.json':
+            path = LAYOUT_DIR / f"{name_or_path}.json"
+        return _load_layout(str(path))
+
+    @classmethod
+    def from_config(cls, algo_cfg: Optional[Dict[str, Any]]) -> 'SheetLayout':
+        return cls.load((algo_cfg or {}).get('layout') or DEFAULT_LAYOUT)
+
+@lru_cache(maxsize=16)
+def _load_layout(path: str) -> SheetLayout:
+    spec = FileHandler.load_json(Path(path))
+    layout = SheetLayout(spec, Path(path).stem)
+    app_logger.debug("Sheet layout '%s': %d questions, %d rows x %d columns", layout.name,
+                     layout.questions, layout.rows, layout.cols)
+    return layout
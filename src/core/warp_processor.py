@@ -1,7 +1,8 @@
 import cv2
 import numpy as np
-from typing import Tuple, Dict, Any, List, Optional
-from src.utils import app_logger
+from typing import Tuple, Dict, Any, Iterator, List, Optional
+from src.utils import app_logger, tracer
+from .buffer_pool import BufferPool, pooled
 
 class WarpingProcessor:
     """
@@ -19,56 +20,113 @@ class WarpingProcessor:
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.preprocessing_cfg = config.get('preprocessing', {})
+        # Số marker tìm thấy ở ảnh gần nhất (ghi vào metrics, kể cả khi thất bại)
+        self.last_marker_count = 0
+        # CLAHE tạo 1 lần; ảnh trung gian + ảnh warp của tier nhanh ghi vào bộ đệm dùng lại giữa các tờ
+        # (ảnh trả về từ process_warping chỉ hợp lệ tới lần gọi kế tiếp)
+        self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self.buffers: Optional[BufferPool] = BufferPool() if config.get('reuse_buffers', True) else None
         app_logger.debug("WarpingProcessor initialized with config.")
 
-    def _preprocess_marker(self, img_gray: np.ndarray) -> np.ndarray:
+    def _preprocess_marker(self, img_gray: np.ndarray, pool: Optional[BufferPool] = None) -> np.ndarray:
         """Chuyển ảnh xám thành nhị phân để tìm marker (Inverse Binary)."""
         # Sử dụng ngưỡng cố định 127 cho marker (thường là chuẩn)
-        _, img_binary = cv2.threshold(img_gray, 127, 255, cv2.THRESH_BINARY_INV)
+        _, img_binary = cv2.threshold(img_gray, 127, 255, cv2.THRESH_BINARY_INV,
+                                      dst=pooled(pool, 'marker', img_gray.shape))
         return img_binary
 
-    def _preprocess_bubble(self, img_gray: np.ndarray) -> np.ndarray:
+    def _preprocess_bubble(self, img_gray: np.ndarray, pool: Optional[BufferPool] = None) -> np.ndarray:
         """Chuyển ảnh xám thành nhị phân để quét đáp án."""
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        img_gray = clahe.apply(img_gray)
+        img_gray = self._clahe.apply(img_gray, dst=pooled(pool, 'clahe', img_gray.shape))
         _, img_binary = cv2.threshold(
             img_gray, 
             0, 
             255, 
-            cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU
+            cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU,
+            dst=pooled(pool, 'bubble', img_gray.shape)
         )
         return img_binary
 
+    def _normalize_illumination(self, img_gray: np.ndarray) -> np.ndarray:
+        """Chia cho nền giấy ước lượng (closing trên ảnh thu nhỏ) để khử bóng đổ / chiếu sáng không đều."""
+        h, w = img_gray.shape
+        small = cv2.resize(img_gray, (max(1, w // 8), max(1, h // 8)), interpolation=cv2.INTER_AREA)
+        k = max(3, (int(self.config.get('marker_scaling_ref', 0.05) * small.shape[1]) * 2) | 1)
+        background = cv2.morphologyEx(small, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (k, k)))
+        background = cv2.resize(cv2.blur(background, (k, k)), (w, h), interpolation=cv2.INTER_LINEAR)
+        return cv2.divide(img_gray, np.maximum(background, 1), scale=255)
+
+    def _cleanup(self, img_binary: np.ndarray) -> np.ndarray:
+        """Mở (xoá hạt nhiễu) rồi đóng (lấp lỗ trong marker), kernel theo kích thước ảnh."""
+        k = max(3, (min(img_binary.shape) // 600) | 1)
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (k, k))
+        img_binary = cv2.morphologyEx(img_binary, cv2.MORPH_OPEN, kernel)
+        return cv2.morphologyEx(img_binary, cv2.MORPH_CLOSE, kernel)
+
+    def robust_candidates(self, img_gray: np.ndarray) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        """
+        Tier robust: các cách nhị phân hoá dự phòng (label, marker, bubble), từ rẻ đến đắt.
+        Dùng khi ngưỡng cố định của tier nhanh không tìm đủ marker/vạch hoặc độ tin cậy thấp.
+        """
+        w = img_gray.shape[1]
+        # 1. Khử chiếu sáng không đều (bóng đổ, scan tối 1 phía) -> ngưỡng gốc + làm sạch hình thái
+        normalized = self._normalize_illumination(img_gray)
+        _, marker = cv2.threshold(normalized, self.DEFAULT_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+        yield 'normalized', self._cleanup(marker), self._preprocess_bubble(normalized)
+
+        bubble = self._preprocess_bubble(img_gray)
+        blurred = cv2.GaussianBlur(img_gray, (5, 5), 0)
+        # 2. Ngưỡng thích nghi (marker in mờ / mực nhạt); block ~3 lần cạnh marker để lõi marker vẫn đặc
+        block = max(3, int(3 * self.config.get('marker_scaling_ref', 0.05) * w) | 1)
+        marker = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, block, 15)
+        yield 'adaptive', self._cleanup(marker), bubble
+
+        # 3. Bỏ phiếu nhiều ngưỡng: Otsu toàn cục + các ngưỡng cố định cấu hình
+        _, marker = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        yield 'otsu', self._cleanup(marker), bubble
+        for value in self.config.get('robust_tier', {}).get('fixed_thresholds', [100, 160]):
+            _, marker = cv2.threshold(blurred, value, 255, cv2.THRESH_BINARY_INV)
+            yield f'fixed_{value}', self._cleanup(marker), bubble
+
+    @staticmethod
+    def _contour_boxes(img_binary: np.ndarray) -> np.ndarray:
+        """
+        Bounding box (x, y, w, h) của mọi contour ngoài cùng, tính 1 lần bằng NumPy
+        (min/max toạ độ theo từng đoạn điểm) thay vì gọi boundingRect cho từng contour.
+        """
+        contours, _ = cv2.findContours(img_binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return np.empty((0, 4), dtype=np.int32)
+        lengths = np.fromiter(map(len, contours), dtype=np.intp, count=len(contours))
+        points = np.concatenate(contours).reshape(-1, 2)
+        starts = np.concatenate(([0], np.cumsum(lengths[:-1])))
+        lo = np.minimum.reduceat(points, starts)
+        hi = np.maximum.reduceat(points, starts)
+        return np.hstack([lo, hi - lo + 1])
+
     def _find_and_order_markers(self, img_binary_marker: np.ndarray) -> List[Tuple[int, int, int, int]]:
         """Tìm 4 marker và sắp xếp theo thứ tự: TL, TR, BR, BL."""
-        contours, _ = cv2.findContours(img_binary_marker, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        markers = []
+        boxes = self._contour_boxes(img_binary_marker)
         img_h, img_w = img_binary_marker.shape
         
         # Lấy tham số scaling từ config hoặc dùng mặc định
         marker_scaling_ref = self.config.get('marker_scaling_ref', 0.05) 
         min_size = 0.5 * marker_scaling_ref * img_w
         
-        for cnt in contours:
-            x, y, w, h = cv2.boundingRect(cnt)
-            
-            # 1. Lọc theo kích thước
-            if w < min_size or h < min_size: 
-                continue
-            
-            # 2. Lọc theo tỷ lệ khung hình (gần vuông)
-            aspect_ratio = w / h
-            if not (self.MARKER_ASPECT_RATIO_RANGE[0] <= aspect_ratio <= self.MARKER_ASPECT_RATIO_RANGE[1]): 
-                continue 
-            
-            # 3. Lọc theo độ đặc (Density) - Marker phải là hình đặc
-            roi = img_binary_marker[y:y+h, x:x+w]
-            density = np.sum(roi == 255) / (w * h)
-            if density >= self.MIN_MARKER_DENSITY:
-                markers.append((x, y, w, h))
+        w, h = boxes[:, 2], boxes[:, 3]
+        # 1. Lọc theo kích thước + 2. tỷ lệ khung hình (gần vuông), trên cả mảng
+        keep = (w >= min_size) & (h >= min_size)
+        aspect_ratio = w / np.maximum(h, 1)
+        keep &= (aspect_ratio >= self.MARKER_ASPECT_RATIO_RANGE[0]) & (aspect_ratio <= self.MARKER_ASPECT_RATIO_RANGE[1])
+        
+        # 3. Lọc theo độ đặc (Density) - Marker phải là hình đặc (chỉ còn vài ứng viên sau 2 bước trên)
+        candidates = boxes[keep].tolist()
+        density = np.array([np.count_nonzero(img_binary_marker[y:y+h, x:x+w] == 255) / (w * h)
+                            for x, y, w, h in candidates])
+        markers = [tuple(box) for box, dense in zip(candidates, density >= self.MIN_MARKER_DENSITY) if dense]
 
         # Kiểm tra số lượng marker tìm thấy
+        self.last_marker_count = len(markers)
         if len(markers) < 4:
             app_logger.error(f"Warping Failed: Found {len(markers)} markers, expected 4.")
             raise ValueError(f"Không tìm thấy đủ 4 điểm định vị. Chỉ tìm thấy {len(markers)} điểm.")
@@ -86,57 +144,77 @@ class WarpingProcessor:
         bl_idx = np.argmax(diff)
 
         ordered_markers = [markers[tl_idx], markers[tr_idx], markers[br_idx], markers[bl_idx]]
-        app_logger.debug(f"Markers ordered successfully. Centers: {centers[tl_idx]}, {centers[tr_idx]}, ...")
+        app_logger.debug("Markers ordered successfully. Centers: %s, %s, ...", centers[tl_idx], centers[tr_idx])
         
         return ordered_markers
 
     def process_warping(self, img_bgr: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
-        Quy trình chính: Input ảnh BGR -> Output ảnh đã Warp (BGR & Binary).
+        Quy trình chính: Input ảnh BGR (hoặc ảnh xám) -> Output ảnh đã Warp (BGR & Binary).
         """
         try:
             h, w = img_bgr.shape[:2]
-            app_logger.info(f"Processing image for warping. Input size: {w}x{h}")
+            app_logger.info("Processing image for warping. Input size: %dx%d", w, h)
 
-            img_gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-            
             # Preprocess
-            img_binary_marker = self._preprocess_marker(img_gray)
-            img_binary_bubble = self._preprocess_bubble(img_gray)
-            
-            # Tìm 4 điểm
-            [tl, tr, br, bl] = self._find_and_order_markers(img_binary_marker)
-            
-            # Điểm nguồn (Source points)
-            src_pts = np.float32([
-                [tl[0], tl[1]], 
-                [tr[0], tr[1]], 
-                [br[0], br[1]], 
-                [bl[0], bl[1]] 
-            ])
-            
-            # Điểm đích (Destination points) - Lấy từ Config
-            warp_w = self.config['warp_size']['width']
-            warp_h = self.config['warp_size']['height']
-            
-            dst_pts = np.float32([
-                [0, 0], 
-                [warp_w, 0], 
-                [warp_w, warp_h], 
-                [0, warp_h]
-            ])
-            
-            # Tạo ma trận biến đổi và áp dụng
-            matrix = cv2.getPerspectiveTransform(src_pts, dst_pts)
-            warp_size = (warp_w, warp_h)
-
-            img_warped_bgr = cv2.warpPerspective(img_bgr, matrix, warp_size)
-            img_warped_binary = cv2.warpPerspective(img_binary_bubble, matrix, warp_size)
-            img_warped_marker = cv2.warpPerspective(img_binary_marker, matrix, warp_size)
+            pool = self.buffers
+            with tracer.span('threshold'):
+                img_gray = img_bgr if img_bgr.ndim == 2 else cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY,
+                                                                          dst=pooled(pool, 'gray', (h, w)))
+                img_binary_marker = self._preprocess_marker(img_gray, pool)
+                img_binary_bubble = self._preprocess_bubble(img_gray, pool)
 
+            result = self.warp_with(img_bgr, img_binary_marker, img_binary_bubble, pool)
             app_logger.info("Warping completed successfully.")
-            return img_warped_bgr, img_warped_binary, img_warped_marker
+            return result
 
         except Exception as e:
             app_logger.error(f"Error during warping process: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def warp_with(self, img_bgr: np.ndarray, img_binary_marker: np.ndarray, img_binary_bubble: np.ndarray,
+                  pool: Optional[BufferPool] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Tìm 4 marker trên ảnh nhị phân cho trước rồi warp cả 3 ảnh (BGR, bubble, marker).
+        pool: ghi ảnh warp vào bộ đệm dùng lại (tier robust không dùng: cần giữ nhiều kết quả cùng lúc).
+        """
+        # Tìm 4 điểm
+        with tracer.span('marker_search'):
+            [tl, tr, br, bl] = self._find_and_order_markers(img_binary_marker)
+        
+        # Điểm nguồn (Source points)
+        src_pts = np.float32([
+            [tl[0], tl[1]], 
+            [tr[0], tr[1]], 
+            [br[0], br[1]], 
+            [bl[0], bl[1]] 
+        ])
+        
+        # Điểm đích (Destination points) - Lấy từ Config
+        warp_w = self.config['warp_size']['width']
+        warp_h = self.config['warp_size']['height']
+        
+        dst_pts = np.float32([
+            [0, 0], 
+            [warp_w, 0], 
+            [warp_w, warp_h], 
+            [0, warp_h]
+        ])
+        
+        # Tạo ma trận biến đổi và áp dụng
+        with tracer.span('warp'):
+            matrix = cv2.getPerspectiveTransform(src_pts, dst_pts)
+            warp_size = (warp_w, warp_h)
+
+            img_warped_bgr = cv2.warpPerspective(img_bgr, matrix, warp_size,
+                                                 dst=pooled(pool, 'warped_src', (warp_h, warp_w) + img_bgr.shape[2:]))
+            img_warped_binary = cv2.warpPerspective(img_binary_bubble, matrix, warp_size,
+                                                    dst=pooled(pool, 'warped_binary', (warp_h, warp_w)))
+            img_warped_marker = cv2.warpPerspective(img_binary_marker, matrix, warp_size,
+                                                    dst=pooled(pool, 'warped_marker', (warp_h, warp_w)))
+            if img_warped_bgr.ndim == 2:
+                # Ảnh giải mã dạng xám: đổi sang BGR sau khi warp (ảnh nhỏ) để vẽ lưới màu
+                img_warped_bgr = cv2.cvtColor(img_warped_bgr, cv2.COLOR_GRAY2BGR,
+                                              dst=pooled(pool, 'warped_bgr', (warp_h, warp_w, 3)))
+
+        return img_warped_bgr, img_warped_binary, img_warped_marker
\ No newline at end of file
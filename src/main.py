@@ -4,6 +4,7 @@ Chịu trách nhiệm thiết lập môi trường và khởi chạy giao diện
 """
 
 import sys
+import multiprocessing
 import tkinter as tk
 from tkinter import messagebox
 from pathlib import Path
@@ -15,8 +16,10 @@ if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
 # Import từ các package đã tái cấu trúc
-from src.utils import app_logger
-from src.ui import OMRApplication
+# (chỉ logger ở đây; src.ui kéo theo OpenCV/core được import sau khi cửa sổ đã hiện)
+from src.utils import app_logger, FileHandler
+
+CONFIG_PATH = Path("config/app_config.json")
 
 def setup_exception_handling(root):
     """
@@ -30,6 +33,23 @@ def setup_exception_handling(root):
         
     root.report_callback_exception = report_callback_exception
 
+def show_splash(root):
+    """
+    Hiện cửa sổ (đúng tiêu đề & kích thước) kèm dòng "Đang khởi động..." ngay lập tức,
+    trong lúc nạp các module nặng. Trả về label để xoá khi giao diện chính sẵn sàng.
+    """
+    try:
+        defaults = FileHandler.load_config(CONFIG_PATH)['GUI_CONFIG']['DEFAULT_SETTINGS']
+        root.title(defaults['WINDOW_TITLE'])
+        root.geometry(defaults['GEOMETRY'])
+    except Exception as e:
+        app_logger.warning(f"Splash: cannot read window settings: {e}")
+    # place() không xung đột với grid() mà OMRApplication dùng trên root
+    splash = tk.Label(root, text="Đang khởi động...")
+    splash.place(relx=0.5, rely=0.5, anchor='center')
+    root.update()
+    return splash
+
 def main():
     """Hàm khởi chạy chính."""
     app_logger.info("==========================================")
@@ -46,14 +66,20 @@ def main():
     # 2. Thiết lập cơ chế bắt lỗi toàn cục
     setup_exception_handling(root)
 
-    # 3. Khởi tạo App Controller
+    # 3. Hiện cửa sổ trước, rồi mới nạp giao diện chính (OpenCV, core, workers)
+    splash = show_splash(root)
+
+    # 4. Khởi tạo App Controller
     try:
+        from src.ui import OMRApplication
+        splash.destroy()
         app = OMRApplication(root)
         
         # Xử lý sự kiện tắt cửa sổ an toàn
         def on_closing():
             if messagebox.askokcancel("Thoát", "Bạn có chắc chắn muốn thoát chương trình?"):
                 app_logger.info("Application closed by user.")
+                app.session.close() # Xoá file tạm của kết quả đã spill (nếu có)
                 root.destroy()
                 
         root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -68,4 +94,6 @@ def main():
         app_logger.info("Application Process Terminated.")
 
 if __name__ == "__main__":
+    # Cần thiết cho ProcessPool (xuất thẻ điểm) khi đóng gói thành file .exe trên Windows
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,4 @@
+"""
+Package Tools: Các công cụ dòng lệnh phục vụ đo hiệu năng và kiểm thử
+(chạy từ thư mục gốc dự án, VD: python -m src.tools.bench_encoding).
+"""
\ No newline at end of file
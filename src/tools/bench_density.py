@@ -0,0 +1,79 @@
+"""
+Micro-benchmark các density backend (src/core/density_backends.py) trên golden corpus:
+thời gian/tờ, sai lệch density so với thuật toán gốc, số câu đọc khác bản gốc,
+và backend mà chế độ 'auto' sẽ chọn với ngưỡng đã cho. Thoát với mã 1 nếu có backend lệch
+vượt tolerance mà nó cam kết (DensityBackend.tolerance).
+
+    python -m src.tools.bench_density --tolerance 0.02
+"""
+import argparse
+import sys
+import time
+from typing import Dict, List, Tuple
+import cv2
+import numpy as np
+
+from src.utils import FileHandler
+from src.core import WarpingProcessor, OMREngine
+from src.core.density_backends import DENSITY_BACKENDS, ReferenceBackend
+from src.tools.golden import CONFIG_PATH, corpus_images
+
+def prepare_grids(limit: int = 0) -> Tuple[List[tuple], OMREngine]:
+    """Warp + tìm lưới 1 lần cho mỗi ảnh (phần chung, không tính vào thời gian backend)."""
+    cfg = FileHandler.load_config(CONFIG_PATH)['ALGORITHM_CONFIG']
+    warp, omr = WarpingProcessor(cfg), OMREngine(cfg)
+    grids = []
+    for _, img_path in corpus_images()[:limit or None]:
+        img_bgr = cv2.imdecode(np.fromfile(str(img_path), np.uint8), cv2.IMREAD_UNCHANGED)
+        _, warped_binary, warped_marker = warp.process_warping(img_bgr)
+        top_marks = omr._find_top_marks(warped_marker)
+        # Ảnh warp nằm trong bộ đệm dùng lại của WarpingProcessor -> copy để giữ qua ảnh kế tiếp
+        grids.append((warped_binary.copy(), omr._interpolate_x_original(top_marks),
+                      omr._find_left_marks(warped_marker), omr._calculate_radius_original(top_marks)))
+    return grids, omr
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh tốc độ & độ chính xác các density backend.")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Sai lệch density tối đa chấp nhận")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=0, help="Số ảnh tối đa (0 = toàn bộ corpus)")
+    args = parser.parse_args()
+
+    grids, omr = prepare_grids(args.limit)
+    references = [ReferenceBackend().compute(*grid) for grid in grids]
+    reference_answers = [omr._read_answers(ref)[0] for ref in references]
+
+    rows: Dict[str, dict] = {}
+    for name, cls in DENSITY_BACKENDS.items():
+        backend = cls()
+        timings, drift, answer_diffs = [], 0.0, 0
+        for grid, ref, ref_answers in zip(grids, references, reference_answers):
+            result = backend.compute(*grid)
+            drift = max(drift, float(np.max(np.abs(result - ref))))
+            answer_diffs += int(np.count_nonzero(omr._read_answers(result)[0] != ref_answers))
+            for _ in range(args.repeats):
+                t0 = time.perf_counter()
+                backend.compute(*grid)
+                timings.append(time.perf_counter() - t0)
+        rows[name] = {'ms': float(np.median(timings)) * 1000, 'drift': drift,
+                      'answer_diffs': answer_diffs, 'stated_tol': cls.tolerance}
+
+    print(f"{len(grids)} sheets, {args.repeats} repeats")
+    print(f"  {'backend':<14}{'ms/sheet':>10}{'max drift':>12}{'stated tol':>12}{'answer diffs':>14}  status")
+    violations = []
+    for name, row in rows.items():
+        within = row['drift'] <= row['stated_tol']
+        if not within:
+            violations.append(name)
+        print(f"  {name:<14}{row['ms']:>10.2f}{row['drift']:>12.2e}{row['stated_tol']:>12.0e}{row['answer_diffs']:>14}  "
+              f"{'ok' if within else 'OVER TOLERANCE'}")
+
+    eligible = {name: row for name, row in rows.items() if row['drift'] <= args.tolerance and row['answer_diffs'] == 0}
+    choice = min(eligible, key=lambda name: eligible[name]['ms'])
+    print(f"\nauto (tolerance {args.tolerance}) -> {choice}")
+    if violations:
+        print(f"FAILED: {', '.join(violations)} lệch vượt tolerance đã cam kết")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
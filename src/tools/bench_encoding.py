@@ -0,0 +1,108 @@
+"""
+Benchmark mã hoá ảnh: đo số byte và thời gian (ms/ảnh) của từng chính sách OUTPUT_CONFIG
+trên ảnh kết quả chấm thật (chạy pipeline trên bộ ảnh mẫu) và trên thẻ điểm.
+
+    python -m src.tools.bench_encoding --input tests/260322_E26_T6 --set "ETS 2026" --test 6
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+import cv2
+import numpy as np
+
+from src.utils import FileHandler
+from src.utils.image_codec import ImageOutputPolicy
+from src.core import WarpingProcessor, OMREngine, ReportGenerator
+
+CONFIG_PATH = Path("config/app_config.json")
+KEY_PATH = Path("config/key.json")
+
+# Các chính sách được so sánh (cùng khoá với OUTPUT_CONFIG)
+POLICIES = [
+    {'format': 'png', 'png_level': 0},
+    {'format': 'png', 'png_level': 1},
+    {'format': 'png', 'png_level': 3},
+    {'format': 'png', 'png_level': 6},
+    {'format': 'png', 'png_level': 9},
+    {'format': 'png', 'png_level': 1, 'quantize_colors': 64},
+    {'format': 'png', 'png_level': 1, 'scale': 0.75},
+    {'format': 'jpeg', 'jpeg_quality': 90},
+    {'format': 'jpeg', 'jpeg_quality': 80},
+    {'format': 'webp', 'webp_quality': 85},
+]
+
+def load_sample_overlays(input_dir: Path, set_name: str, test_id: str, limit: int = 0) -> List[np.ndarray]:
+    """Chạy Warp + OMR trên thư mục ảnh mẫu để lấy ảnh kết quả (overlay BGR) thật."""
+    cfg = FileHandler.load_config(CONFIG_PATH)['ALGORITHM_CONFIG']
+    answer_key = FileHandler.load_key(KEY_PATH)[set_name][test_id]
+    warp, omr = WarpingProcessor(cfg), OMREngine(cfg)
+
+    overlays = []
+    files = sorted(input_dir.glob("*.jp*g"))
+    for img_path in files[:limit or None]:
+        img_bgr = cv2.imdecode(np.fromfile(str(img_path), np.uint8), cv2.IMREAD_UNCHANGED)
+        try:
+            warped_bgr, warped_binary, warped_marker = warp.process_warping(img_bgr)
+            _, overlay, _ = omr.process_omr(answer_key, warped_marker, warped_binary, warped_bgr)
+            overlays.append(overlay)
+        except Exception as e:
+            print(f"  skip {img_path.name}: {e}")
+    return overlays
+
+def bench_policy(policy: ImageOutputPolicy, images, encode, out_dir: Path) -> dict:
+    """Đo thời gian mã hoá, ghi và kích thước file trung bình cho 1 chính sách."""
+    sizes, encode_ms, write_ms = [], [], []
+    for i, image in enumerate(images):
+        t0 = time.perf_counter()
+        data = encode(policy, image)
+        t1 = time.perf_counter()
+        policy.write_bytes(out_dir / f"{i}{policy.extension}", data)
+        t2 = time.perf_counter()
+        sizes.append(len(data))
+        encode_ms.append((t1 - t0) * 1000)
+        write_ms.append((t2 - t1) * 1000)
+    return {
+        'policy': policy.describe(),
+        'bytes': int(np.mean(sizes)),
+        'encode_ms': round(float(np.mean(encode_ms)), 2),
+        'write_ms': round(float(np.mean(write_ms)), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chính sách mã hoá ảnh kết quả & thẻ điểm.")
+    parser.add_argument("--input", type=Path, default=Path("tests/260322_E26_T6"))
+    parser.add_argument("--set", dest="set_name", default="ETS 2026")
+    parser.add_argument("--test", dest="test_id", default="6")
+    parser.add_argument("--limit", type=int, default=0, help="Số ảnh tối đa (0 = tất cả)")
+    parser.add_argument("--json", type=Path, default=None, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    overlays = load_sample_overlays(args.input, args.set_name, args.test_id, args.limit)
+    if not overlays:
+        print("Không có ảnh kết quả nào để đo.")
+        return
+
+    report_gen = ReportGenerator()
+    cards = [report_gen.render_card({'Name': f"Sample {i}", 'Total': 495}, None, overlay) for i, overlay in enumerate(overlays)]
+
+    results = {'result_image': [], 'report_image': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for cfg in POLICIES:
+            policy = ImageOutputPolicy.from_config(cfg)
+            results['result_image'].append(bench_policy(policy, overlays, lambda p, img: p.encode_bgr(img), Path(tmp)))
+            results['report_image'].append(bench_policy(policy, cards, lambda p, img: p.encode_pil(img), Path(tmp)))
+
+    for target, rows in results.items():
+        print(f"\n{target} ({len(overlays)} images)")
+        print(f"  {'policy':<18}{'bytes':>12}{'encode ms':>12}{'write ms':>10}")
+        for row in rows:
+            print(f"  {row['policy']:<18}{row['bytes']:>12,}{row['encode_ms']:>12.2f}{row['write_ms']:>10.2f}")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+"""
+Benchmark tái lập được cho pipeline chấm điểm.
+
+Chạy toàn bộ pipeline (ScoringWorker, không GUI) và từng giai đoạn riêng lẻ
+(process_warping, process_omr, grade_answers, save_result_image, generate_single_report)
+trên bộ ảnh mẫu và các bộ nhân bản (x N). Kết quả: tờ/giây, p50/p95/p99 từng giai đoạn,
+peak RSS (mỗi hệ số nhân bản chạy trong 1 process riêng); lưu JSON để so sánh với baseline theo ngưỡng hồi quy.
+--session N: RAM của kết quả 1 phiên N tờ (SessionStore so với list dict cũ).
+--allocations: cấp phát bộ nhớ / tờ của warp + detect khi dùng lại bộ đệm (BufferPool) và khi không.
+
+    python -m src.tools.benchmark --replicate 1 10 --json bench.json
+    python -m src.tools.benchmark --replicate 1 10 --baseline bench.json --threshold 0.10
+    python -m src.tools.benchmark --skip-isolated --session 10000 --session-mb 64
+    python -m src.tools.benchmark --skip-isolated --allocations
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import cv2
+import numpy as np
+
+from src.utils import FileHandler
+from src.utils.image_codec import ImageDecodePolicy, ImageOutputPolicy
+from src.core import WarpingProcessor, OMREngine, GradeManager, ReportGenerator, SessionStore
+from src.workers import ScoringWorker, PipelineStats
+
+CONFIG_PATH = Path("config/app_config.json")
+KEY_PATH = Path("config/key.json")
+SCORING_REF_PATH = Path("config/scoring_ref.json")
+
+ISOLATED_STAGES = ('process_warping', 'process_omr', 'grade_answers', 'save_result_image', 'generate_single_report')
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak RSS của process hiện tại (MB): ru_maxrss (Linux / macOS) hoặc PeakWorkingSetSize (Windows).
+    Là mức cao nhất kể từ khi process khởi động -> mỗi hệ số nhân bản được đo trong 1 process riêng (spawn_run).
+    """
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        kernel32, psapi = ctypes.WinDLL('kernel32'), ctypes.WinDLL('psapi')
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def current_rss_mb() -> Optional[float]:
+    """RSS hiện tại của process (MB), đọc /proc/self/statm. None nếu không phải Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+def percentiles_ms(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples, dtype=float) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'mean_ms': round(float(values.mean()), 2), 'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2), 'p99_ms': round(float(p99), 2)}
+
+def replicate_inputs(input_dir: Path, factor: int, work_dir: Path) -> List[Path]:
+    """Nhân bản bộ ảnh mẫu factor lần (copy file thật để phần đọc đĩa được tính đúng)."""
+    sources = sorted(input_dir.glob("*.jp*g"))
+    if factor <= 1:
+        return sources
+    target = work_dir / f"x{factor}"
+    target.mkdir(parents=True, exist_ok=True)
+    files = []
+    for k in range(factor):
+        for src in sources:
+            dst = target / f"{src.stem}_r{k:03d}{src.suffix}"
+            shutil.copyfile(src, dst)
+            files.append(dst)
+    return files
+
+class _HeadlessMaster:
+    def after(self, ms, fn, *args):
+        fn(*args)
+
+class _HeadlessApp:
+    """Thay thế OMRApplication khi chạy ScoringWorker không có GUI."""
+
+    def __init__(self):
+        self.master = _HeadlessMaster()
+        self.results = []
+
+    def on_file_graded(self, img_path, result_dict, error_msg):
+        if result_dict:
+            self.results.append(result_dict)
+
+    def on_result_image_failed(self, img_path, result_dict, error_msg):
+        pass
+
+    def on_scoring_complete(self):
+        pass
+
+class Benchmark:
+    """Gom cấu hình + đối tượng pipeline dùng chung cho các lượt đo."""
+
+    def __init__(self, set_name: str, test_id: str, work_dir: Path):
+        full_config = FileHandler.load_config(CONFIG_PATH)
+        self.cfg = full_config['ALGORITHM_CONFIG']
+        self.output_cfg = full_config.get('OUTPUT_CONFIG', {})
+        self.key = FileHandler.load_key(KEY_PATH)[set_name][test_id]
+        self.scoring_ref = FileHandler.load_scoring_ref(SCORING_REF_PATH)
+        self.set_name = set_name
+        self.test_id = test_id
+        self.work_dir = work_dir
+
+    def _grade_manager(self) -> GradeManager:
+        return GradeManager(self.key, self.scoring_ref, self.set_name, self.test_id, "bench", "bench",
+                            output_policy=ImageOutputPolicy.from_config(self.output_cfg.get('result_image')))
+
+    def run_full(self, files: List[Path], tag: str) -> Dict:
+        """Toàn bộ pipeline qua ScoringWorker (chạy trên thread hiện tại)."""
+        out_dir = self.work_dir / f"full_{tag}"
+        app, stats = _HeadlessApp(), PipelineStats(window=max(200, len(files)))
+        worker = ScoringWorker(app, files, WarpingProcessor(self.cfg), OMREngine(self.cfg), self._grade_manager(),
+                               self.key, out_dir, async_write=self.output_cfg.get('async_write', True), stats=stats)
+        t0 = time.perf_counter()
+        worker.run()
+        elapsed = time.perf_counter() - t0
+        snap = stats.snapshot()
+        return {
+            'sheets': len(files),
+            'failed': snap['failed'],
+            'elapsed_s': round(elapsed, 3),
+            'sheets_per_sec': round(len(files) / elapsed, 3) if elapsed > 0 else 0.0,
+            'stages': {stage: {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2)}
+                       for stage, (p50, p95) in snap['stages'].items()},
+            'results': app.results
+        }
+
+    def run_isolated(self, files: List[Path], results: List[Dict], tag: str) -> Dict:
+        """Đo riêng từng giai đoạn trên cùng bộ ảnh (đầu vào được chuẩn bị trước, ngoài vùng đo)."""
+        warp, omr, grade = WarpingProcessor(self.cfg), OMREngine(self.cfg), self._grade_manager()
+        report_gen = ReportGenerator(output_cfg=self.output_cfg.get('report_image'))
+        out_dir = self.work_dir / f"isolated_{tag}"
+        report_dir = out_dir / "reports"
+        report_dir.mkdir(parents=True, exist_ok=True)
+        results_by_name = {res['Name']: res for res in results}
+        timings: Dict[str, List[float]] = {stage: [] for stage in ISOLATED_STAGES}
+
+        def timed(stage: str, fn: Callable, *args):
+            t0 = time.perf_counter()
+            value = fn(*args)
+            timings[stage].append(time.perf_counter() - t0)
+            return value
+
+        decode_policy = ImageDecodePolicy.from_config(self.cfg)
+        for img_path in files:
+            img_bgr, _ = decode_policy.decode(np.fromfile(str(img_path), np.uint8))
+            if img_bgr is None:
+                continue
+            try:
+                warped_bgr, warped_binary, warped_marker = timed('process_warping', warp.process_warping, img_bgr)
+                answers, overlay, _ = timed('process_omr', omr.process_omr, self.key, warped_marker, warped_binary, warped_bgr)
+            except Exception:
+                continue
+            timed('grade_answers', grade.grade_answers, answers)
+            timed('save_result_image', grade.save_result_image, img_path.stem, overlay, out_dir)
+
+            student = results_by_name.get(img_path.stem)
+            if student is not None:
+                timed('generate_single_report', report_gen.generate_single_report, student, report_dir, None, overlay)
+
+        return {stage: percentiles_ms(samples) for stage, samples in timings.items() if samples}
+
+    def run_allocations(self, files: List[Path]) -> Dict:
+        """
+        Cấp phát / tờ của process_warping + detect, có và không dùng lại bộ đệm (reuse_buffers).
+        Số lần + dung lượng lấy từ thống kê BufferPool (bỏ tờ đầu: tờ làm đầy pool);
+        peak_mb: bộ nhớ cấp phát thêm lớn nhất trong 1 tờ (tracemalloc, gồm cả mảng NumPy/OpenCV).
+        """
+        import tracemalloc
+
+        decode_policy = ImageDecodePolicy.from_config(self.cfg)
+        report = {}
+        for mode, reuse in (('pooled', True), ('fresh', False)):
+            cfg = dict(self.cfg, reuse_buffers=reuse)
+            warp, omr = WarpingProcessor(cfg), OMREngine(cfg)
+            peaks, seconds, sheets = [], [], 0
+            tracemalloc.start()
+            for k, img_path in enumerate(files):
+                img_bgr, _ = decode_policy.decode(np.fromfile(str(img_path), np.uint8))
+                if img_bgr is None:
+                    continue
+                if k == 1 and reuse:
+                    warp.buffers.reset_stats()
+                    omr.buffers.reset_stats()
+                gc.collect()
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                t0 = time.perf_counter()
+                try:
+                    _, warped_binary, warped_marker = warp.process_warping(img_bgr)
+                    omr.detect(warped_marker, warped_binary)
+                except Exception:
+                    continue
+                seconds.append(time.perf_counter() - t0)
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+                if k >= 1:
+                    sheets += 1
+            tracemalloc.stop()
+            if not peaks:
+                continue
+            entry = {'peak_mb': round(float(np.median(peaks[1:] or peaks)) / (1024 * 1024), 1),
+                     'p50_ms': round(float(np.median(seconds[1:] or seconds)) * 1000, 2)}
+            if reuse and sheets:
+                stats = [warp.buffers.stats(), omr.buffers.stats()]
+                requests = sum(st['requests'] for st in stats)
+                entry.update({
+                    'buffers_per_sheet': round(requests / sheets, 1),
+                    'allocations_per_sheet': round(sum(st['allocations'] for st in stats) / sheets, 2),
+                    'allocated_mb_per_sheet': round(sum(st['allocated_bytes'] for st in stats) / sheets / (1024 * 1024), 2),
+                    'reused_mb_per_sheet': round(sum(st['reused_bytes'] for st in stats) / sheets / (1024 * 1024), 2),
+                    'resident_mb': round(sum(st['resident_bytes'] for st in stats) / (1024 * 1024), 1)
+                })
+            report[mode] = entry
+        return report
+
+# --- SO SÁNH BASELINE ---
+def run_session(results: List[Dict], sheets: int, max_mb: int, work_dir: Path) -> Dict:
+    """
+    RAM giữ kết quả của 1 phiên `sheets` tờ (nhân bản từ kết quả thật, đổi Name):
+    SessionStore với ngân sách max_mb so với list dict như trước.
+    Đo bằng tracemalloc (RSS không giảm lại sau khi giải phóng nên không so được 2 cách trong 1 process).
+    """
+    import tracemalloc
+
+    def clone(k: int) -> Dict:
+        record = copy.deepcopy(results[k % len(results)])
+        record['Name'] = f"{record['Name']}_s{k:06d}"
+        # deepcopy dùng chung các object float: tạo list mới như kết quả của 1 tờ thật
+        record['conf'] = np.asarray(record['conf'], dtype=float).tolist()
+        return record
+
+    def traced_mb(build: Callable[[], object]):
+        gc.collect()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        kept = build()
+        elapsed = time.perf_counter() - t0
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return kept, round(current / (1024 * 1024), 1), elapsed
+
+    def fill_store() -> SessionStore:
+        store = SessionStore(max_mb * 1024 * 1024, spill_dir=work_dir / "session")
+        for k in range(sheets):
+            store.add(clone(k))
+        return store
+
+    store, store_mb, add_s = traced_mb(fill_store)
+    t0 = time.perf_counter()
+    exported = sum(1 for _ in store.records())
+    export_s = time.perf_counter() - t0
+    report = {
+        'sheets': sheets, 'max_mb': max_mb,
+        'store_mb': store_mb, 'resident_mb': round(store.nbytes / (1024 * 1024), 1), 'spilled': store.spilled,
+        'add_us_per_sheet': round(add_s / sheets * 1e6, 1), 'export_s': round(export_s, 3)
+    }
+    assert exported == sheets
+    store.close()
+    del store
+
+    # Cách cũ: mỗi tờ 1 dict (conf là list 200 float) giữ trong list của state
+    baseline, report['list_mb'], _ = traced_mb(lambda: [clone(k) for k in range(sheets)])
+    del baseline
+    gc.collect()
+    report['rss_mb'] = current_rss_mb()
+    return report
+
+def compare_with_baseline(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    So sánh 2 lần chạy theo từng hệ số nhân bản. Trả về danh sách hồi quy
+    (tờ/giây giảm, hoặc p50 của giai đoạn riêng lẻ / peak RSS tăng quá ngưỡng).
+    """
+    regressions = []
+    base_runs = {run['replicate']: run for run in baseline.get('runs', [])}
+    for run in current['runs']:
+        base = base_runs.get(run['replicate'])
+        if base is None:
+            continue
+        label = f"x{run['replicate']}"
+
+        old_rate, new_rate = base['full']['sheets_per_sec'], run['full']['sheets_per_sec']
+        if old_rate > 0:
+            change = (new_rate - old_rate) / old_rate
+            print(f"  {label:<5}{'sheets/sec':<26}{old_rate:>10.2f}{new_rate:>10.2f}{change:>+9.1%}")
+            if change < -threshold:
+                regressions.append(f"{label} sheets/sec {old_rate:.2f} -> {new_rate:.2f} ({change:+.1%})")
+
+        old_rss, new_rss = base.get('peak_rss_mb'), run.get('peak_rss_mb')
+        if old_rss and new_rss is not None:
+            change = (new_rss - old_rss) / old_rss
+            print(f"  {label:<5}{'peak RSS MB':<26}{old_rss:>10.1f}{new_rss:>10.1f}{change:>+9.1%}")
+            if change > threshold:
+                regressions.append(f"{label} peak RSS {old_rss:.1f} -> {new_rss:.1f} MB ({change:+.1%})")
+
+        for stage, stats in run['isolated'].items():
+            old = base['isolated'].get(stage)
+            if not old or old['p50_ms'] <= 0:
+                continue
+            change = (stats['p50_ms'] - old['p50_ms']) / old['p50_ms']
+            print(f"  {label:<5}{stage + ' p50 ms':<26}{old['p50_ms']:>10.2f}{stats['p50_ms']:>10.2f}{change:>+9.1%}")
+            if change > threshold:
+                regressions.append(f"{label} {stage} p50 {old['p50_ms']:.2f} -> {stats['p50_ms']:.2f} ms ({change:+.1%})")
+    return regressions
+
+def measure_run(args: argparse.Namespace, factor: int, work_dir: Path) -> Dict:
+    """Đo 1 hệ số nhân bản (toàn bộ pipeline, từng giai đoạn, tuỳ chọn allocations / session) và in kết quả."""
+    bench = Benchmark(args.set_name, args.test_id, work_dir)
+    files = replicate_inputs(args.input, factor, work_dir)
+    print(f"\n== x{factor}: {len(files)} sheets ==")
+    full = bench.run_full(files, f"x{factor}")
+    results = full.pop('results')
+    isolated = {} if args.skip_isolated else bench.run_isolated(files, results, f"x{factor}")
+    run = {'replicate': factor, 'full': full, 'isolated': isolated, 'peak_rss_mb': peak_rss_mb()}
+
+    print(f"  full pipeline: {full['sheets_per_sec']:.2f} sheets/s ({full['elapsed_s']:.2f}s, failed {full['failed']}), "
+          f"peak RSS {run['peak_rss_mb']} MB")
+    for stage, stats in full['stages'].items():
+        print(f"    {stage:<10}p50 {stats['p50_ms']:>8.2f} ms   p95 {stats['p95_ms']:>8.2f} ms")
+    for stage, stats in isolated.items():
+        print(f"  {stage:<24}p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  p99 {stats['p99_ms']:>8.2f} ms")
+    if args.allocations:
+        run['allocations'] = allocations = bench.run_allocations(files)
+        for mode, entry in allocations.items():
+            print(f"  allocations [{mode}]: peak +{entry['peak_mb']} MB/sheet, warp+detect p50 {entry['p50_ms']} ms"
+                  + (f", {entry['allocations_per_sheet']}/{entry['buffers_per_sheet']} buffers allocated/sheet "
+                     f"({entry['allocated_mb_per_sheet']} MB new, {entry['reused_mb_per_sheet']} MB reused), "
+                     f"pool {entry['resident_mb']} MB" if 'resident_mb' in entry else ""))
+    if args.session and results:
+        session = run_session(results, args.session, args.session_mb, work_dir)
+        run['session'] = session
+        print(f"  session x{session['sheets']}: SessionStore {session['store_mb']} MB "
+              f"(budget {session['max_mb']} MB, spilled {session['spilled']}) vs list of dicts {session['list_mb']} MB; "
+              f"add {session['add_us_per_sheet']} us/sheet, CSV rows {session['export_s']} s, RSS {session['rss_mb']} MB")
+    return run
+
+def spawn_run(factor: int, work_dir: Path) -> Dict:
+    """
+    Chạy measure_run cho 1 hệ số nhân bản trong process mới (cùng tham số dòng lệnh):
+    peak RSS là mức cao nhất của process nên chỉ đúng cho lượt đo đầu tiên của 1 process.
+    """
+    run_json = work_dir / f"run_x{factor}.json"
+    child_dir = work_dir / f"run_x{factor}"
+    child_dir.mkdir(parents=True, exist_ok=True)
+    command = [sys.executable, "-m", "src.tools.benchmark", *sys.argv[1:],
+               "--run-one", str(factor), "--run-json", str(run_json), "--work-dir", str(child_dir)]
+    sys.stdout.flush()
+    subprocess.run(command, check=True)
+    return json.loads(run_json.read_text(encoding="utf-8"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline chấm điểm (toàn bộ + từng giai đoạn).")
+    parser.add_argument("--input", type=Path, default=Path("tests/260322_E26_T6"))
+    parser.add_argument("--set", dest="set_name", default="ETS 2026")
+    parser.add_argument("--test", dest="test_id", default="6")
+    parser.add_argument("--replicate", type=int, nargs="+", default=[1], help="Các hệ số nhân bản bộ ảnh (VD: 1 10 50)")
+    parser.add_argument("--skip-isolated", action="store_true", help="Chỉ đo toàn bộ pipeline")
+    parser.add_argument("--json", type=Path, default=None, help="Ghi kết quả ra file JSON")
+    parser.add_argument("--baseline", type=Path, default=None, help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Ngưỡng hồi quy (0.10 = chậm hơn 10%%)")
+    parser.add_argument("--allocations", action="store_true", help="Đo cấp phát bộ nhớ / tờ (có / không dùng lại bộ đệm)")
+    parser.add_argument("--session", type=int, default=0, help="Đo RAM kết quả của 1 phiên N tờ (0 = bỏ qua)")
+    parser.add_argument("--session-mb", type=int, default=64, help="Ngân sách RAM của SessionStore khi đo --session")
+    # Nội bộ: đo 1 hệ số nhân bản trong process con (spawn_run), kết quả ghi ra file JSON
+    parser.add_argument("--run-one", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--run-json", type=Path, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", type=Path, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one is not None:
+        run = measure_run(args, args.run_one, args.work_dir)
+        args.run_json.write_text(json.dumps(run, ensure_ascii=False), encoding="utf-8")
+        return
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count(),
+            'input': str(args.input),
+            'set': args.set_name,
+            'test': args.test_id
+        },
+        'runs': []
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for factor in args.replicate:
+            report['runs'].append(spawn_run(factor, Path(tmp)))
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\nSaved: {args.json}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        print(f"\nSo sánh với baseline {args.baseline} (ngưỡng {args.threshold:.0%}):")
+        regressions = compare_with_baseline(report, baseline, args.threshold)
+        if regressions:
+            print("\nHỒI QUY:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nKhông có hồi quy.")
+
+if __name__ == "__main__":
+    main()
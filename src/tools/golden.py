@@ -0,0 +1,273 @@
+"""
+Golden corpus: cổng kiểm tra độ chính xác cho mọi thay đổi hiệu năng.
+
+Ghi lại đầu ra hiện tại (đáp án, độ tin cậy, ma trận density, điểm) của bộ ảnh mẫu và bộ phiếu
+tổng hợp vào tests/golden; sau đó chạy bất kỳ biến thể engine nào trên corpus đó và báo cáo
+chênh lệch từng câu, độ lệch confidence/density và điểm.
+
+    python -m src.tools.golden record
+    python -m src.tools.golden check
+    python -m src.tools.golden check --engine my_module:FastOMREngine --set density_backend=integral
+    python -m src.tools.golden check --full-decode
+
+Ảnh được giải mã theo ALGORITHM_CONFIG['decode'] (giải mã thu nhỏ ảnh lớn) như ScoringWorker, cả lúc
+record lẫn check: corpus phản ánh đúng đường chạy của app. --full-decode giải mã đủ độ phân giải;
+check cảnh báo khi cách giải mã khác với lúc record (sai lệch khi đó không phải do engine).
+
+Ngưỡng mặc định: max(0.02, tolerance mà density backend đang dùng cam kết), VD integral -> 0.1;
+confidence tính từ density nên dùng cùng ngưỡng. --conf-tol / --density-tol ghi đè.
+"""
+import argparse
+import importlib
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+from src.utils import FileHandler
+from src.utils.image_codec import ImageDecodePolicy
+
+CONFIG_PATH = Path("config/app_config.json")
+KEY_PATH = Path("config/key.json")
+SCORING_REF_PATH = Path("config/scoring_ref.json")
+
+GOLDEN_DIR = Path("tests/golden")
+SAMPLE_DIR = Path("tests/260322_E26_T6")
+SYNTHETIC_DIR = GOLDEN_DIR / "synthetic"
+SET_NAME, TEST_ID = "ETS 2026", "6"
+
+# Bộ phiếu tổng hợp trong corpus: vài mức độ khó khác nhau (tô nhạt, xoay, méo, nhiễu)
+SYNTHETIC_PROFILES = [
+    {'count': 4, 'seed': 101},
+    {'count': 3, 'seed': 102, 'pencil_density': 0.55, 'fill_coverage': 0.75},
+    {'count': 3, 'seed': 103, 'rotation': 1.5, 'perspective': 0.004},
+    {'count': 2, 'seed': 104, 'noise': 10.0, 'blur': 5, 'blank_rate': 0.1},
+]
+SYNTHETIC_SCALE = 1.25
+
+# Ngưỡng sai lệch tối thiểu của confidence / density khi không chỉ định --conf-tol / --density-tol
+DEFAULT_TOLERANCE = 0.02
+
+SCORE_FIELDS = ['part_1', 'part_2', 'part_3', 'part_4', 'part_5', 'part_6', 'part_7', 'LC', 'RC', 'Total',
+                'lc_1', 'lc_2', 'lc_3', 'lc_4', 'rc_1', 'rc_2', 'rc_3', 'rc_4', 'rc_5']
+
+def load_class(spec: str) -> Callable:
+    """'module.path:ClassName' -> class/factory."""
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+def parse_overrides(pairs: List[str]) -> Dict[str, Any]:
+    """['density_backend=integral', 'x=1'] -> dict (giá trị parse theo JSON nếu được)."""
+    overrides = {}
+    for pair in pairs:
+        key, _, raw = pair.partition("=")
+        try:
+            overrides[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            overrides[key] = raw
+    return overrides
+
+class EngineVariant:
+    """Bộ 3 Warp/OMR/Grade cần kiểm tra (mặc định là engine hiện tại)."""
+
+    def __init__(self, warp_spec: str = "src.core:WarpingProcessor", engine_spec: str = "src.core:OMREngine",
+                 grade_spec: str = "src.core:GradeManager", overrides: Optional[Dict[str, Any]] = None,
+                 full_decode: bool = False):
+        cfg = FileHandler.load_config(CONFIG_PATH)['ALGORITHM_CONFIG']
+        cfg.update(overrides or {})
+        key = FileHandler.load_key(KEY_PATH)[SET_NAME][TEST_ID]
+        scoring_ref = FileHandler.load_scoring_ref(SCORING_REF_PATH)
+
+        self.decode_policy = None if full_decode else ImageDecodePolicy.from_config(cfg)
+        self.description = {'warp': warp_spec, 'engine': engine_spec, 'grade': grade_spec, 'overrides': overrides or {},
+                            'decode': self.describe_decode()}
+        self.key = key
+        self.warp = load_class(warp_spec)(cfg)
+        self.omr = load_class(engine_spec)(cfg)
+        self.grade = load_class(grade_spec)(key, scoring_ref, SET_NAME, TEST_ID)
+
+    def describe_decode(self) -> Dict[str, Any]:
+        policy = self.decode_policy
+        if policy is None:
+            return {'reduced': False, 'grayscale': False}
+        return {'reduced': policy.reduced, 'min_scale': policy.min_scale, 'grayscale': policy.grayscale}
+
+    def stated_tolerance(self) -> float:
+        """Ngưỡng mặc định theo density backend của engine (auto: backend đã được chọn)."""
+        backend = getattr(self.omr, 'density_backend', None)
+        backend = getattr(backend, 'selected', None) or backend
+        return max(DEFAULT_TOLERANCE, float(getattr(backend, 'tolerance', 0.0)))
+
+    def run(self, img_path: Path) -> Dict[str, Any]:
+        stream = np.fromfile(str(img_path), np.uint8)
+        if self.decode_policy is not None:
+            img_bgr, _ = self.decode_policy.decode(stream)
+        else:
+            img_bgr = cv2.imdecode(stream, cv2.IMREAD_UNCHANGED)
+        if img_bgr is None:
+            raise ValueError(f"Không thể đọc ảnh {img_path}")
+        warped_bgr, warped_binary, warped_marker = self.warp.process_warping(img_bgr)
+        detection = self.omr.detect(warped_marker, warped_binary)
+        answers, conf_stats = self.omr.summarize(detection)
+        parts = self.grade.grade_answers(answers)
+        return {
+            'answers': ''.join(answers),
+            'confidences': np.asarray(conf_stats['confidences_list'], dtype=np.float64),
+            'density': np.asarray(detection['density_matrix'], dtype=np.float32),
+            'scores': {field: parts[field] for field in SCORE_FIELDS}
+        }
+
+def corpus_images() -> List[Tuple[str, Path]]:
+    """Danh sách (id, đường dẫn) của corpus: ảnh mẫu thật + phiếu tổng hợp."""
+    items = [(f"sample/{p.stem}", p) for p in sorted(SAMPLE_DIR.glob("*.jp*g"))]
+    items += [(f"synthetic/{p.stem}", p) for p in sorted(SYNTHETIC_DIR.glob("*.jpg"))]
+    return items
+
+def build_synthetic():
+    """Sinh (1 lần) các phiếu tổng hợp của corpus; file JPEG được lưu lại để corpus cố định."""
+    from src.tools.synthetic_sheet import SyntheticSheetGenerator
+
+    truth = {}
+    for index, profile in enumerate(SYNTHETIC_PROFILES):
+        params = {k: v for k, v in profile.items() if k != 'count'}
+        generator = SyntheticSheetGenerator(scale=SYNTHETIC_SCALE, **params)
+        for item in generator.generate(profile['count'], SYNTHETIC_DIR, jpeg_quality=85, prefix=f"p{index}"):
+            truth[item['name']] = item['answers']
+    # Gộp ground truth của các profile (generate() ghi đè file theo từng lượt)
+    (SYNTHETIC_DIR / "ground_truth.json").write_text(json.dumps({'profiles': SYNTHETIC_PROFILES, 'sheets': truth}, indent=1), encoding="utf-8")
+
+def record(variant: EngineVariant, regenerate_synthetic: bool = False):
+    if regenerate_synthetic or not SYNTHETIC_DIR.exists():
+        build_synthetic()
+
+    sheets, densities = [], {}
+    for sheet_id, img_path in corpus_images():
+        out = variant.run(img_path)
+        sheets.append({
+            'id': sheet_id,
+            'answers': out['answers'],
+            'confidences': [round(float(c), 4) for c in out['confidences']],
+            'scores': out['scores']
+        })
+        densities[sheet_id] = out['density']
+        print(f"  recorded {sheet_id}: Total {out['scores']['Total']}")
+
+    GOLDEN_DIR.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(GOLDEN_DIR / "densities.npz", **densities)
+    (GOLDEN_DIR / "golden.json").write_text(json.dumps({
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'engine': variant.description,
+        'set': SET_NAME, 'test': TEST_ID,
+        'sheets': sheets
+    }, indent=1, ensure_ascii=False), encoding="utf-8")
+    print(f"Golden corpus: {len(sheets)} phiếu -> {GOLDEN_DIR}")
+
+def check(variant: EngineVariant, conf_tol: Optional[float] = None, density_tol: Optional[float] = None) -> Dict[str, Any]:
+    """
+    So sánh biến thể với corpus. Trả về báo cáo (passed = không có khác biệt vượt ngưỡng).
+    Ngưỡng None -> variant.stated_tolerance(), xác định sau tờ đầu tiên (lúc 'auto' đã chọn backend).
+    """
+    golden = json.loads((GOLDEN_DIR / "golden.json").read_text(encoding="utf-8"))
+    golden_density = np.load(GOLDEN_DIR / "densities.npz")
+    synthetic_truth = {}
+    truth_path = SYNTHETIC_DIR / "ground_truth.json"
+    if truth_path.exists():
+        synthetic_truth = json.loads(truth_path.read_text(encoding="utf-8"))['sheets']
+
+    recorded_decode = golden['engine'].get('decode', {'reduced': False, 'grayscale': False})
+    if recorded_decode != variant.description['decode']:
+        print(f"  WARNING: corpus được record với decode {recorded_decode}, đang check với "
+              f"{variant.description['decode']} -> sai lệch gồm cả phần giải mã ảnh")
+
+    images = dict(corpus_images())
+    report = {'engine': variant.description, 'sheets': [], 'passed': True,
+              'max_conf_drift': 0.0, 'max_density_drift': 0.0, 'answer_diffs': 0}
+
+    for entry in golden['sheets']:
+        sheet_id = entry['id']
+        result = {'id': sheet_id, 'answer_diffs': [], 'score_diffs': {}}
+        try:
+            out = variant.run(images[sheet_id])
+        except Exception as e:
+            result['error'] = str(e)
+            report['sheets'].append(result)
+            report['passed'] = False
+            continue
+        if 'conf_tol' not in report:
+            stated = variant.stated_tolerance()
+            report['conf_tol'] = stated if conf_tol is None else conf_tol
+            report['density_tol'] = stated if density_tol is None else density_tol
+
+        result['answer_diffs'] = [
+            (q + 1, want, got) for q, (want, got) in enumerate(zip(entry['answers'], out['answers'])) if want != got
+        ]
+        result['conf_drift'] = float(np.max(np.abs(out['confidences'] - np.asarray(entry['confidences']))))
+        result['density_drift'] = float(np.max(np.abs(out['density'] - golden_density[sheet_id])))
+        for field, want in entry['scores'].items():
+            got = out['scores'][field]
+            if abs(got - want) > 1e-6:
+                result['score_diffs'][field] = (want, got)
+
+        # Độ chính xác so với ground truth (chỉ có ở phiếu tổng hợp)
+        truth = synthetic_truth.get(sheet_id.split("/", 1)[1]) if sheet_id.startswith("synthetic/") else None
+        if truth is not None:
+            result['truth_errors'] = sum(1 for want, got in zip(truth, out['answers']) if want != got)
+
+        ok = (not result['answer_diffs'] and not result['score_diffs']
+              and result['conf_drift'] <= report['conf_tol'] and result['density_drift'] <= report['density_tol'])
+        result['passed'] = ok
+        report['passed'] &= ok
+        report['answer_diffs'] += len(result['answer_diffs'])
+        report['max_conf_drift'] = max(report['max_conf_drift'], result['conf_drift'])
+        report['max_density_drift'] = max(report['max_density_drift'], result['density_drift'])
+        report['sheets'].append(result)
+    return report
+
+def print_report(report: Dict[str, Any]):
+    for result in report['sheets']:
+        if 'error' in result:
+            print(f"  FAIL {result['id']}: {result['error']}")
+            continue
+        status = "ok  " if result['passed'] else "DIFF"
+        line = f"  {status} {result['id']:<40} conf Δ {result['conf_drift']:.4f}  density Δ {result['density_drift']:.4f}"
+        if 'truth_errors' in result:
+            line += f"  truth err {result['truth_errors']}"
+        print(line)
+        for q, want, got in result['answer_diffs'][:20]:
+            print(f"       Q{q}: {want} -> {got}")
+        for field, (want, got) in result['score_diffs'].items():
+            print(f"       {field}: {want} -> {got}")
+    print(f"\nAnswer diffs: {report['answer_diffs']} | max conf Δ {report['max_conf_drift']:.4f} (tol {report.get('conf_tol')}) | "
+          f"max density Δ {report['max_density_drift']:.4f} (tol {report.get('density_tol')})")
+    print("PARITY OK" if report['passed'] else "PARITY FAILED")
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden corpus: ghi lại & kiểm tra parity của engine nhận dạng.")
+    parser.add_argument("command", choices=["record", "check"])
+    parser.add_argument("--warp", default="src.core:WarpingProcessor", help="module:Class của WarpingProcessor cần kiểm tra")
+    parser.add_argument("--engine", default="src.core:OMREngine", help="module:Class của OMREngine cần kiểm tra")
+    parser.add_argument("--grade", default="src.core:GradeManager", help="module:Class của GradeManager cần kiểm tra")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], help="Ghi đè ALGORITHM_CONFIG (key=value)")
+    parser.add_argument("--full-decode", action="store_true", help="Giải mã đủ độ phân giải thay vì theo ALGORITHM_CONFIG['decode']")
+    parser.add_argument("--conf-tol", type=float, default=None, help="Mặc định: theo tolerance của density backend")
+    parser.add_argument("--density-tol", type=float, default=None, help="Mặc định: theo tolerance của density backend")
+    parser.add_argument("--regenerate-synthetic", action="store_true", help="Sinh lại phiếu tổng hợp khi record")
+    parser.add_argument("--json", type=Path, default=None, help="Ghi báo cáo check ra file JSON")
+    args = parser.parse_args()
+
+    variant = EngineVariant(args.warp, args.engine, args.grade, parse_overrides(args.overrides), args.full_decode)
+    if args.command == "record":
+        record(variant, args.regenerate_synthetic)
+        return
+
+    report = check(variant, args.conf_tol, args.density_tol)
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=1, ensure_ascii=False), encoding="utf-8")
+    sys.exit(0 if report['passed'] else 1)
+
+if __name__ == "__main__":
+    main()
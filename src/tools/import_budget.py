@@ -0,0 +1,100 @@
+"""
+Ngân sách thời gian import (cold start) cho các điểm vào của ứng dụng.
+
+Mỗi kịch bản chạy trong 1 interpreter mới (không có cache import), đo thời gian import
+(median của nhiều lần chạy) và kiểm tra các module nặng không được nạp sớm.
+Thoát với mã 1 nếu vượt ngân sách hoặc nạp module cấm -> dùng được trong CI.
+
+    python -m src.tools.import_budget
+    python -m src.tools.import_budget --runs 7 --budget cli=150 --detail cli
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# name -> câu lệnh import (stmt), ngân sách ms, các module không được nạp
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    # Đến lúc cửa sổ hiện lên (main.py chỉ import tkinter + logger)
+    'gui_window': {'stmt': "import src.main", 'budget_ms': 150,
+                   'forbidden': ['cv2', 'pandas', 'PIL', 'src.core', 'src.ui.app_window']},
+    # Giao diện chính đầy đủ (sau splash)
+    'gui_full': {'stmt': "from src.ui import OMRApplication", 'budget_ms': 400,
+                 'forbidden': ['pandas']},
+    # Nhận dạng headless (CLI / benchmark): không cần pandas, tkinter, PIL
+    'cli': {'stmt': "from src.core import WarpingProcessor, OMREngine, GradeManager", 'budget_ms': 250,
+            'forbidden': ['pandas', 'tkinter', 'PIL']},
+    # Process con của ProcessPool xuất thẻ điểm (chỉ cần PIL)
+    'pool_worker': {'stmt': "from src.core.report_generator import _init_report_worker", 'budget_ms': 250,
+                    'forbidden': ['pandas', 'tkinter', 'cv2']},
+}
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+{stmt}
+elapsed = (time.perf_counter() - t0) * 1000
+print(json.dumps({{'ms': elapsed, 'loaded': [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+def measure(stmt: str, forbidden: List[str], runs: int) -> Dict[str, Any]:
+    """Chạy câu lệnh import trong `runs` interpreter mới, trả về median ms + module cấm đã nạp."""
+    timings, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(stmt=stmt, forbidden=forbidden)],
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(result['ms'])
+        loaded.update(result['loaded'])
+    timings.sort()
+    return {'median_ms': timings[len(timings) // 2], 'min_ms': timings[0], 'loaded': sorted(loaded)}
+
+def print_detail(stmt: str, top: int = 15):
+    """Các module tốn thời gian nhất (python -X importtime, cột cumulative)."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", stmt], capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    for cumulative_us, module in sorted(rows, reverse=True)[:top]:
+        print(f"      {cumulative_us / 1000:8.1f} ms {module}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra ngân sách thời gian import của GUI / CLI / pool worker.")
+    parser.add_argument("--runs", type=int, default=5, help="Số lần chạy mỗi kịch bản (lấy median)")
+    parser.add_argument("--budget", action="append", default=[], help="Ghi đè ngân sách: name=ms")
+    parser.add_argument("--only", nargs="*", default=None, help="Chỉ chạy các kịch bản này")
+    parser.add_argument("--detail", nargs="*", default=[], help="In các module import chậm nhất của kịch bản")
+    parser.add_argument("--json", default=None, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    budgets = {name: spec['budget_ms'] for name, spec in SCENARIOS.items()}
+    for pair in args.budget:
+        name, _, value = pair.partition("=")
+        budgets[name] = float(value)
+
+    results, passed = {}, True
+    print(f"{'scenario':<14}{'median ms':>11}{'min ms':>9}{'budget':>9}  status")
+    for name, spec in SCENARIOS.items():
+        if args.only and name not in args.only:
+            continue
+        result = measure(spec['stmt'], spec['forbidden'], args.runs)
+        result['budget_ms'] = budgets[name]
+        result['passed'] = result['median_ms'] <= budgets[name] and not result['loaded']
+        passed &= result['passed']
+        results[name] = result
+
+        status = "ok" if result['passed'] else "OVER BUDGET" if not result['loaded'] else f"LOADED {', '.join(result['loaded'])}"
+        print(f"{name:<14}{result['median_ms']:>11.0f}{result['min_ms']:>9.0f}{budgets[name]:>9.0f}  {status}")
+        if name in args.detail:
+            print_detail(spec['stmt'])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Tổng hợp theo ngày từ luồng metrics (logs/metrics/metrics_<ngày>.jsonl, xem src/utils/metrics.py):
+số tờ, tỉ lệ lỗi, tốc độ, phân vị độ trễ từng giai đoạn, phân bố độ tin cậy.
+Tờ cần review (low_conf_sheets): min confidence < ALGORITHM_CONFIG.conf_threshold, cùng ngưỡng GUI dùng để gắn cờ.
+
+    python -m src.tools.metrics_rollup
+    python -m src.tools.metrics_rollup --since 2026-03-01 --csv rollup.csv
+"""
+import argparse
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+
+from src.utils import FileHandler
+from src.workers.pipeline_stats import PipelineStats
+
+METRICS_DIR = Path("logs/metrics")
+CONFIG_PATH = Path("config/app_config.json")
+PERCENTILES = (50, 95, 99)
+
+def iter_records(metrics_dir: Path, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Đọc lần lượt các bản ghi (bỏ qua dòng hỏng, ví dụ dòng cuối đang ghi dở)."""
+    for path in sorted(metrics_dir.glob("metrics_*.jsonl")):
+        day = path.stem.split("_", 1)[1]
+        if (since and day < since) or (until and day > until):
+            continue
+        with open(path, encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+def review_threshold(config_path: Path = CONFIG_PATH) -> float:
+    """Ngưỡng min confidence mà GUI gắn cờ tờ cần review (ALGORITHM_CONFIG.conf_threshold)."""
+    return float(FileHandler.load_config(config_path)['ALGORITHM_CONFIG']['conf_threshold'])
+
+def rollup(records: Iterator[Dict[str, Any]], low_conf: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Gom bản ghi theo ngày -> danh sách dòng tổng hợp (sắp theo ngày). low_conf: None = review_threshold()."""
+    if low_conf is None:
+        low_conf = review_threshold()
+    days: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for rec in records:
+        days[rec['ts'][:10]].append(rec)
+
+    rows = []
+    for day, recs in sorted(days.items()):
+        failures = sum(1 for r in recs if not r.get('ok'))
+        escalated = sum(1 for r in recs if r.get('escalated'))
+        rescued = sum(1 for r in recs if r.get('ok') and str(r.get('tier', '')).startswith('robust'))
+        # Tốc độ: số tờ / tổng thời gian chạy của các phiên (tính theo timestamp đầu-cuối mỗi phiên)
+        sessions: Dict[str, List[datetime]] = defaultdict(list)
+        for r in recs:
+            sessions[r.get('session', '')].append(datetime.fromisoformat(r['ts']))
+        busy = sum((max(ts) - min(ts)).total_seconds() for ts in sessions.values())
+        throughput = (len(recs) - len(sessions)) / busy if busy > 0 else None
+
+        stage_values: Dict[str, List[float]] = defaultdict(list)
+        for r in recs:
+            for stage, ms in r.get('stages', {}).items():
+                stage_values[stage].append(ms)
+            if 'duration_ms' in r:
+                stage_values['sheet'].append(r['duration_ms'])
+        order = list(PipelineStats.STAGES) + ['sheet']
+        latency = {stage: _percentiles(stage_values[stage]) for stage in order if stage_values.get(stage)}
+
+        confs = [r['avg_conf'] for r in recs if r.get('avg_conf') is not None]
+        min_confs = [r['min_conf'] for r in recs if r.get('min_conf') is not None]
+        rows.append({
+            'day': day,
+            'sheets': len(recs),
+            'sessions': len(sessions),
+            'failures': failures,
+            'failure_rate': round(failures / len(recs), 4),
+            'escalated': escalated,
+            'robust_sheets': rescued,
+            'throughput': round(throughput, 3) if throughput is not None else None,
+            'avg_conf': round(float(np.mean(confs)), 4) if confs else None,
+            'min_conf': round(float(np.min(min_confs)), 4) if min_confs else None,
+            'low_conf_sheets': sum(1 for c in min_confs if c < low_conf),
+            'latency_ms': latency
+        })
+    return rows
+
+def flatten(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Dòng tổng hợp -> dict phẳng (cột CSV: <stage>_p50, ...)."""
+    flat = {k: v for k, v in row.items() if k != 'latency_ms'}
+    for stage, values in row['latency_ms'].items():
+        for name, value in values.items():
+            flat[f"{stage}_{name}"] = value
+    return flat
+
+def print_rollup(rows: List[Dict[str, Any]]):
+    if not rows:
+        print("Không có bản ghi metrics.")
+        return
+    print(f"{'day':<12}{'sheets':>8}{'fail %':>8}{'sheets/s':>10}{'avg conf':>10}{'min conf':>10}{'low conf':>10}{'escalated':>11}{'robust':>8}")
+    for row in rows:
+        throughput = "-" if row['throughput'] is None else f"{row['throughput']:.2f}"
+        avg_conf = "-" if row['avg_conf'] is None else f"{row['avg_conf']:.3f}"
+        min_conf = "-" if row['min_conf'] is None else f"{row['min_conf']:.3f}"
+        print(f"{row['day']:<12}{row['sheets']:>8}{row['failure_rate'] * 100:>8.1f}{throughput:>10}"
+              f"{avg_conf:>10}{min_conf:>10}{row['low_conf_sheets']:>10}"
+              f"{row.get('escalated', 0):>11}{row.get('robust_sheets', 0):>8}")
+        print("    p50/p95/p99 ms: " + "  ".join(
+            f"{stage} {v['p50']:.0f}/{v['p95']:.0f}/{v['p99']:.0f}" for stage, v in row['latency_ms'].items()
+        ))
+
+def main():
+    parser = argparse.ArgumentParser(description="Tổng hợp metrics chấm điểm theo ngày.")
+    parser.add_argument("--dir", type=Path, default=METRICS_DIR, help="Thư mục metrics_*.jsonl")
+    parser.add_argument("--since", default=None, help="Từ ngày (YYYY-MM-DD)")
+    parser.add_argument("--until", default=None, help="Đến ngày (YYYY-MM-DD)")
+    parser.add_argument("--low-conf", type=float, default=None,
+                        help="Ngưỡng min confidence để đếm tờ cần review (mặc định: conf_threshold trong app_config.json)")
+    parser.add_argument("--csv", type=Path, default=None, help="Ghi bảng tổng hợp ra CSV (vẽ biểu đồ)")
+    parser.add_argument("--json", type=Path, default=None, help="Ghi bảng tổng hợp ra JSON")
+    args = parser.parse_args()
+
+    rows = rollup(iter_records(args.dir, args.since, args.until), args.low_conf)
+    print_rollup(rows)
+
+    if args.json:
+        args.json.write_text(json.dumps(rows, indent=1), encoding="utf-8")
+    if args.csv and rows:
+        flat_rows = [flatten(row) for row in rows]
+        fields = list(dict.fromkeys(key for row in flat_rows for key in row))
+        with open(args.csv, "w", newline="", encoding="utf-8") as fp:
+            writer = csv.DictWriter(fp, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(flat_rows)
+
+if __name__ == "__main__":
+    main()
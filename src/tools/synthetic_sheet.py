@@ -0,0 +1,256 @@
+"""
+Sinh phiếu trả lời TOEIC tổng hợp (synthetic) theo bố cục phiếu (config/layouts) mà WarpingProcessor/OMREngine
+nhận dạng: 4 marker góc, vạch định vị biên trên / biên trái và các ô (toeic_200: 9 + 25 vạch, 200 câu 8 nhóm x 25 hàng).
+Mỗi phiếu có đáp án ngẫu nhiên kèm ground truth; điều chỉnh được độ đậm bút chì, nhiễu, blur,
+xoay và méo phối cảnh. Dùng cho load test và kiểm tra độ chính xác ở quy mô lớn.
+
+    python -m src.tools.synthetic_sheet --count 1000 --out data/synthetic --seed 1
+    python -m src.tools.synthetic_sheet --count 50 --out data/synthetic --rotation 1.5 --verify
+    python -m src.tools.synthetic_sheet --count 20 --out data/synthetic_100 --layout toeic_100 --verify
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import cv2
+import numpy as np
+from src.core.sheet_layout import DEFAULT_LAYOUT, SheetLayout
+
+# --- KÍCH THƯỚC (toạ độ trong không gian ảnh đã warp 1320x869, đo từ phiếu thật) ---
+# Tâm các vạch định vị lấy từ layout.reference, toạ độ cột bubble từ công thức của bố cục
+WARP_W, WARP_H = 1320, 869
+TOP_MARK_Y = 18
+TOP_MARK_SIZE = 24
+LEFT_MARK_X = 16
+LEFT_MARK_W, LEFT_MARK_H = 28, 16
+BUBBLE_RADIUS = 11
+MARKER_SIZE = 40   # Marker góc (hình vuông đặc)
+PAGE_MARGIN = 60   # Lề giấy quanh vùng warp
+
+class SyntheticSheetGenerator:
+    """
+    Vẽ phiếu trả lời tổng hợp (ảnh BGR như ảnh scan).
+
+    Args:
+        scale: Độ phân giải so với không gian warp (2.0 -> ảnh ~2960x2000).
+        pencil_density: Độ đậm nét tô (0 = trắng, 1 = đen tuyệt đối).
+        density_jitter: Dao động ngẫu nhiên của độ đậm giữa các ô.
+        fill_coverage: Tỷ lệ bán kính vùng tô so với ô (tô không kín < 1).
+        blank_rate: Xác suất bỏ trống 1 câu.
+        noise: Độ lệch chuẩn nhiễu Gaussian (mức xám).
+        blur: Kích thước kernel Gaussian blur (0 = không blur).
+        rotation: Góc xoay ngẫu nhiên tối đa (độ).
+        perspective: Độ méo phối cảnh tối đa (tỷ lệ theo kích thước ảnh).
+        layout: Tên bố cục phiếu (config/layouts) hoặc đường dẫn file .json.
+    """
+
+    NOISE_BANK_SIZE = 4
+
+    def __init__(self, scale: float = 2.0, seed: Optional[int] = None,
+                 pencil_density: float = 0.85, density_jitter: float = 0.1, fill_coverage: float = 0.9,
+                 blank_rate: float = 0.02, noise: float = 4.0, blur: int = 3,
+                 rotation: float = 0.0, perspective: float = 0.0, layout: str = DEFAULT_LAYOUT):
+        self.scale = scale
+        self.layout_name = layout
+        self.layout = SheetLayout.load(layout)
+        reference = self.layout.reference
+        self.top_mark_x = list(reference.get('top_mark_x', []))
+        self.left_mark_y = list(reference.get('left_mark_y', []))
+        if len(self.top_mark_x) != self.layout.top_count or len(self.left_mark_y) != self.layout.rows:
+            raise ValueError(f"Bố cục '{self.layout.name}' thiếu toạ độ vạch định vị tham chiếu (reference).")
+        self.bubble_x = self.layout.column_x(self.top_mark_x)
+        self.rng = np.random.default_rng(seed)
+        self.pencil_density = pencil_density
+        self.density_jitter = density_jitter
+        self.fill_coverage = fill_coverage
+        self.blank_rate = blank_rate
+        self.noise = noise
+        self.blur = blur
+        self.rotation = rotation
+        self.perspective = perspective
+        self._blank_page = self._render_template()
+        self._noise_bank: List[np.ndarray] = []
+
+    def _px(self, value: float) -> int:
+        """Toạ độ warp -> toạ độ pixel trên trang (có lề)."""
+        return int(round((value + PAGE_MARGIN) * self.scale))
+
+    def _render_template(self) -> np.ndarray:
+        """Trang trống: marker, vạch định vị và viền các ô (vẽ 1 lần, dùng lại cho mọi phiếu)."""
+        page_w = self._px(WARP_W + MARKER_SIZE + PAGE_MARGIN)
+        page_h = self._px(WARP_H + MARKER_SIZE + PAGE_MARGIN)
+        page = np.full((page_h, page_w), 255, dtype=np.uint8)
+
+        # 4 marker góc: góc trên-trái của marker trùng 4 góc vùng warp (WarpingProcessor dùng (x, y) của boundingRect)
+        for x, y in ((0, 0), (WARP_W, 0), (WARP_W, WARP_H), (0, WARP_H)):
+            cv2.rectangle(page, (self._px(x), self._px(y)),
+                          (self._px(x + MARKER_SIZE) - 1, self._px(y + MARKER_SIZE) - 1), 0, -1)
+
+        half = TOP_MARK_SIZE / 2
+        for cx in self.top_mark_x:
+            cv2.rectangle(page, (self._px(cx - half), self._px(TOP_MARK_Y - half)),
+                          (self._px(cx + half) - 1, self._px(TOP_MARK_Y + half) - 1), 0, -1)
+
+        for cy in self.left_mark_y:
+            cv2.rectangle(page, (self._px(LEFT_MARK_X - LEFT_MARK_W / 2), self._px(cy - LEFT_MARK_H / 2)),
+                          (self._px(LEFT_MARK_X + LEFT_MARK_W / 2) - 1, self._px(cy + LEFT_MARK_H / 2) - 1), 0, -1)
+
+        radius = int(BUBBLE_RADIUS * self.scale)
+        thickness = max(1, int(self.scale))
+        for cy in self.left_mark_y:
+            for cx in self.bubble_x:
+                cv2.circle(page, (self._px(cx), self._px(cy)), radius, 150, thickness, cv2.LINE_AA)
+        return page
+
+    def random_answers(self) -> str:
+        """layout.questions ký tự 'A'-'D' (hoặc '0' nếu bỏ trống), theo thứ tự câu của bố cục."""
+        layout = self.layout
+        choices = self.rng.integers(0, len(layout.choices), size=layout.questions)
+        blanks = self.rng.random(layout.questions) < self.blank_rate
+        return ''.join('0' if blank else layout.choices[c] for c, blank in zip(choices, blanks))
+
+    def render(self, answers: str) -> np.ndarray:
+        """Vẽ 1 phiếu với đáp án cho trước, trả về ảnh BGR."""
+        page = self._blank_page.copy()
+        radius = max(1, int(BUBBLE_RADIUS * self.fill_coverage * self.scale))
+        choices = self.layout.choices
+        cell_rows = self.layout.cell_rows.tolist()
+        cell_cols = self.layout.cell_cols.tolist()
+
+        for q_idx, ans in enumerate(answers):
+            if ans not in choices:
+                continue
+            cx = self.bubble_x[cell_cols[q_idx][choices.index(ans)]]
+            cy = self.left_mark_y[cell_rows[q_idx]]
+            darkness = np.clip(self.pencil_density + self.rng.normal(0, self.density_jitter), 0.05, 1.0)
+            # Tâm nét tô lệch nhẹ như tô tay
+            dx, dy = self.rng.normal(0, 0.8, size=2) * self.scale
+            cv2.circle(page, (int(self._px(cx) + dx), int(self._px(cy) + dy)), radius,
+                       int(255 * (1.0 - darkness)), -1, cv2.LINE_AA)
+
+        page = self._distort(page)
+        return cv2.cvtColor(page, cv2.COLOR_GRAY2BGR)
+
+    def _distort(self, page: np.ndarray) -> np.ndarray:
+        h, w = page.shape
+        if self.rotation or self.perspective:
+            src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+            dst = src.copy()
+            if self.perspective:
+                dst += self.rng.uniform(-self.perspective, self.perspective, size=(4, 2)).astype(np.float32) * [w, h]
+            if self.rotation:
+                angle = self.rng.uniform(-self.rotation, self.rotation)
+                rot = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+                dst = cv2.transform(dst[None], rot)[0]
+            matrix = cv2.getPerspectiveTransform(src, dst.astype(np.float32))
+            page = cv2.warpPerspective(page, matrix, (w, h), borderValue=255)
+
+        if self.blur > 1:
+            k = self.blur | 1
+            page = cv2.GaussianBlur(page, (k, k), 0)
+        if self.noise > 0:
+            noisy = page.astype(np.int16)
+            noisy += self._noise_field(page.shape)
+            page = np.clip(noisy, 0, 255).astype(np.uint8)
+        return page
+
+    def _noise_field(self, shape) -> np.ndarray:
+        """
+        Nhiễu Gaussian cho 1 phiếu. Sinh nhiễu mới cho từng phiếu chiếm phần lớn thời gian,
+        nên dùng lại vài trường nhiễu có sẵn và dịch vòng (roll) một đoạn ngẫu nhiên.
+        """
+        if not self._noise_bank or self._noise_bank[0].shape != shape:
+            self._noise_bank = [
+                np.rint(self.rng.standard_normal(shape, dtype=np.float32) * self.noise).astype(np.int16)
+                for _ in range(self.NOISE_BANK_SIZE)
+            ]
+        field = self._noise_bank[self.rng.integers(len(self._noise_bank))]
+        return np.roll(field, (int(self.rng.integers(shape[0])), int(self.rng.integers(shape[1]))), axis=(0, 1))
+
+    def generate(self, count: int, out_dir: Path, jpeg_quality: int = 90, prefix: str = "synthetic") -> List[Dict[str, Any]]:
+        """Sinh count phiếu (JPEG) vào out_dir kèm ground_truth.json. Trả về danh sách ground truth."""
+        out_dir.mkdir(parents=True, exist_ok=True)
+        truth = []
+        for i in range(count):
+            answers = self.random_answers()
+            name = f"{prefix}_{i:05d}"
+            success, buffer = cv2.imencode(".jpg", self.render(answers), [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            if not success:
+                raise ValueError(f"Không thể mã hoá phiếu {name}.")
+            buffer.tofile(str(out_dir / f"{name}.jpg"))
+            truth.append({'name': name, 'answers': answers})
+
+        (out_dir / "ground_truth.json").write_text(json.dumps({
+            'params': self.describe(),
+            'sheets': truth
+        }, indent=1), encoding="utf-8")
+        return truth
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'scale': self.scale, 'pencil_density': self.pencil_density, 'density_jitter': self.density_jitter,
+            'fill_coverage': self.fill_coverage, 'blank_rate': self.blank_rate, 'noise': self.noise,
+            'blur': self.blur, 'rotation': self.rotation, 'perspective': self.perspective,
+            'layout': self.layout_name
+        }
+
+def verify(out_dir: Path, truth: List[Dict[str, Any]], layout: str = DEFAULT_LAYOUT):
+    """Chạy Warp + OMR (cùng bố cục với lúc sinh) trên các phiếu vừa sinh và so với ground truth."""
+    from src.utils import FileHandler
+    from src.core import WarpingProcessor, OMREngine
+
+    cfg = dict(FileHandler.load_config(Path("config/app_config.json"))['ALGORITHM_CONFIG'], layout=layout)
+    warp, omr = WarpingProcessor(cfg), OMREngine(cfg)
+    wrong, failed = 0, 0
+    for item in truth:
+        img = cv2.imdecode(np.fromfile(str(out_dir / f"{item['name']}.jpg"), np.uint8), cv2.IMREAD_UNCHANGED)
+        try:
+            warped_bgr, warped_binary, warped_marker = warp.process_warping(img)
+            answers, _ = omr.summarize(omr.detect(warped_marker, warped_binary))
+        except Exception as e:
+            failed += 1
+            print(f"  FAIL {item['name']}: {e}")
+            continue
+        diffs = [q for q, (got, want) in enumerate(zip(answers, item['answers'])) if got != want]
+        wrong += len(diffs)
+        if diffs:
+            print(f"  {item['name']}: {len(diffs)} câu sai {diffs[:10]}")
+    total = (len(truth) - failed) * omr.layout.questions
+    print(f"Verify: {len(truth) - failed}/{len(truth)} phiếu nhận dạng được, "
+          f"{total - wrong}/{total} câu đúng ground truth.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinh phiếu trả lời TOEIC tổng hợp kèm ground truth.")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--out", type=Path, default=Path("data/synthetic"))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--scale", type=float, default=2.0)
+    parser.add_argument("--pencil-density", type=float, default=0.85)
+    parser.add_argument("--density-jitter", type=float, default=0.1)
+    parser.add_argument("--fill-coverage", type=float, default=0.9)
+    parser.add_argument("--blank-rate", type=float, default=0.02)
+    parser.add_argument("--noise", type=float, default=4.0)
+    parser.add_argument("--blur", type=int, default=3)
+    parser.add_argument("--rotation", type=float, default=0.0, help="Góc xoay tối đa (độ)")
+    parser.add_argument("--perspective", type=float, default=0.0, help="Độ méo phối cảnh tối đa (VD: 0.01)")
+    parser.add_argument("--quality", type=int, default=90, help="Chất lượng JPEG")
+    parser.add_argument("--layout", default=DEFAULT_LAYOUT, help="Bố cục phiếu (tên trong config/layouts hoặc file .json)")
+    parser.add_argument("--verify", action="store_true", help="Chạy nhận dạng và so với ground truth")
+    args = parser.parse_args()
+
+    generator = SyntheticSheetGenerator(
+        scale=args.scale, seed=args.seed, pencil_density=args.pencil_density,
+        density_jitter=args.density_jitter, fill_coverage=args.fill_coverage, blank_rate=args.blank_rate,
+        noise=args.noise, blur=args.blur, rotation=args.rotation, perspective=args.perspective, layout=args.layout
+    )
+    t0 = time.perf_counter()
+    truth = generator.generate(args.count, args.out, jpeg_quality=args.quality)
+    elapsed = time.perf_counter() - t0
+    print(f"Đã sinh {len(truth)} phiếu tại {args.out} ({len(truth) / elapsed:.1f} phiếu/giây)")
+
+    if args.verify:
+        verify(args.out, truth, args.layout)
+
+if __name__ == "__main__":
+    main()
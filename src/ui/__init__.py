@@ -1,9 +1,22 @@
 """
 Package UI: Chứa toàn bộ mã nguồn giao diện người dùng.
+Các lớp được import khi truy cập lần đầu (PEP 562): main.py hiện cửa sổ trước,
+rồi mới nạp OMRApplication (kéo theo OpenCV, core, workers).
 """
+from typing import TYPE_CHECKING
+from src.utils.lazy_import import lazy_exports
 
-from .app_window import OMRApplication
-from .state_manager import FormStateManager
-from .components import DragDropArea, FileTableView
+_EXPORTS = {
+    'OMRApplication': '.app_window',
+    'FormStateManager': '.state_manager',
+    'DragDropArea': '.components',
+    'FileTableView': '.components',
+}
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
 
-__all__ = ['OMRApplication', 'FormStateManager', 'DragDropArea', 'FileTableView']
\ No newline at end of file
+if TYPE_CHECKING:
+    from .app_window import OMRApplication
+    from .state_manager import FormStateManager
+    from .components import DragDropArea, FileTableView
+
+__all__ = ['OMRApplication', 'FormStateManager', 'DragDropArea', 'FileTableView']
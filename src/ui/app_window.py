@@ -9,10 +9,14 @@ import os
 from .state_manager import FormStateManager
 from .components import DragDropArea, FileTableView
 
-from src.utils import app_logger, FileHandler
-from src.core import WarpingProcessor, OMREngine, GradeManager, ReportGenerator
-from src.workers import ScoringWorker
+from src.utils import app_logger, FileHandler, OMRUtils, tracer, metrics_log
+from src.utils.image_codec import ImageOutputPolicy
+from src.utils.page_source import expand_sources
+from src.core import WarpingProcessor, OMREngine, GradeManager, OverlayCache, BubbleAtlasStore, SessionStore
+from src.workers import ScoringWorker, ReportWorker, PipelineStats
 from .review_window import ReviewWindow
+from .review_cache import ReviewImageCache
+from .review_queue_window import ReviewQueueWindow
 
 # Đường dẫn (Relative path từ thư mục chạy main.py - tức là thư mục gốc dự án)
 # Cấu trúc mới: config nằm ở root/config
@@ -37,6 +41,12 @@ class OMRApplication:
             self.D = self.gui_cfg['DEFAULT_SETTINGS']
             
             self.conf_threshold = self.app_cfg['conf_threshold']
+            self.report_cfg = self.full_config.get('REPORT_CONFIG', {})
+            self.output_cfg = self.full_config.get('OUTPUT_CONFIG', {})
+            self.review_cfg = self.full_config.get('REVIEW_CONFIG', {})
+            self.session_cfg = self.full_config.get('SESSION_CONFIG', {})
+            tracer.configure(self.full_config.get('TRACE_CONFIG'))
+            metrics_log.configure(self.full_config.get('METRICS_CONFIG'))
 
             self.all_keys = FileHandler.load_key(KEY_PATH)
             self.scoring_ref = FileHandler.load_scoring_ref(SCORING_REF_PATH)
@@ -50,6 +60,21 @@ class OMRApplication:
 
         self.master = master
         self.is_scoring = False
+        self.is_exporting = False
+        
+        # Ảnh kết quả của phiên hiện tại giữ trong RAM để xuất thẻ điểm (fallback: đọc đĩa)
+        self.overlay_cache = OverlayCache(int(self.report_cfg.get('overlay_cache_mb', 512)) * 1024 * 1024)
+        # Ảnh Review đã cắt + thu nhỏ sẵn (LRU), các tờ cần review kế tiếp được render trước ở thread nền
+        self.review_cache = ReviewImageCache(self.app_cfg['warp_size']['width'],
+                                             int(self.review_cfg.get('cache_mb', 256)) * 1024 * 1024,
+                                             overlay_cache=self.overlay_cache)
+        # Ảnh cắt 4 bubble của các câu cần review (Review Queue cho cả phiên)
+        self.atlas_store = BubbleAtlasStore()
+        # Kết quả chấm của phiên (theo cột, giới hạn RAM -> phiên hàng chục nghìn tờ)
+        self.session = SessionStore(int(self.session_cfg.get('max_mb', 64)) * 1024 * 1024,
+                                    spill_dir=self.session_cfg.get('spill_dir') or None)
+        # Số liệu tốc độ/độ trễ của lượt chấm (hiển thị ở footer)
+        self.pipeline_stats = PipelineStats()
         
         # 2. State Manager
         self.state_manager = FormStateManager(self.all_keys)
@@ -208,6 +233,12 @@ class OMRApplication:
         
         # Căn chỉnh các nút sang phải
         frame.grid_columnconfigure(0, weight=1)
+
+        # Bảng số liệu pipeline (tốc độ, ETA, hàng đợi, p50/p95 từng giai đoạn)
+        self.stats_label = tk.Label(frame, text="", justify='left', anchor='w',
+                                    font=(self.D['FONT_FAMILY'], 9),
+                                    fg=self.P['C_SECONDARY_DARK'], bg=self.P['C_LIGHT'])
+        self.stats_label.grid(row=0, column=0, sticky='w', padx=5)
         
         self.view_log_btn = tk.Button(frame, text="View Log", 
                                  font=(self.D['FONT_FAMILY'], self.S['ACTION_FONT_SIZE'], "bold"),
@@ -217,7 +248,7 @@ class OMRApplication:
                                  relief='flat', bd=0, 
                                  padx=15, pady=self.S['ACTION_PADY'],
                                  command=self._on_open_log_folder) 
-        self.view_log_btn.grid(row=0, column=1, padx=5, pady=5)
+        self.view_log_btn.grid(row=0, column=2, padx=5, pady=5)
         
         self.upload_btn = tk.Button(frame, text="Save & Upload", 
                                font=(self.D['FONT_FAMILY'], self.S['ACTION_FONT_SIZE'], "bold"),
@@ -228,9 +259,20 @@ class OMRApplication:
                                padx=15, pady=self.S['ACTION_PADY'],
                                state='disabled', 
                                command=self._on_save_clicked)
-        self.upload_btn.grid(row=0, column=2, padx=5, pady=5)
+        self.upload_btn.grid(row=0, column=3, padx=5, pady=5)
+
+        self.review_queue_btn = tk.Button(frame, text="Review Queue", 
+                               font=(self.D['FONT_FAMILY'], self.S['ACTION_FONT_SIZE'], "bold"),
+                               bg=self.P['C_SECONDARY_DARK'], fg=self.P['C_LIGHT'],
+                               activebackground=self.P['C_PRIMARY_DARK'],
+                               activeforeground=self.P['C_ACCENT'],
+                               relief='flat', bd=0, 
+                               padx=15, pady=self.S['ACTION_PADY'],
+                               state='disabled', 
+                               command=self.open_review_queue)
+        self.review_queue_btn.grid(row=0, column=1, padx=5, pady=5)
 
-    def _refresh_content_area(self, refresh_table_only: bool = False):
+    def _refresh_content_area(self):
         image_files = self.state_manager.get_value('image_files')
         has_files = len(image_files) > 0
         
@@ -242,9 +284,9 @@ class OMRApplication:
             'conf_threshold': self.conf_threshold
         }
 
-        if refresh_table_only and has_files and hasattr(self, 'table_view'):
-            results = self.state_manager.get_value('results')
-            self.table_view.update_data(image_files, results)
+        # Bảng đã có sẵn: chỉ áp dụng thay đổi (diff), không dựng lại widget
+        if has_files and getattr(self, 'table_view', None) is not None:
+            self.table_view.update_data(image_files, self.session)
             return
 
         for widget in self.content_frame.winfo_children():
@@ -261,8 +303,7 @@ class OMRApplication:
             self.table_view.on_row_click = self.open_review_modal
             self.table_view.pack(fill='both', expand=True)
             # Load initial data
-            results = self.state_manager.get_value('results')
-            self.table_view.update_data(image_files, results)
+            self.table_view.update_data(image_files, self.session)
         else:
             self.drag_area = DragDropArea(
                 self.content_frame, 
@@ -272,91 +313,149 @@ class OMRApplication:
             self.drag_area.pack(fill='both', expand=True)
             self.table_view = None
             
+    def _result_image_path(self, iid, result_data) -> Path:
+        """Tái tạo đường dẫn ảnh kết quả (đã vẽ lưới) của 1 dòng trong bảng."""
+        res_date = result_data.get('Date', '')
+        res_set = result_data.get('Set', '')
+        res_id = result_data.get('Test', '')
+        res_class = result_data.get('Class', '')
+        
+        folder_name = OMRUtils.get_session_dir_name(res_date, res_set, res_id, res_class)
+        res_dir = self.parent_log_dir / folder_name
+        
+        img_stem = Path(iid).stem
+        return ImageOutputPolicy.find_existing(res_dir, img_stem) or (res_dir / f"{img_stem}.png")
+
+    def _prefetch_review_images(self, iid=None):
+        """Render trước ảnh Review của các tờ cần review gần dòng iid (None = các tờ đầu bảng)."""
+        if getattr(self, 'table_view', None) is None:
+            return
+        paths = []
+        for neighbour in self.table_view.flagged_neighbours(iid, after=int(self.review_cfg.get('prefetch', 2))):
+            data = self.session.summary(Path(neighbour).stem)
+            if data:
+                try:
+                    paths.append(self._result_image_path(neighbour, data))
+                except Exception:
+                    continue
+        if paths:
+            self.review_cache.prefetch(paths)
+
     def open_review_modal(self, iid):
-        # 1. Lấy dữ liệu từ bảng
-        result_data = self.table_view.get_item_data(iid)
+        # 1. Lấy kết quả của tờ (dict mới, nạp lại phần đã spill nếu cần)
+        result_data = self.session.get(Path(iid).stem)
         if not result_data: return
 
         # 2. Tái tạo đường dẫn ảnh kết quả
         try:
-            res_date = result_data.get('Date', '')
-            res_set = result_data.get('Set', '')
-            res_id = result_data.get('Test', '')
-            res_class = result_data.get('Class', '')
-            
-            folder_name = f"{res_date}_{res_set}_{res_id}_{res_class}".replace(" ", "").replace("-", "")
-            res_dir = self.parent_log_dir / folder_name
-            
-            img_name = Path(iid).stem + ".png"
-            img_path = res_dir / img_name
-            
+            img_path = self._result_image_path(iid, result_data)
         except Exception:
             messagebox.showerror("Lỗi", "Không tìm thấy đường dẫn ảnh kết quả.")
             return
 
-        # 3. Mở cửa sổ
+        # 3. Mở cửa sổ (ảnh lấy từ cache), đồng thời render trước các tờ cần review kế tiếp
+        self._prefetch_review_images(iid)
         ReviewWindow(
             parent=self.master, # Dùng master làm parent
             student_name=result_data.get('Name', 'Unknown'),
             img_path=img_path,
             current_answers=result_data.get('ground_truth', ''),
             confidence_list=result_data.get('conf', []),
-            on_save_callback=lambda new_ans: self.handle_review_save(iid, result_data, new_ans)
+            on_save_callback=lambda new_ans: self.handle_review_save(iid, result_data, new_ans),
+            config=self.full_config,
+            image_cache=self.review_cache
         )
 
     def handle_review_save(self, iid, old_result, new_answers_str):
         try:
-            # 1. CHẤM LẠI ĐIỂM (Chỉ tính toán số liệu mới)
-            set_name = old_result.get('Set', '')
-            test_id = old_result.get('Test', '')
-            
-            # Lấy Key string
-            current_key_str = self.all_keys.get(set_name, {}).get(test_id, "")
-            
-            gm = GradeManager(
-                key_answer=current_key_str,
-                scoring_ref=self.scoring_ref,
-                set_name=set_name, test_id=test_id
-            )
-            
-            # parts_stats chứa: {'Total': 900, 'LC': 400, 'Part 1': 5...}
-            parts_stats = gm.grade_answers(list(new_answers_str))
-
-            # 2. CẬP NHẬT TRỰC TIẾP VÀO old_result (Không tạo dict mới)            
-            # A. Cập nhật Điểm tổng
-            old_result['Total'] = parts_stats['Total']
-            old_result['LC'] = parts_stats['LC']
-            old_result['RC'] = parts_stats['RC']
-            
-            for i in range(1, 8):
-                old_result[f'part_{i}'] = parts_stats.get(f'part_{i}', 0)
-            
-            # C. Cập nhật Đáp án chốt (Ground Truth)
-            old_result['ground_truth'] = new_answers_str
-            old_result['Reference'] = new_answers_str # Giữ key này để UI hiển thị đúng
-            
-            # D. Đánh dấu đã review
-            old_result['is_reviewed'] = True
-            
-
-            # 3. ĐỒNG BỘ DỮ LIỆU
-            all_results = self.state_manager.get_value('results')
-            
-            for idx, item in enumerate(all_results):
-                if item.get('Name') == old_result.get('Name'):
-                    all_results[idx] = old_result
-                    break
-            
-            # 4. REFRESH GIAO DIỆN
-            self.table_view.update_single_item(Path(iid), old_result, None)
-            
-            app_logger.info(f"Updated score for: {old_result.get('Name')}")
-
+            self._regrade_result(iid, old_result, new_answers_str)
         except Exception as e:
             import traceback
             traceback.print_exc()
             messagebox.showerror("Lỗi", f"Không thể lưu: {e}")
 
+    def _grade_manager_for(self, result) -> GradeManager:
+        set_name = result.get('Set', '')
+        test_id = result.get('Test', '')
+        
+        # Lấy Key string
+        current_key_str = self.all_keys.get(set_name, {}).get(test_id, "")
+        
+        return GradeManager(
+            key_answer=current_key_str,
+            scoring_ref=self.scoring_ref,
+            set_name=set_name, test_id=test_id
+        )
+
+    def _regrade_result(self, iid, old_result, new_answers_str, gm: GradeManager = None, mark_reviewed: bool = True):
+        """Chấm lại 1 tờ với đáp án đã sửa và cập nhật kết quả + bảng (gm: dùng lại khi chấm hàng loạt)."""
+        # 1. CHẤM LẠI ĐIỂM (Chỉ tính toán số liệu mới)
+        gm = gm or self._grade_manager_for(old_result)
+        
+        # parts_stats chứa: {'Total': 900, 'LC': 400, 'Part 1': 5...}
+        parts_stats = gm.grade_answers(list(new_answers_str))
+
+        # 2. CÁC TRƯỜNG THAY ĐỔI
+        # A. Điểm tổng + điểm từng part
+        changes = {'Total': parts_stats['Total'], 'LC': parts_stats['LC'], 'RC': parts_stats['RC']}
+        for i in range(1, 8):
+            changes[f'part_{i}'] = parts_stats.get(f'part_{i}', 0)
+        
+        # C. Đáp án chốt (Ground Truth)
+        changes['ground_truth'] = new_answers_str
+        
+        # D. Đánh dấu đã review (Review Queue: chỉ khi mọi câu nghi ngờ của tờ đã được quyết định)
+        if mark_reviewed:
+            changes['is_reviewed'] = True
+        old_result.update(changes)
+
+        # 3. ĐỒNG BỘ DỮ LIỆU (SessionStore giữ bản chính, old_result chỉ là bản sao)
+        self.session.update(old_result['Name'], changes)
+        
+        # 4. REFRESH GIAO DIỆN
+        self.table_view.update_single_item(Path(iid), old_result, None)
+        
+        app_logger.info(f"Updated score for: {old_result.get('Name')}")
+
+    def open_review_queue(self):
+        """Review Queue: mọi câu cần review của các tờ chưa review trong phiên, sắp theo độ tin cậy."""
+        # Chỉ các tờ còn trong danh sách file (tờ đã xoá khỏi bảng vẫn còn trong session / atlas_store)
+        stems = {f.stem for f in self.state_manager.get_value('image_files')}
+        names = [name for name in self.session.names(unreviewed_only=True) if name in stems]
+        if not self.atlas_store.queue(names):
+            messagebox.showinfo("Review Queue", "Không còn câu nào cần review.")
+            return
+        ReviewQueueWindow(
+            parent=self.master,
+            atlas_store=self.atlas_store,
+            names=names,
+            config=self.full_config,
+            on_apply_callback=self.handle_review_queue_apply
+        )
+
+    def handle_review_queue_apply(self, decisions, completed):
+        """
+        Chấm lại hàng loạt theo quyết định của Review Queue.
+        decisions: {tên: {chỉ số câu: đáp án}}, completed: các tờ đã quyết định hết câu nghi ngờ.
+        """
+        iids = {f.stem: str(f) for f in self.state_manager.get_value('image_files')}
+        # GradeManager dùng chung cho các tờ cùng bộ đề
+        managers = {}
+        for name, answers in decisions.items():
+            result, iid = self.session.get(name), iids.get(name)
+            if result is None or iid is None:
+                continue
+            new_answers = list(result.get('ground_truth', ''))
+            for q, answer in answers.items():
+                if q < len(new_answers):
+                    new_answers[q] = answer
+            key = (result.get('Set', ''), result.get('Test', ''))
+            if key not in managers:
+                managers[key] = self._grade_manager_for(result)
+            self._regrade_result(iid, result, ''.join(new_answers), managers[key], mark_reviewed=name in completed)
+            self.atlas_store.resolve(name, answers.keys())
+        app_logger.info(f"Review queue applied: {sum(len(a) for a in decisions.values())} questions, {len(decisions)} sheets")
+
     # --- EVENT HANDLERS ---
     def _on_set_changed(self, event):
         # Kiểm tra an toàn
@@ -411,12 +510,18 @@ class OMRApplication:
 
     def _on_browse_files(self):
         files = filedialog.askopenfilenames(
-            title="Chọn File Ảnh Bài Làm (.jpg/.jpeg)",
-            filetypes=[("JPEG files", "*.jpg;*.jpeg"), ("All Files", "*.*")]
+            title="Chọn File Ảnh Bài Làm (.jpg/.jpeg) hoặc xấp scan (.tif/.pdf)",
+            filetypes=[("Scan files", "*.jpg;*.jpeg;*.tif;*.tiff;*.pdf"), ("JPEG files", "*.jpg;*.jpeg"),
+                       ("Multi-page scans", "*.tif;*.tiff;*.pdf"), ("All Files", "*.*")]
         )
         if files:
             current = self.state_manager.get_value('image_files')
-            new_files = [Path(f) for f in files]
+            try:
+                # File TIFF/PDF nhiều trang -> mỗi trang 1 dòng (chỉ đếm trang, chưa giải mã)
+                new_files = expand_sources(files)
+            except Exception as e:
+                messagebox.showerror("Lỗi", f"Không thể đọc file nhiều trang: {e}")
+                return
             # Simple unique filter
             existing = {f.name for f in current}
             valid = [f for f in new_files if f.name not in existing]
@@ -426,16 +531,19 @@ class OMRApplication:
             self._refresh_content_area()
 
     def _on_remove_files(self, iids: list):
-        to_remove = {Path(iid) for iid in iids}
+        to_remove = set(iids)
         current = self.state_manager.get_value('image_files')
-        new_list = [f for f in current if f not in to_remove]
+        new_list = [f for f in current if str(f) not in to_remove]
         self.state_manager.set_value('image_files', new_list)
         self._refresh_content_area()
 
     def _on_clear_files(self):
         if messagebox.askyesno("Xác nhận", "Bạn có chắc chắn muốn xóa tất cả file?"):
             self.state_manager.set_value('image_files', [])
-            self.state_manager.set_value('results', []) # Clear cả kết quả cũ
+            self.session.clear() # Clear cả kết quả cũ
+            self.overlay_cache.clear()
+            self.review_cache.clear()
+            self.atlas_store.clear()
             self._refresh_content_area()
 
     def _on_start_clicked(self):
@@ -451,22 +559,32 @@ class OMRApplication:
         state = self.state_manager.state
         
         # Logic tạo thư mục (Logic gốc)
-        result_name = f"{state['test_date']}_{state['set_name']}_{state['test_id']}_{state['class_name']}".replace(" ", "").replace("-", "")
+        result_name = OMRUtils.get_session_dir_name(state['test_date'], state['set_name'], state['test_id'], state['class_name'])
         self.current_result_dir = self.parent_log_dir / result_name
         self.current_result_dir.mkdir(exist_ok=True)
         
         # Reset results
-        self.state_manager.set_value('results', [])
+        self.session.clear()
+        self.overlay_cache.clear()
+        self.review_cache.clear()
+        self.atlas_store.clear()
+        self.review_queue_btn.config(state='disabled')
         # Cập nhật UI bảng về trạng thái Pending (Refresh lại bảng)
-        self._refresh_content_area(refresh_table_only=True)
+        self._refresh_content_area()
 
         try:
             warp = WarpingProcessor(self.app_cfg)
             omr = OMREngine(self.app_cfg)
-            grade = GradeManager(state['key'], self.scoring_ref, state['set_name'], state['test_id'], state['test_date'], state['class_name'])
+            grade = GradeManager(state['key'], self.scoring_ref, state['set_name'], state['test_id'], state['test_date'], state['class_name'],
+                                 output_policy=ImageOutputPolicy.from_config(self.output_cfg.get('result_image')))
             
-            self.worker = ScoringWorker(self, state['image_files'], warp, omr, grade, state['key'], self.current_result_dir)
+            self.worker = ScoringWorker(self, state['image_files'], warp, omr, grade, state['key'], self.current_result_dir,
+                                        overlay_cache=self.overlay_cache,
+                                        async_write=self.output_cfg.get('async_write', True),
+                                        stats=self.pipeline_stats,
+                                        atlas_store=self.atlas_store)
             self.worker.start()
+            self._poll_pipeline_stats()
         except Exception as e:
             self._set_ui_busy(False)
             messagebox.showerror("Error", f"Lỗi khởi động: {e}")
@@ -476,14 +594,33 @@ class OMRApplication:
             self.table_view.update_single_item(img_path, result_dict, error_msg)
         
         if result_dict:
-            res_list = self.state_manager.get_value('results')
-            res_list.append(result_dict)
+            self.session.add(result_dict)
+
+    def on_result_image_failed(self, img_path, result_dict, error_msg):
+        """ImageWriter không ghi được ảnh của tờ đã chấm (kết quả đã có trong phiên): chỉ cập nhật dòng."""
+        if hasattr(self, 'table_view') and self.table_view:
+            self.table_view.update_single_item(img_path, result_dict, error_msg)
+
+    def _poll_pipeline_stats(self):
+        """Cập nhật footer số liệu mỗi 500ms trong khi đang chấm."""
+        self.stats_label.config(text=PipelineStats.format_snapshot(self.pipeline_stats.snapshot()))
+        if self.is_scoring:
+            self.master.after(500, self._poll_pipeline_stats)
 
     def on_scoring_complete(self):
         self._set_ui_busy(False)
-        messagebox.showinfo("Done", "Đã hoàn tất chấm điểm!")
-        if self.state_manager.get_value('results'):
+        snap = self.pipeline_stats.snapshot()
+        self.stats_label.config(text=PipelineStats.format_snapshot(snap))
+        # Các tờ cần review đầu tiên: render sẵn trong lúc người dùng đọc thông báo
+        self._prefetch_review_images()
+        if snap['saves_failed']:
+            messagebox.showwarning("Done", f"Đã hoàn tất chấm điểm, nhưng {snap['saves_failed']} tờ không ghi được ảnh kết quả "
+                                           f"vào {self.current_result_dir} (xem cột Status / log).")
+        else:
+            messagebox.showinfo("Done", "Đã hoàn tất chấm điểm!")
+        if len(self.session):
             self.upload_btn.config(state='normal')
+            self.review_queue_btn.config(state='normal')
 
     def _set_ui_busy(self, busy):
         self.is_scoring = busy
@@ -508,18 +645,46 @@ class OMRApplication:
             messagebox.showerror("Lỗi", str(e))
 
     def _on_save_clicked(self):
-        results = self.state_manager.get_value('results')
-        if not results: return
+        if not len(self.session) or self.is_exporting: return
         try:
-            csv_path = FileHandler.save_results(results) 
-            # 2. Xuất Báo cáo hình ảnh (Thẻ điểm)
-            report_gen = ReportGenerator()
-            success_count, reports_dir = report_gen.generate_batch(results)
-            # 3. Thông báo
-            messagebox.showinfo(
-                "Hoàn tất", 
-                f"Đã lưu CSV: {csv_path}\nĐã xuất {success_count} thẻ điểm tại:\n{reports_dir}"
-            )
+            self.last_csv_path = FileHandler.save_results(list(self.session.records()))
         except Exception as e:
             app_logger.error(f"Lỗi khi save results: {e}")
-            messagebox.showerror("Lỗi Lưu Báo Cáo", str(e))
\ No newline at end of file
+            messagebox.showerror("Lỗi Lưu Báo Cáo", str(e))
+            return
+
+        # 2. Xuất Báo cáo hình ảnh (Thẻ điểm) chạy nền để không treo UI
+        self.is_exporting = True
+        self.upload_btn.config(state='disabled', text="Exporting...")
+        # Thẻ điểm chỉ cần điểm + kỹ năng: không nạp lại conf/đáp án từng câu
+        self.report_worker = ReportWorker(self, self.session.summaries(), max_workers=self.report_cfg.get('max_workers', 0),
+                                          overlay_cache=self.overlay_cache,
+                                          image_source_dir=getattr(self, 'current_result_dir', None),
+                                          export_mode=self.report_cfg.get('export_mode', 'png'),
+                                          pdf_options=self.report_cfg.get('pdf', {}),
+                                          output_cfg=self.output_cfg.get('report_image'))
+        self.report_worker.start()
+
+    def on_report_progress(self, done, total):
+        self.upload_btn.config(text=f"Exporting {done}/{total}")
+
+    def on_reports_complete(self, success_count, total, output_path, error_msg, stats=None):
+        self.is_exporting = False
+        self.upload_btn.config(state='normal', text="Save & Upload")
+        if error_msg:
+            messagebox.showerror("Lỗi Lưu Báo Cáo", error_msg)
+            return
+        # 3. Thông báo
+        detail = ""
+        if stats:
+            detail = f"\n(Render mới: {stats['rendered']} | Không đổi: {stats['skipped']} | Lỗi: {stats['failed']})"
+        if stats and 'cards' in stats:
+            # Xuất 'both': số thẻ ảnh và số trang PDF báo riêng
+            summary = (f"Đã xuất {stats['cards']}/{total} thẻ điểm tại:\n{stats['cards_dir']}{detail}\n"
+                       f"Đã xuất {success_count}/{total} trang PDF:\n{output_path}")
+        else:
+            summary = f"Đã xuất {success_count}/{total} thẻ điểm tại:\n{output_path}{detail}"
+        messagebox.showinfo(
+            "Hoàn tất", 
+            f"Đã lưu CSV: {self.last_csv_path}\n{summary}"
+        )
\ No newline at end of file
@@ -1,8 +1,11 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from typing import Callable, List, Dict, Any, Optional
+from typing import TYPE_CHECKING, Callable, List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
+if TYPE_CHECKING:
+    from src.core.session_store import SessionStore
+
 class DragDropArea(tk.Frame):
     """
     Khu vực kéo thả file.
@@ -66,7 +69,14 @@ class FileTableView(tk.Frame):
     """
     Bảng hiển thị danh sách file.
     CODE GỐC: Được trích xuất từ _create_table_view và _resize_treeview_columns trong gui.py
+
+    Bảng giữ một model theo key (iid = đường dẫn file) và chỉ áp dụng phần chênh lệch
+    (thêm/sửa/xoá) lên Treeview. Khi số dòng vượt VIRTUAL_THRESHOLD, bảng chuyển sang
+    chế độ ảo: Treeview chỉ chứa các dòng đang nhìn thấy, thanh cuộn do bảng tự điều khiển.
     """
+    VIRTUAL_THRESHOLD = 500
+    ROW_HEIGHT = 20 # Chiều cao dòng mặc định của ttk.Treeview (px)
+
     def __init__(self, parent, 
                  on_add: Callable, on_remove: Callable, on_clear: Callable, 
                  config: Dict[str, Any]):
@@ -82,12 +92,26 @@ class FileTableView(tk.Frame):
         self.on_remove = on_remove
         self.on_clear = on_clear
         
-        self.data_map = {}
         self.on_row_click = None
         
+        # Model: thứ tự dòng + nội dung hiển thị (values, tag) của từng dòng
+        self._keys: List[str] = []
+        self._rows: Dict[str, Tuple[tuple, Optional[str]]] = {}
+        
+        # Trạng thái chế độ ảo
+        self._virtual = False
+        self._offset = 0
+        self._rendered: List[str] = []
+        self._rendered_set: set = set()
+        self._selection: set = set()
+        
         self.tree: Optional[ttk.Treeview] = None
         self._setup_ui()
         self.tree.bind("<Double-1>", self._on_double_click)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_mousewheel)
+        self.tree.bind("<Configure>", lambda event: self._virtual and self._render_window())
         
         # Bind sự kiện resize để tính toán cột y như logic cũ
         self.bind("<Configure>", self._resize_treeview_columns)
@@ -153,13 +177,13 @@ class FileTableView(tk.Frame):
         table_container.grid_columnconfigure(0, weight=1)
         table_container.grid_rowconfigure(0, weight=1)
 
-        scrollbar_y = ttk.Scrollbar(table_container, orient="vertical")
-        scrollbar_y.grid(row=0, column=1, sticky='ns')
+        self.scrollbar_y = ttk.Scrollbar(table_container, orient="vertical")
+        self.scrollbar_y.grid(row=0, column=1, sticky='ns')
         
         columns = ("name", "total_score", "lc_score", "rc_score", "confidence", "status")
         self.tree = ttk.Treeview(table_container, columns=columns, show="headings", 
-                                 yscrollcommand=scrollbar_y.set, selectmode='extended')
-        scrollbar_y.config(command=self.tree.yview)
+                                 yscrollcommand=self.scrollbar_y.set, selectmode='extended')
+        self.scrollbar_y.config(command=self.tree.yview)
         
         self.tree.heading("name", text="Name", anchor='center')
         self.tree.heading("total_score", text="Total", anchor='center')
@@ -207,56 +231,18 @@ class FileTableView(tk.Frame):
         if item_id and self.on_row_click:
             self.on_row_click(item_id)
 
-    def update_data(self, image_files: List[Path], results_list: List[Dict]):
-        """Cập nhật dữ liệu bảng."""
-        # Xóa cũ
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        # Tạo map kết quả để tra cứu nhanh theo tên file
-        results_map = {res['Name']: res for res in results_list}
-
-        for img_path in image_files:
-            file_name = img_path.name
-            base_name = img_path.stem
-            iid = str(img_path)
-            
-            if base_name in results_map:
-                res = results_map[base_name]
-                self.data_map[str(img_path)] = res
-                avg_conf = res.get('Confidence', 0.0)
-                min_conf = res.get('LowestConf', 0.0)
-                is_reviewed = res.get('is_reviewed', False)
-                
-                if is_reviewed:
-                    status = "✅ Done"
-                    tag = 'success'
-                elif min_conf < self.CONF_THRESHOLD:
-                    status = "⚠️ Review Needed"
-                    tag = 'warning'
-                else:
-                    status = "✅ Done"
-                    tag = 'success'
-                    
-                conf_str = f"{int(avg_conf * 100)}%"
-                
-                val = (file_name, res['Total'], res['LC'], res['RC'], conf_str, status)
-                self.tree.insert("", "end", iid=iid, values=val, tags = (tag,))
-            else:
-                val = (file_name, "-", "-", "-", "-", "Pending")
-                self.tree.insert("", "end", iid=iid, values=val)
-
-    def update_single_item(self, img_path: Path, result_dict: Optional[Dict], error_msg: Optional[str]):
-        """Cập nhật 1 dòng (dùng khi worker chấm xong)."""
-        iid = str(img_path)
-        if not self.tree.exists(iid): return
-        
+    def _build_row(self, img_path: Path, result_dict: Optional[Dict], error_msg: Optional[str] = None) -> Tuple[tuple, Optional[str]]:
+        """Tính nội dung hiển thị (values, tag) của 1 dòng."""
         if result_dict:
             avg_conf = result_dict.get('Confidence', 0.0)
             min_conf = result_dict.get('LowestConf', 0.0)
             is_reviewed = result_dict.get('is_reviewed', False)
             
-            if is_reviewed:
+            if error_msg is not None:
+                # Chấm được nhưng không ghi được ảnh kết quả (Review / báo cáo thiếu ảnh)
+                status = f"⚠️ Not Saved: {error_msg}"
+                tag = 'failed'
+            elif is_reviewed:
                 status = "✅ Done"
                 tag = 'success'
             elif min_conf < self.CONF_THRESHOLD:
@@ -274,19 +260,177 @@ class FileTableView(tk.Frame):
                 f"{int(avg_conf * 100)}%",
                 status
             )
-            self.data_map[iid] = result_dict
-            self.tree.item(iid, values=values)
-            self.tree.item(iid, tags=(tag,))
+            return values, tag
+        if error_msg is not None:
+            return (img_path.name, "-", "-", "-", "-", f"❌ Failed: {error_msg}"), 'failed'
+        return (img_path.name, "-", "-", "-", "-", "Pending"), None
+
+    def _insert_row(self, iid: str, index: Any):
+        values, tag = self._rows[iid]
+        self.tree.insert("", index, iid=iid, values=values, tags=(tag,) if tag else ())
+
+    def _apply_row(self, iid: str):
+        values, tag = self._rows[iid]
+        self.tree.item(iid, values=values, tags=(tag,) if tag else ())
+
+    def update_data(self, image_files: List[Path], results: 'SessionStore'):
+        """
+        Đồng bộ bảng với danh sách file & kết quả (bảng chỉ giữ nội dung hiển thị, kết quả nằm ở SessionStore).
+        Chỉ các dòng bị thêm, xoá hoặc đổi nội dung mới chạm tới Treeview.
+        """
+        old_keys, old_rows = self._keys, self._rows
+        new_keys: List[str] = []
+        new_rows: Dict[str, Tuple[tuple, Optional[str]]] = {}
+        
+        for img_path in image_files:
+            iid = str(img_path)
+            res = results.summary(img_path.stem)
+            new_keys.append(iid)
+            new_rows[iid] = self._build_row(img_path, res)
+
+        removed = [iid for iid in old_keys if iid not in new_rows]
+        for iid in removed:
+            self._selection.discard(iid)
+
+        self._keys, self._rows = new_keys, new_rows
+        virtual = len(new_keys) > self.VIRTUAL_THRESHOLD
+
+        # --- CHẾ ĐỘ ẢO: chỉ dựng lại cửa sổ dòng đang nhìn thấy ---
+        if virtual:
+            self._set_virtual(True)
+            self._render_window(force=True)
+            return
+
+        if self._virtual:
+            # Vừa thoát chế độ ảo: dựng lại toàn bộ (số dòng lúc này đã nhỏ)
+            self._set_virtual(False)
+            self._rebuild_all()
+            return
+
+        # --- CHẾ ĐỘ THƯỜNG: áp dụng diff ---
+        common_old = [iid for iid in old_keys if iid in new_rows]
+        common_new = [iid for iid in new_keys if iid in old_rows]
+        if common_old != common_new:
+            # Thứ tự các dòng cũ bị đảo -> dựng lại cho đơn giản
+            self._rebuild_all()
+            return
+
+        if removed:
+            self.tree.delete(*removed)
+        for index, iid in enumerate(new_keys):
+            old_row = old_rows.get(iid)
+            if old_row is None:
+                self._insert_row(iid, index)
+            elif old_row != new_rows[iid]:
+                self._apply_row(iid)
+
+    def _rebuild_all(self):
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        for iid in self._keys:
+            self._insert_row(iid, "end")
+
+    # --- CHẾ ĐỘ ẢO (VIRTUAL MODE) ---
+    def _set_virtual(self, enabled: bool):
+        if enabled == self._virtual:
+            return
+        self._virtual = enabled
+        if enabled:
+            children = self.tree.get_children()
+            if children:
+                self.tree.delete(*children)
+            self.tree.configure(yscrollcommand=lambda *args: None)
+            self.scrollbar_y.configure(command=self._on_scrollbar)
         else:
-            values = (img_path.name, "-", "-", "-", "-", f"❌ Failed: {error_msg}")
-            self.tree.item(iid, values=values)
-            self.tree.item(iid, tags=('failed',))
-            
-    def get_item_data(self, iid):
-        return self.data_map.get(iid)
+            self._rendered, self._rendered_set = [], set()
+            self.tree.configure(yscrollcommand=self.scrollbar_y.set)
+            self.scrollbar_y.configure(command=self.tree.yview)
+
+    def _page_size(self) -> int:
+        return max(10, self.tree.winfo_height() // self.ROW_HEIGHT + 2)
+
+    def _render_window(self, force: bool = False):
+        """Đưa đúng các dòng trong cửa sổ [offset, offset + page) lên Treeview."""
+        total = len(self._keys)
+        page = self._page_size()
+        self._offset = max(0, min(self._offset, total - page))
+        wanted = self._keys[self._offset:self._offset + page]
+
+        if force or wanted != self._rendered:
+            children = self.tree.get_children()
+            if children:
+                self.tree.delete(*children)
+            for iid in wanted:
+                self._insert_row(iid, "end")
+            self._rendered, self._rendered_set = wanted, set(wanted)
+
+            # Khôi phục lựa chọn của các dòng vừa hiện lại
+            visible_selection = [iid for iid in wanted if iid in self._selection]
+            if visible_selection:
+                self.tree.selection_set(visible_selection)
+
+        if total:
+            self.scrollbar_y.set(self._offset / total, (self._offset + len(wanted)) / total)
+        else:
+            self.scrollbar_y.set(0.0, 1.0)
+
+    def _on_scrollbar(self, *args):
+        total = len(self._keys)
+        page = self._page_size()
+        if args[0] == 'moveto':
+            self._offset = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self._offset += step * (page - 1) if args[2] == 'pages' else step
+        self._render_window()
+
+    def _on_mousewheel(self, event):
+        if not self._virtual:
+            return None
+        if event.num == 4:
+            step = -3
+        elif event.num == 5:
+            step = 3
+        else:
+            step = -3 if event.delta > 0 else 3
+        self._offset += step
+        self._render_window()
+        return "break"
+
+    def _on_select(self, event=None):
+        # Ở chế độ ảo, lựa chọn được lưu trong model để không mất khi cuộn
+        if self._virtual:
+            self._selection = (self._selection - self._rendered_set) | set(self.tree.selection())
+
+    def update_single_item(self, img_path: Path, result_dict: Optional[Dict], error_msg: Optional[str]):
+        """Cập nhật 1 dòng (dùng khi worker chấm xong)."""
+        iid = str(img_path)
+        if iid not in self._rows: return
+        
+        if result_dict:
+            self._rows[iid] = self._build_row(img_path, result_dict, error_msg)
+        else:
+            self._rows[iid] = self._build_row(img_path, None, error_msg or "")
+
+        if not self._virtual or iid in self._rendered_set:
+            self._apply_row(iid)
+
+    def flagged_neighbours(self, iid: Optional[str] = None, after: int = 2, before: int = 1) -> List[str]:
+        """
+        Các dòng cần review (tag 'warning') gần dòng iid theo thứ tự bảng:
+        tối đa `after` dòng phía sau rồi `before` dòng phía trước (iid None = từ đầu bảng).
+        """
+        flagged = [(index, key) for index, key in enumerate(self._keys) if self._rows[key][1] == 'warning' and key != iid]
+        if iid is None or iid not in self._rows:
+            return [key for _, key in flagged[:after]]
+        position = self._keys.index(iid)
+        following = [key for index, key in flagged if index > position]
+        preceding = [key for index, key in flagged if index < position]
+        return following[:after] + preceding[::-1][:before]
 
     def _internal_remove(self):
-        selected_iids = self.tree.selection()
+        selected_iids = [iid for iid in self._keys if iid in self._selection] if self._virtual else self.tree.selection()
         if not selected_iids:
             messagebox.showwarning("Cảnh báo", "Vui lòng chọn ít nhất một file để xóa.")
             return
@@ -0,0 +1,148 @@
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Iterable, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+from src.utils.logger import app_logger
+
+if TYPE_CHECKING:
+    from PIL import Image
+    from src.core import OverlayCache
+
+class ReviewImageCache:
+    """
+    Bộ nhớ đệm (LRU, giới hạn theo dung lượng) ảnh đã cắt + thu nhỏ sẵn cho cửa sổ Review.
+
+    Mỗi ảnh kết quả chỉ được giải mã, cắt và resize (LANCZOS) 1 lần; nguồn ưu tiên là
+    OverlayCache (ảnh BGR của phiên đang giữ trong RAM), fallback đọc file trên đĩa.
+    prefetch() render trước các tờ sắp review trên 1 thread nền, để mở Review
+    tiếp theo gần như tức thì (Tk thread chỉ còn tạo PhotoImage).
+    """
+
+    # Vùng cắt bỏ (lề trái/trên của ảnh chuẩn warp) và tỉ lệ hiển thị
+    CROP_LEFT = 80
+    CROP_TOP = 140
+    DISPLAY_SCALE = 0.9
+
+    def __init__(self, warp_width: int, max_bytes: int = 256 * 1024 * 1024,
+                 overlay_cache: Optional['OverlayCache'] = None):
+        self.warp_width = warp_width
+        self.max_bytes = max_bytes
+        self.overlay_cache = overlay_cache
+        self._items: 'OrderedDict[Tuple[str, float], Image.Image]' = OrderedDict()
+        self._nbytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Hàng đợi prefetch: chỉ giữ yêu cầu mới nhất (người dùng chuyển tờ -> bỏ yêu cầu cũ)
+        self._queue: deque = deque()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(img_path: Path) -> Tuple[str, float]:
+        # Kèm mtime: ảnh được chấm lại (ghi đè file) sẽ không dùng bản cũ trong cache
+        try:
+            mtime = img_path.stat().st_mtime
+        except OSError:
+            mtime = 0.0
+        return str(img_path), mtime
+
+    def get(self, img_path: Path) -> 'Image.Image':
+        """Lấy ảnh review (render nếu chưa có; chờ nếu thread prefetch đang render đúng ảnh này)."""
+        key = self._key(img_path)
+        while True:
+            with self._lock:
+                image = self._items.get(key)
+                if image is not None:
+                    self._items.move_to_end(key)
+                    return image
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            event.wait()
+
+        try:
+            image = self._render(img_path)
+            self._put(key, image)
+            return image
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def prefetch(self, img_paths: Iterable[Path]):
+        """Render trước các ảnh ở thread nền (thay thế danh sách chờ prefetch trước đó)."""
+        with self._wakeup:
+            self._queue.clear()
+            self._queue.extend(Path(p) for p in img_paths)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ReviewPrefetch", daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._queue:
+                    self._wakeup.wait()
+                img_path = self._queue.popleft()
+            try:
+                if img_path.exists():
+                    self.get(img_path)
+                    app_logger.debug("Review image prefetched: %s", img_path.name)
+            except Exception as e:
+                app_logger.warning(f"Review prefetch failed for {img_path.name}: {e}")
+
+    def _render(self, img_path: Path) -> 'Image.Image':
+        """Cắt lề + thu nhỏ về kích thước hiển thị (giống logic gốc của ReviewWindow)."""
+        from PIL import Image
+
+        overlay = self.overlay_cache.get(img_path.stem) if self.overlay_cache is not None else None
+        if overlay is not None:
+            # Ảnh BGR trong RAM (kích thước chuẩn warp) -> không phải giải mã PNG
+            pil_img = Image.fromarray(np.ascontiguousarray(overlay[:, :, ::-1]), "RGB")
+        else:
+            pil_img = Image.open(img_path)
+            pil_img.load()
+
+        w, h = pil_img.size
+        # Ảnh có thể được lưu thu nhỏ (OUTPUT_CONFIG.scale): quy đổi vùng cắt theo kích thước chuẩn
+        ratio = w / self.warp_width
+        pil_img = pil_img.crop((int(self.CROP_LEFT * ratio), int(self.CROP_TOP * ratio), w, h))
+        if ratio < 1.0:
+            pil_img = pil_img.resize((int(pil_img.width / ratio), int(pil_img.height / ratio)), Image.Resampling.BILINEAR)
+
+        final_w = int(pil_img.width * self.DISPLAY_SCALE)
+        final_h = int(pil_img.height * self.DISPLAY_SCALE)
+        # Dùng LANCZOS để ảnh sắc nét nhất khi thu nhỏ
+        return pil_img.resize((final_w, final_h), Image.Resampling.LANCZOS)
+
+    def _put(self, key: Tuple[str, float], image: 'Image.Image'):
+        nbytes = image.width * image.height * len(image.getbands())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._nbytes -= old.width * old.height * len(old.getbands())
+            self._items[key] = image
+            self._nbytes += nbytes
+
+            # Loại bỏ phần tử ít dùng nhất cho tới khi về lại ngân sách
+            while self._nbytes > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._nbytes -= evicted.width * evicted.height * len(evicted.getbands())
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._queue.clear()
+            self._nbytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,209 @@
+import tkinter as tk
+from tkinter import messagebox
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from src.core.bubble_atlas import BubbleAtlasStore
+
+class ReviewQueueWindow(tk.Toplevel):
+    """
+    Review theo hàng đợi cho cả phiên: mọi câu cần review của mọi tờ, sắp theo độ tin cậy tăng dần.
+    Mỗi câu chỉ hiện ảnh cắt 4 bubble (atlas tạo lúc chấm), không mở ảnh cả tờ.
+
+    Phím tắt (thao tác trên câu đang chọn rồi tự chuyển sang câu kế):
+        A/B/C/D hoặc 1-4: chọn đáp án, 0: bỏ trống,
+        Enter/Space: giữ đáp án máy đọc, Up/Down: di chuyển, Ctrl+S: áp dụng.
+    """
+
+    PAGE_SIZE = 8
+    CROP_SCALE = 2
+    CHOICES = ('A', 'B', 'C', 'D', '0')
+    KEYMAP = {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D', '1': 'A', '2': 'B', '3': 'C', '4': 'D', '0': '0'}
+
+    def __init__(self, parent, atlas_store: BubbleAtlasStore, names: List[str], config: Dict,
+                 on_apply_callback: Callable[[Dict[str, Dict[int, str]], Set[str]], None]):
+        """
+        Args:
+            parent: Cửa sổ cha (AppWindow)
+            atlas_store: Atlas các câu cần review của phiên
+            names: Tên các tờ đưa vào hàng đợi (tờ chưa review)
+            config: Cấu hình đã nạp của App
+            on_apply_callback: Hàm chấm lại hàng loạt: ({tên: {câu: đáp án}}, {tên các tờ đã xử lý hết})
+        """
+        super().__init__(parent)
+        self.P = config['GUI_CONFIG']['PALETTE']
+        self.D = config['GUI_CONFIG']['DEFAULT_SETTINGS']
+        self.geometry(self.D['REVIEW_GEOMETRY'])
+
+        self.atlas_store = atlas_store
+        self.on_apply = on_apply_callback
+        # Hàng đợi: (confidence, tên, câu) + đáp án máy đọc; quyết định của người xem theo chỉ số hàng đợi
+        self.items: List[Tuple[float, str, int]] = atlas_store.queue(names)
+        self.detected: List[str] = []
+        for _, name, q in self.items:
+            atlas = atlas_store.get(name)
+            self.detected.append(atlas.answers[int((atlas.questions == q).argmax())])
+        self.decisions: Dict[int, str] = {}
+        self.current = 0
+        self._photos = {}
+
+        self.title(f"Review Queue: {len(self.items)} questions")
+        self._setup_layout()
+        self._bind_keys()
+        self._render_page()
+
+        # Chặn tương tác với cửa sổ chính khi đang review (Modal mode)
+        self.grab_set()
+        self.focus_set()
+
+    def _setup_layout(self):
+        header = tk.Frame(self, bg=self.P['C_LIGHT'])
+        header.pack(fill=tk.X)
+        self.progress_label = tk.Label(header, text="", font=("Arial", 11, "bold"), bg=self.P['C_LIGHT'], anchor='w')
+        self.progress_label.pack(side=tk.LEFT, padx=10, pady=6)
+        tk.Label(header, text="A-D / 1-4: chọn  ·  0: trống  ·  Enter: giữ  ·  ↑↓: di chuyển  ·  Ctrl+S: áp dụng",
+                 font=("Arial", 9), fg=self.P['C_SECONDARY_DARK'], bg=self.P['C_LIGHT']).pack(side=tk.RIGHT, padx=10)
+
+        # Các dòng hiển thị cố định (PAGE_SIZE), nội dung được thay khi chuyển trang
+        self.list_frame = tk.Frame(self, bg=self.P['C_LIGHT'])
+        self.list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.slots = []
+        for _ in range(self.PAGE_SIZE):
+            row = tk.Frame(self.list_frame, bg=self.P['C_LIGHT'], bd=2, relief='flat')
+            row.pack(fill=tk.X, pady=2)
+            info = tk.Label(row, text="", width=34, anchor='w', font=("Arial", 10), bg=self.P['C_LIGHT'])
+            info.pack(side=tk.LEFT, padx=5)
+            crop = tk.Label(row, bg=self.P['C_LIGHT'])
+            crop.pack(side=tk.LEFT, padx=5)
+            buttons = {}
+            for choice in self.CHOICES:
+                btn = tk.Button(row, text=choice, width=3, relief='flat', font=("Arial", 10, "bold"))
+                btn.pack(side=tk.LEFT, padx=1)
+                buttons[choice] = btn
+            self.slots.append({'row': row, 'info': info, 'crop': crop, 'buttons': buttons, 'visible': True})
+
+        footer = tk.Frame(self, bg=self.P['C_LIGHT'])
+        footer.pack(fill=tk.X, pady=5, padx=5)
+        tk.Button(footer, text="Apply", bg=self.P['C_ACCENT'], fg=self.P['C_PRIMARY_DARK'],
+                  font=("Arial", 11, "bold"), relief='flat', padx=20, pady=4,
+                  command=self._apply).pack(side=tk.RIGHT)
+        tk.Button(footer, text="Cancel", bg=self.P['C_SECONDARY_DARK'], fg=self.P['C_LIGHT'],
+                  font=("Arial", 11, "bold"), relief='flat', padx=20, pady=4,
+                  command=self.destroy).pack(side=tk.RIGHT, padx=5)
+
+    def _bind_keys(self):
+        for key, choice in self.KEYMAP.items():
+            self.bind(f"<KeyPress-{key}>", lambda e, c=choice: self._decide(c))
+            if key.isalpha():
+                self.bind(f"<KeyPress-{key.upper()}>", lambda e, c=choice: self._decide(c))
+        self.bind("<Return>", lambda e: self._decide(None))
+        self.bind("<space>", lambda e: self._decide(None))
+        self.bind("<Down>", lambda e: self._move(1))
+        self.bind("<Up>", lambda e: self._move(-1))
+        self.bind("<Next>", lambda e: self._move(self.PAGE_SIZE))
+        self.bind("<Prior>", lambda e: self._move(-self.PAGE_SIZE))
+        self.bind("<Control-s>", lambda e: self._apply())
+
+    # --- HIỂN THỊ ---
+    def _page_start(self) -> int:
+        return (self.current // self.PAGE_SIZE) * self.PAGE_SIZE
+
+    def _photo(self, index: int):
+        """PhotoImage của ảnh cắt (tạo 1 lần, phóng to NEAREST cho dễ nhìn)."""
+        photo = self._photos.get(index)
+        if photo is None:
+            from PIL import Image, ImageTk
+            _, name, q = self.items[index]
+            atlas = self.atlas_store.get(name)
+            crop = atlas.crop(q) if atlas is not None else None
+            if crop is None:
+                return None
+            h, w = crop.shape
+            img = Image.fromarray(crop, "L").resize((w * self.CROP_SCALE, h * self.CROP_SCALE), Image.Resampling.NEAREST)
+            photo = ImageTk.PhotoImage(img)
+            self._photos[index] = photo
+        return photo
+
+    def _render_page(self):
+        start = self._page_start()
+        for offset, slot in enumerate(self.slots):
+            index = start + offset
+            # Trang cuối có thể thiếu dòng: ẩn/hiện lại theo thứ tự (chỉ các slot cuối bị ẩn)
+            if index >= len(self.items):
+                if slot['visible']:
+                    slot['row'].pack_forget()
+                    slot['visible'] = False
+                continue
+            if not slot['visible']:
+                slot['row'].pack(fill=tk.X, pady=2)
+                slot['visible'] = True
+            conf, name, q = self.items[index]
+            slot['info'].config(text=f"{index + 1}. {name} · Q{q + 1} · {int(conf * 100)}%")
+            slot['crop'].config(image=self._photo(index) or '')
+            for choice, btn in slot['buttons'].items():
+                btn.config(command=lambda i=index, c=choice: self._decide(c, i))
+            self._style_slot(offset)
+        self._update_progress()
+
+    def _style_slot(self, offset: int):
+        index = self._page_start() + offset
+        if index >= len(self.items):
+            return
+        slot = self.slots[offset]
+        is_current = index == self.current
+        slot['row'].config(relief='solid' if is_current else 'flat')
+        chosen = self.decisions.get(index)
+        detected = self.detected[index]
+        for choice, btn in slot['buttons'].items():
+            if chosen == choice:
+                btn.config(bg=self.P['C_ACCENT'], fg=self.P['C_PRIMARY_DARK'])
+            elif chosen is None and detected == choice:
+                # Đáp án máy đọc (chưa có quyết định)
+                btn.config(bg=self.P['C_SECONDARY_DARK'], fg=self.P['C_LIGHT'])
+            else:
+                btn.config(bg=self.P['C_LIGHT'], fg=self.P['C_PRIMARY_DARK'])
+
+    def _update_progress(self):
+        changed = sum(1 for i, ans in self.decisions.items() if ans != self.detected[i])
+        self.progress_label.config(text=f"{len(self.decisions)}/{len(self.items)} decided · {changed} changed")
+
+    # --- THAO TÁC ---
+    def _move(self, step: int):
+        if not self.items:
+            return
+        old_page = self._page_start()
+        old_offset = self.current - old_page
+        self.current = max(0, min(len(self.items) - 1, self.current + step))
+        if self._page_start() != old_page:
+            self._render_page()
+        else:
+            # Cùng trang: chỉ đổi viền 2 dòng
+            self._style_slot(old_offset)
+            self._style_slot(self.current - old_page)
+
+    def _decide(self, choice: Optional[str], index: Optional[int] = None):
+        """Ghi quyết định (None = giữ đáp án máy đọc) cho câu index (mặc định câu đang chọn)."""
+        if not self.items:
+            return
+        if index is not None:
+            self.current = index
+        self.decisions[self.current] = choice if choice is not None else self.detected[self.current]
+        self._style_slot(self.current - self._page_start())
+        self._update_progress()
+        self._move(1)
+
+    def _apply(self):
+        if not self.decisions:
+            self.destroy()
+            return
+        per_sheet: Dict[str, Dict[int, str]] = {}
+        for index, answer in self.decisions.items():
+            _, name, q = self.items[index]
+            per_sheet.setdefault(name, {})[q] = answer
+        # Tờ đã được quyết định hết mọi câu trong hàng đợi -> đánh dấu đã review
+        pending = {name for index, (_, name, _) in enumerate(self.items) if index not in self.decisions}
+        completed = set(per_sheet) - pending
+        try:
+            self.on_apply(per_sheet, completed)
+        except Exception as e:
+            messagebox.showerror("Lỗi", f"Không thể áp dụng: {e}")
+            return
+        self.destroy()
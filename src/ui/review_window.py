@@ -1,13 +1,16 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
 from pathlib import Path
+from typing import Any, Dict, Optional
 from src.utils import FileHandler
+from src.core.bubble_atlas import is_uncertain
+from .review_cache import ReviewImageCache
 
 CONFIG_PATH = Path("config/app_config.json")
 
 class ReviewWindow(tk.Toplevel):
-    def __init__(self, parent, student_name, img_path, current_answers, confidence_list, on_save_callback):
+    def __init__(self, parent, student_name, img_path, current_answers, confidence_list, on_save_callback,
+                 config: Optional[Dict[str, Any]] = None, image_cache: Optional[ReviewImageCache] = None):
         """
         Args:
             parent: Cửa sổ cha (AppWindow)
@@ -16,10 +19,12 @@ class ReviewWindow(tk.Toplevel):
             current_answers: Chuỗi đáp án hiện tại (VD: "ABCD0A...")
             confidence_list: List độ tự tin tương ứng (VD: [0.99, 0.15, ...])
             on_save_callback: Hàm sẽ gọi khi người dùng bấm Save (trả về chuỗi đáp án mới)
+            config: Cấu hình đã nạp của App (None = đọc lại app_config.json)
+            image_cache: Cache ảnh review dùng chung giữa các lần mở (None = render mới)
         """
         super().__init__(parent)
         self.title(f"Review: {student_name}")
-        self.config = FileHandler.load_config(CONFIG_PATH)
+        self.config = config or FileHandler.load_config(CONFIG_PATH)
         self.gui_cfg = self.config['GUI_CONFIG']
         self.app_cfg = self.config['ALGORITHM_CONFIG']
         
@@ -33,6 +38,7 @@ class ReviewWindow(tk.Toplevel):
         self.answers = list(current_answers)
         self.confidences = confidence_list
         self.on_save = on_save_callback
+        self.image_cache = image_cache or ReviewImageCache(self.app_cfg['warp_size']['width'], max_bytes=0)
         
         self.CONF_THRESHOLD = self.app_cfg['conf_threshold']
         
@@ -112,17 +118,9 @@ class ReviewWindow(tk.Toplevel):
             return
             
         try:
-            # Dùng PIL để mở ảnh
-            pil_img = Image.open(self.img_path)
-            w, h = pil_img.size
-            pil_img = pil_img.crop((80, 140, w, h))
-            
-            new_w, new_h = pil_img.size
-            final_w = int(new_w * 0.9)
-            final_h = int(new_h * 0.9)
-            
-            # Dùng LANCZOS để ảnh sắc nét nhất khi thu nhỏ
-            pil_img = pil_img.resize((final_w, final_h), Image.Resampling.LANCZOS)
+            # Ảnh đã cắt + thu nhỏ lấy từ cache (thường đã được prefetch ở thread nền)
+            from PIL import ImageTk
+            pil_img = self.image_cache.get(self.img_path)
 
             self.tk_img = ImageTk.PhotoImage(pil_img)
             self.canvas.create_image(0, 0, image=self.tk_img, anchor="nw")
@@ -139,7 +137,7 @@ class ReviewWindow(tk.Toplevel):
         # Duyệt qua tất cả câu hỏi
         for i, (ans, conf) in enumerate(zip(self.answers, self.confidences)):
             # Chỉ hiện những câu Confidence < Threshold
-            if conf < self.CONF_THRESHOLD or (ans == '0' and conf < self.CONF_THRESHOLD*2):
+            if is_uncertain(ans, conf, self.CONF_THRESHOLD):
                 self._create_question_row(i, ans, conf, row_idx)
                 row_idx += 1
                 count += 1
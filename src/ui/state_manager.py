@@ -27,10 +27,7 @@ class FormStateManager:
             'test_id': self.UNSELECTED_ID,
             'test_date': self.UNSELECTED_DATE_HINT,
             'class_name': self.UNSELECTED_CLASS_HINT,
-            'image_files': [], # List[Path]
-            
-            # Outputs
-            'results': [],     # List[Dict]
+            'image_files': [], # List[Path | PageRef] (trang của file TIFF/PDF nhiều trang)
             
             # Derived / Internal State
             'key': "",         # Chuỗi đáp án chuẩn
@@ -46,8 +43,10 @@ class FormStateManager:
             self.state[key] = value
             
             # Chỉ log nếu giá trị thực sự thay đổi (tránh spam log)
-            if old_value != value and key != 'results':
-                app_logger.debug(f"State changed: {key} = {value}")
+            if old_value != value:
+                # Danh sách file có thể rất dài -> chỉ log số lượng
+                shown = f"<{len(value)} items>" if isinstance(value, list) else value
+                app_logger.debug(f"State changed: {key} = {shown}")
 
             if not skip_validation:
                 self._update_derived_key()
@@ -7,6 +7,8 @@ Bao gồm: Logging, File I/O (JSON/Excel), và các hàm toán học bổ trợ
 from .logger import app_logger
 from .file_io import FileHandler
 from .helpers import OMRUtils
+from .tracing import tracer
+from .metrics import metrics_log
 
 # Định nghĩa những gì sẽ được export khi dùng "from src.utils import *"
-__all__ = ['app_logger', 'FileHandler', 'OMRUtils']
\ No newline at end of file
+__all__ = ['app_logger', 'FileHandler', 'OMRUtils', 'tracer', 'metrics_log']
\ No newline at end of file
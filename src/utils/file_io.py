@@ -1,5 +1,4 @@
 import json
-import pandas as pd
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 from .logger import app_logger
@@ -82,6 +81,9 @@ class FileHandler:
             app_logger.warning("Không có kết quả để lưu.")
             return None
 
+        # pandas nặng (~300 ms import) -> chỉ nạp khi thực sự lưu CSV
+        import pandas as pd
+
         try:
             master_dir = Path("data")
             master_dir.mkdir(exist_ok=True)
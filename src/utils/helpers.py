@@ -20,6 +20,14 @@ class OMRUtils:
             (147, 200)  # Part 7: Reading Comprehension
         ]
 
+    @staticmethod
+    def get_session_dir_name(test_date: str, set_name: str, test_id: str, class_name: str) -> str:
+        """
+        Tên thư mục log chứa ảnh kết quả của 1 phiên chấm (VD: "20260322_ETS2026_6_T6").
+        Dùng chung cho Worker (ghi ảnh), Review và xuất Báo cáo (đọc ảnh).
+        """
+        return f"{test_date}_{set_name}_{test_id}_{class_name}".replace(" ", "").replace("-", "")
+
     @staticmethod
     def get_answer_key(key_data: Dict[str, Dict[str, str]], set_name: str, test_id: str) -> str:
         """
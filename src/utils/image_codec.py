@@ -0,0 +1,232 @@
+import io
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+
+# cv2 / PIL được import khi mã hoá lần đầu: process xuất thẻ điểm chỉ cần PIL,
+# còn luồng chấm điểm (OpenCV) thường không cần PIL.
+if TYPE_CHECKING:
+    from PIL import Image
+
+class ImageOutputPolicy:
+    """
+    Chính sách mã hoá ảnh đầu ra (ảnh kết quả chấm & thẻ điểm), đọc từ OUTPUT_CONFIG.
+
+    Các tuỳ chọn:
+        format: 'png' | 'jpeg' | 'webp'
+        png_level: Mức nén PNG 0-9 (0 = nhanh nhất, file lớn nhất).
+        jpeg_quality / webp_quality: Chất lượng 1-100.
+        scale: Hệ số thu nhỏ trước khi mã hoá (1.0 = giữ nguyên).
+        quantize_colors: > 0 để lượng tử hoá về bảng màu N màu (chỉ áp dụng cho PNG).
+    """
+
+    EXTENSIONS = {'png': '.png', 'jpeg': '.jpg', 'webp': '.webp'}
+
+    def __init__(self, fmt: str = 'png', png_level: int = 1, jpeg_quality: int = 90,
+                 webp_quality: int = 85, scale: float = 1.0, quantize_colors: int = 0):
+        fmt = fmt.lower().replace('jpg', 'jpeg')
+        if fmt not in self.EXTENSIONS:
+            raise ValueError(f"Định dạng ảnh không hỗ trợ: '{fmt}'")
+        self.fmt = fmt
+        self.png_level = int(png_level)
+        self.jpeg_quality = int(jpeg_quality)
+        self.webp_quality = int(webp_quality)
+        self.scale = float(scale)
+        self.quantize_colors = int(quantize_colors)
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict[str, Any]]) -> 'ImageOutputPolicy':
+        cfg = cfg or {}
+        return cls(
+            fmt=cfg.get('format', 'png'),
+            png_level=cfg.get('png_level', 1),
+            jpeg_quality=cfg.get('jpeg_quality', 90),
+            webp_quality=cfg.get('webp_quality', 85),
+            scale=cfg.get('scale', 1.0),
+            quantize_colors=cfg.get('quantize_colors', 0)
+        )
+
+    @property
+    def extension(self) -> str:
+        return self.EXTENSIONS[self.fmt]
+
+    def describe(self) -> str:
+        """Mô tả ngắn gọn (dùng cho log và benchmark)."""
+        if self.fmt == 'png':
+            desc = f"png-l{self.png_level}"
+            if self.quantize_colors:
+                desc += f"-q{self.quantize_colors}"
+        elif self.fmt == 'jpeg':
+            desc = f"jpeg-{self.jpeg_quality}"
+        else:
+            desc = f"webp-{self.webp_quality}"
+        if self.scale != 1.0:
+            desc += f"-x{self.scale:g}"
+        return desc
+
+    def encode_bgr(self, image: np.ndarray) -> bytes:
+        """Mã hoá ảnh BGR (OpenCV) thành bytes theo chính sách."""
+        import cv2
+
+        if self.scale != 1.0:
+            image = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+        # Lượng tử hoá bảng màu chỉ có ở PIL
+        if self.fmt == 'png' and self.quantize_colors:
+            from PIL import Image
+            rgb = Image.fromarray(np.ascontiguousarray(image[:, :, ::-1]), "RGB")
+            return self._encode_pil_scaled(rgb)
+
+        if self.fmt == 'png':
+            params = [cv2.IMWRITE_PNG_COMPRESSION, self.png_level]
+        elif self.fmt == 'jpeg':
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        else:
+            params = [cv2.IMWRITE_WEBP_QUALITY, self.webp_quality]
+
+        success, buffer = cv2.imencode(self.extension, image, params)
+        if not success:
+            raise ValueError(f"Không thể mã hoá ảnh ({self.describe()}).")
+        return buffer.tobytes()
+
+    def encode_pil(self, image: 'Image.Image') -> bytes:
+        """Mã hoá ảnh PIL (RGB) thành bytes theo chính sách."""
+        from PIL import Image
+
+        if self.scale != 1.0:
+            new_size = (max(1, int(image.width * self.scale)), max(1, int(image.height * self.scale)))
+            image = image.resize(new_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return self._encode_pil_scaled(image)
+
+    def _encode_pil_scaled(self, image: 'Image.Image') -> bytes:
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        if self.fmt == 'png':
+            if self.quantize_colors:
+                image = image.quantize(colors=self.quantize_colors, method=Image.Quantize.FASTOCTREE)
+            image.save(buffer, format="PNG", compress_level=self.png_level)
+        elif self.fmt == 'jpeg':
+            image.save(buffer, format="JPEG", quality=self.jpeg_quality)
+        else:
+            image.save(buffer, format="WEBP", quality=self.webp_quality, method=4)
+        return buffer.getvalue()
+
+    @staticmethod
+    def write_bytes(file_path: Path, data: bytes):
+        """Ghi bytes xuống đĩa (open() hỗ trợ đường dẫn tiếng Việt, khác với cv2.imwrite)."""
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+    @classmethod
+    def find_existing(cls, directory: Path, stem: str) -> Optional[Path]:
+        """Tìm file ảnh đã lưu theo tên (không phụ thuộc định dạng đã cấu hình lúc ghi)."""
+        for ext in cls.EXTENSIONS.values():
+            candidate = directory / f"{stem}{ext}"
+            if candidate.exists():
+                return candidate
+        return None
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) từ header JPEG (segment SOFn), không giải mã ảnh."""
+    if data[:2] != b'\xff\xd8':
+        return None
+    i, n = 2, len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        # SOF0-SOF15 (trừ DHT 0xC4, JPG 0xC8, DAC 0xCC): [len 2][precision 1][height 2][width 2]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = int.from_bytes(data[i + 5:i + 7], 'big')
+            width = int.from_bytes(data[i + 7:i + 9], 'big')
+            return width, height
+        i += 2 + int.from_bytes(data[i + 2:i + 4], 'big')
+    return None
+
+def _png_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) từ chunk IHDR của PNG."""
+    if data[:8] != b'\x89PNG\r\n\x1a\n' or len(data) < 24:
+        return None
+    return int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+
+class ImageDecodePolicy:
+    """
+    Chính sách giải mã ảnh đầu vào, đọc từ ALGORITHM_CONFIG['decode'].
+
+    Ảnh chụp điện thoại 12-48 MP lớn hơn nhiều so với ảnh warp (warp_size): nếu ảnh đủ lớn,
+    giải mã thẳng ở 1/2, 1/4, 1/8 kích thước (IMREAD_REDUCED_*, JPEG giải mã DCT thu nhỏ nên
+    nhanh hơn và tốn ít RAM hơn), miễn là cạnh ảnh vẫn >= min_scale lần cạnh tương ứng của warp.
+
+    Các tuỳ chọn:
+        reduced: Bật giải mã thu nhỏ.
+        min_scale: Tỉ lệ tối thiểu giữa ảnh đã thu nhỏ và ảnh warp (giữ đủ chi tiết cho bubble).
+        grayscale: Giải mã thẳng ra ảnh xám (ảnh kết quả khi đó là ảnh xám vẽ lưới màu).
+    """
+
+    FACTORS = (8, 4, 2)
+    _REDUCED_COLOR = {2: 'IMREAD_REDUCED_COLOR_2', 4: 'IMREAD_REDUCED_COLOR_4', 8: 'IMREAD_REDUCED_COLOR_8'}
+    _REDUCED_GRAY = {2: 'IMREAD_REDUCED_GRAYSCALE_2', 4: 'IMREAD_REDUCED_GRAYSCALE_4', 8: 'IMREAD_REDUCED_GRAYSCALE_8'}
+
+    def __init__(self, warp_size: Tuple[int, int], reduced: bool = True, min_scale: float = 1.5, grayscale: bool = False):
+        self.warp_w, self.warp_h = max(warp_size), min(warp_size)
+        self.reduced = bool(reduced)
+        self.min_scale = float(min_scale)
+        self.grayscale = bool(grayscale)
+
+    @classmethod
+    def from_config(cls, algo_cfg: Dict[str, Any]) -> 'ImageDecodePolicy':
+        cfg = algo_cfg.get('decode', {})
+        warp = algo_cfg['warp_size']
+        return cls(
+            warp_size=(warp['width'], warp['height']),
+            reduced=cfg.get('reduced', True),
+            min_scale=cfg.get('min_scale', 1.5),
+            grayscale=cfg.get('grayscale', False)
+        )
+
+    def factor_for(self, width: int, height: int) -> int:
+        """Hệ số thu nhỏ lớn nhất mà ảnh vẫn đủ lớn so với ảnh warp (1 = giữ nguyên)."""
+        if not self.reduced:
+            return 1
+        long_side, short_side = max(width, height), min(width, height)
+        for factor in self.FACTORS:
+            if (long_side / factor >= self.min_scale * self.warp_w
+                    and short_side / factor >= self.min_scale * self.warp_h):
+                return factor
+        return 1
+
+    def decode(self, data: np.ndarray) -> Tuple[Optional[np.ndarray], int]:
+        """
+        Giải mã buffer ảnh (np.uint8). Trả về (ảnh BGR hoặc xám, hệ số thu nhỏ đã dùng).
+        Bỏ qua EXIF orientation (giống IMREAD_UNCHANGED trước đây) để toạ độ marker không đổi.
+        """
+        import cv2
+
+        head = data[:65536].tobytes()
+        size = _jpeg_size(head) or _png_size(head)
+        factor = self.factor_for(*size) if size else 1
+        flags = cv2.IMREAD_GRAYSCALE if self.grayscale else cv2.IMREAD_COLOR
+        if factor > 1:
+            flags = getattr(cv2, (self._REDUCED_GRAY if self.grayscale else self._REDUCED_COLOR)[factor])
+        image = cv2.imdecode(data, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+
+        if image is not None and size is None:
+            # Định dạng không đọc được header (TIFF, BMP...): giải mã đủ rồi thu nhỏ trước khi xử lý
+            return self.fit(image)
+        return image, factor
+
+    def fit(self, image: np.ndarray) -> Tuple[np.ndarray, int]:
+        """Thu nhỏ (INTER_AREA) ảnh đã giải mã theo cùng quy tắc, cho nguồn không giải mã thu nhỏ được."""
+        import cv2
+
+        if self.grayscale and image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        factor = self.factor_for(image.shape[1], image.shape[0])
+        if factor > 1:
+            image = cv2.resize(image, (image.shape[1] // factor, image.shape[0] // factor),
+                               interpolation=cv2.INTER_AREA)
+        return image, factor
@@ -0,0 +1,25 @@
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Tuple
+
+def lazy_exports(package: str, exports: Dict[str, str]) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    Tạo cặp __getattr__/__dir__ (PEP 562) cho __init__ của package: mỗi tên export
+    chỉ import module con tương ứng khi được truy cập lần đầu.
+
+    Args:
+        package: __name__ của package.
+        exports: {tên export: module con tương đối, VD '.omr_engine'}.
+    """
+    def __getattr__(name: str) -> Any:
+        if name not in exports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        module = import_module(exports[name], package)
+        value = getattr(module, name)
+        # Lưu vào namespace của package để các lần truy cập sau không qua __getattr__
+        setattr(import_module(package), name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(import_module(package))) | set(exports))
+
+    return __getattr__, __dir__
@@ -1,15 +1,86 @@
+import atexit
 import logging
+import logging.handlers
+import multiprocessing.util
+import queue
 import sys
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
 
-def setup_logger(name: str = "TOEIC_OMR", log_dir: str = "logs") -> logging.Logger:
+class RateLimitFilter(logging.Filter):
+    """
+    Giới hạn số bản ghi INFO/DEBUG cùng mẫu (record.msg) trong mỗi giây.
+    Khi chấm nhiều tờ/giây, log từng tờ được lấy mẫu thay vì ghi hết; bản ghi đầu tiên
+    của giây kế tiếp kèm số bản ghi đã bị bỏ qua. WARNING trở lên luôn được ghi.
+    """
+
+    MAX_KEYS = 1000
+
+    def __init__(self, max_per_second: int = 20):
+        super().__init__()
+        self.max_per_second = max_per_second
+        self._windows = {}  # key -> [thời điểm bắt đầu cửa sổ, số bản ghi, số bị bỏ qua]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.max_per_second <= 0:
+            return True
+
+        key = (record.msg if isinstance(record.msg, str) else repr(record.msg), record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 1.0:
+                if window is None and len(self._windows) >= self.MAX_KEYS:
+                    self._windows.clear()
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} [+{suppressed} similar messages suppressed]"
+                return True
+
+            window[1] += 1
+            if window[1] <= self.max_per_second:
+                return True
+            window[2] += 1
+            return False
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler mặc định format message ngay trên thread gọi log (prepare).
+    Hàng đợi ở đây nằm trong cùng process nên đẩy nguyên record, để thread nền format.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class _StopOnce:
+    """Dừng QueueListener đúng 1 lần (gọi từ cả atexit và multiprocessing Finalize)."""
+
+    def __init__(self, listener: logging.handlers.QueueListener):
+        self.listener = listener
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def __call__(self):
+        with self._lock:
+            if not self._stopped:
+                self._stopped = True
+                self.listener.stop()
+
+def setup_logger(name: str = "TOEIC_OMR", log_dir: str = "logs", rate_limit: int = 20) -> logging.Logger:
     """
     Thiết lập Logger tập trung cho toàn bộ ứng dụng.
     
     Cơ chế hoạt động:
     1. Ghi ra File: Mức DEBUG (Ghi lại mọi chi tiết để lập trình viên sửa lỗi).
     2. Ghi ra Console: Mức INFO (Thông tin gọn gàng cho người dùng xem).
+    3. Các thread/process chỉ đẩy bản ghi vào hàng đợi (QueueHandler, không bao giờ block);
+       việc format và ghi File/Console do 1 thread nền (QueueListener) đảm nhận,
+       nên ổ log chậm (ổ mạng) không làm chậm luồng chấm điểm.
+    4. Log INFO/DEBUG cùng mẫu bị giới hạn rate_limit bản ghi/giây (RateLimitFilter).
     """
     # 1. Chuẩn bị thư mục Log
     # Lấy đường dẫn gốc của dự án (thư mục chứa src)
@@ -40,13 +111,26 @@ def setup_logger(name: str = "TOEIC_OMR", log_dir: str = "logs") -> logging.Logg
     file_handler = logging.FileHandler(file_path, encoding='utf-8')
     file_handler.setLevel(logging.DEBUG) # Ghi tất cả lỗi, warning, info, debug
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
 
     # --- HANDLER 2: Ghi ra màn hình Console ---
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO) # Chỉ ghi Info, Warning, Error (bỏ qua debug rác)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+
+    # --- GHI BẤT ĐỒNG BỘ: Logger -> Queue -> Thread nền -> File/Console ---
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate_limit))
+    logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    # Ghi nốt các bản ghi còn trong hàng đợi khi thoát chương trình
+    # (process con của multiprocessing thoát bằng os._exit, không chạy atexit -> dùng Finalize)
+    stop_once = _StopOnce(listener)
+    atexit.register(stop_once)
+    multiprocessing.util.Finalize(None, stop_once, exitpriority=10)
+    logger.listener = listener
 
     return logger
 
@@ -0,0 +1,79 @@
+import json
+import queue
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+class MetricsLog:
+    """
+    Luồng số liệu máy đọc được: mỗi tờ bài 1 bản ghi JSON (JSON lines) trong
+    logs/metrics/metrics_<ngày>.jsonl. Ghi ở thread nền (hàng đợi không giới hạn),
+    nên record() không bao giờ chờ đĩa. Tổng hợp theo ngày: python -m src.tools.metrics_rollup
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.output_dir = Path("logs/metrics")
+        self._queue: 'queue.SimpleQueue' = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def configure(self, cfg: Optional[Dict[str, Any]]):
+        """Áp dụng METRICS_CONFIG (enabled, output_dir)."""
+        cfg = cfg or {}
+        self.output_dir = Path(cfg.get('output_dir', "logs/metrics"))
+        self.enabled = bool(cfg.get('enabled', True))
+
+    def record(self, **fields):
+        """Đưa 1 bản ghi vào hàng đợi (thêm timestamp nếu chưa có)."""
+        if not self.enabled:
+            return
+        fields.setdefault('ts', datetime.now().isoformat(timespec='milliseconds'))
+        self._ensure_thread()
+        self._queue.put(fields)
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="MetricsLog", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        current_day, fp = None, None
+        while True:
+            item = self._queue.get()
+            if isinstance(item, threading.Event):
+                # Yêu cầu flush từ flush()
+                if fp is not None:
+                    fp.flush()
+                item.set()
+                continue
+            try:
+                # Mỗi ngày 1 file, đổi file khi sang ngày mới
+                day = item['ts'][:10]
+                if day != current_day:
+                    if fp is not None:
+                        fp.close()
+                    self.output_dir.mkdir(parents=True, exist_ok=True)
+                    fp = open(self.output_dir / f"metrics_{day}.jsonl", "a", encoding="utf-8")
+                    current_day = day
+                fp.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+                # Flush khi hàng đợi trống để file luôn đọc được trong lúc chạy
+                if self._queue.empty():
+                    fp.flush()
+            except Exception as e:
+                from .logger import app_logger
+                app_logger.error(f"Metrics log error: {e}")
+
+    def flush(self, timeout: float = 5.0):
+        """Chờ ghi hết các bản ghi đang có trong hàng đợi xuống đĩa."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+# Singleton dùng chung (GUI/worker gọi metrics_log.record(...))
+metrics_log = MetricsLog()
@@ -0,0 +1,133 @@
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+import numpy as np
+
+# Định dạng chứa nhiều trang (1 file / 1 xấp phiếu của máy scan tốc độ cao)
+CONTAINER_SUFFIXES = ('.tif', '.tiff', '.pdf')
+
+class PageRef:
+    """
+    1 trang trong file nhiều trang (TIFF/PDF), dùng thay Path trong danh sách tờ bài.
+
+    name/stem theo dạng '<tên file>_p0001' (dùng làm tên học viên / tên ảnh kết quả);
+    str() là đường dẫn ảo cùng thư mục với file gốc nên Path(str(page)).stem == page.stem.
+    """
+
+    __slots__ = ('container', 'index', 'name', 'stem')
+
+    def __init__(self, container: Path, index: int):
+        self.container = Path(container)
+        self.index = index
+        self.stem = f"{self.container.stem}_p{index + 1:04d}"
+        self.name = f"{self.stem}{self.container.suffix}"
+
+    def __str__(self) -> str:
+        return str(self.container.with_name(self.name))
+
+    def __repr__(self) -> str:
+        return f"PageRef({self.container.name!r}, {self.index})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PageRef) and (self.container, self.index) == (other.container, other.index)
+
+    def __hash__(self) -> int:
+        return hash((self.container, self.index))
+
+SheetSource = Union[Path, PageRef]
+
+def is_container(path: Path) -> bool:
+    return Path(path).suffix.lower() in CONTAINER_SUFFIXES
+
+def _pdf_reader(fp):
+    """PdfReader trên file đang mở (đọc object theo offset khi cần; truyền đường dẫn thì pypdf nạp cả file)."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ValueError("Đọc file PDF cần thư viện pypdf (pip install pypdf).")
+    return PdfReader(fp)
+
+def count_pages(path: Path) -> int:
+    """Số trang của file TIFF/PDF (chỉ đọc cấu trúc file, không giải mã ảnh)."""
+    path = Path(path)
+    if path.suffix.lower() == '.pdf':
+        with open(path, "rb") as fp:
+            return len(_pdf_reader(fp).pages)
+    from PIL import Image
+    with Image.open(path) as img:
+        return getattr(img, 'n_frames', 1)
+
+def expand_sources(paths: Iterable[Path]) -> List[SheetSource]:
+    """Danh sách file người dùng chọn -> danh sách tờ bài (file nhiều trang được tách thành PageRef)."""
+    sources: List[SheetSource] = []
+    for path in map(Path, paths):
+        if is_container(path):
+            sources.extend(PageRef(path, i) for i in range(count_pages(path)))
+        else:
+            sources.append(path)
+    return sources
+
+class ContainerReader:
+    """
+    Đọc lần lượt từng trang của 1 file TIFF/PDF đang mở (không nạp cả xấp vào bộ nhớ).
+    read_page() trả về ('encoded', bytes JPEG gốc) nếu trang là ảnh JPEG nhúng trong PDF
+    (giải mã được thu nhỏ như file JPEG), hoặc ('pixels', ảnh BGR/xám đã giải mã).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fp = None
+        self._pdf = None
+        self._tiff = None
+        if self.path.suffix.lower() == '.pdf':
+            self._fp = open(self.path, "rb")
+            self._pdf = _pdf_reader(self._fp)
+        else:
+            from PIL import Image
+            self._tiff = Image.open(self.path)
+
+    def read_page(self, index: int) -> Tuple[str, Union[bytes, np.ndarray]]:
+        if self._pdf is not None:
+            return self._read_pdf_page(index)
+        self._tiff.seek(index)
+        return 'pixels', self._pil_to_array(self._tiff)
+
+    def _read_pdf_page(self, index: int) -> Tuple[str, Union[bytes, np.ndarray]]:
+        page = self._pdf.pages[index]
+        xobjects = page.get('/Resources', {}).get('/XObject', {})
+        refs = [ref for ref in xobjects.values() if hasattr(ref, 'idnum')]
+        try:
+            images = [obj.get_object() for obj in xobjects.values()]
+            images = [obj for obj in images if obj.get('/Subtype') == '/Image']
+            if not images:
+                raise ValueError(f"Trang {index + 1} không có ảnh scan.")
+            # Trang scan: 1 ảnh chiếm cả trang -> lấy ảnh lớn nhất
+            image = max(images, key=lambda obj: int(obj.get('/Width', 0)) * int(obj.get('/Height', 0)))
+            filters = image.get('/Filter')
+            filters = filters if isinstance(filters, list) else [filters]
+            if filters == ['/DCTDecode']:
+                # JPEG nhúng nguyên bản: lấy thẳng bytes, không giải mã qua PIL
+                return 'encoded', image.get_data()
+            # Ảnh nén khác (Flate, CCITT G4...): để pypdf giải mã qua PIL
+            pdf_image = max(page.images, key=lambda im: im.image.width * im.image.height)
+            return 'pixels', self._pil_to_array(pdf_image.image)
+        finally:
+            # pypdf giữ mọi object đã đọc trong cache: bỏ ảnh của trang vừa đọc để RAM không tăng theo số trang
+            for ref in refs:
+                self._pdf.resolved_objects.pop((ref.generation, ref.idnum), None)
+
+    @staticmethod
+    def _pil_to_array(img) -> np.ndarray:
+        import cv2
+
+        if img.mode in ('1', 'L', 'I;16', 'I'):
+            return np.asarray(img.convert('L'))
+        return cv2.cvtColor(np.asarray(img.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+    def close(self):
+        if self._tiff is not None:
+            self._tiff.close()
+        if self._fp is not None:
+            self._fp.close()
+        self._fp = None
+        self._pdf = None
+        self._tiff = None
@@ -0,0 +1,93 @@
+from pathlib import Path
+from typing import Dict, List
+
+class PdfStreamWriter:
+    """
+    Ghi file PDF nhiều trang theo kiểu streaming: mỗi trang là 1 ảnh JPEG (DCTDecode)
+    được ghi thẳng xuống đĩa ngay khi nhận, nên bộ nhớ không phụ thuộc số trang.
+    Chỉ giữ lại offset của các object để ghi bảng xref khi đóng file.
+
+    Cách dùng:
+        with PdfStreamWriter(path, dpi=150) as pdf:
+            pdf.add_jpeg_page(jpeg_bytes, width_px, height_px)
+    """
+
+    # Object cố định: 1 = Catalog, 2 = Pages (ghi ở cuối khi đã biết danh sách trang)
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, file_path: Path, dpi: int = 150):
+        self.file_path = Path(file_path)
+        self.dpi = dpi
+        self._offsets: Dict[int, int] = {}
+        self._page_ids: List[int] = []
+        self._next_id = 3
+
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = open(self.file_path, "wb")
+        self._fp.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    def _alloc_id(self) -> int:
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_object(self, obj_id: int, body: bytes, stream: bytes = None):
+        self._offsets[obj_id] = self._fp.tell()
+        self._fp.write(f"{obj_id} 0 obj\n".encode("ascii"))
+        self._fp.write(body)
+        if stream is not None:
+            self._fp.write(b"\nstream\n")
+            self._fp.write(stream)
+            self._fp.write(b"\nendstream")
+        self._fp.write(b"\nendobj\n")
+
+    def add_jpeg_page(self, jpeg_bytes: bytes, width: int, height: int):
+        """Thêm 1 trang chứa trọn ảnh JPEG (RGB) kích thước width x height pixel."""
+        page_w = width * 72.0 / self.dpi
+        page_h = height * 72.0 / self.dpi
+
+        image_id, content_id, page_id = self._alloc_id(), self._alloc_id(), self._alloc_id()
+
+        self._write_object(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg_bytes)} >>"
+        ).encode("ascii"), jpeg_bytes)
+
+        content = f"q {page_w:.2f} 0 0 {page_h:.2f} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._write_object(content_id, f"<< /Length {len(content)} >>".encode("ascii"), content)
+
+        self._write_object(page_id, (
+            f"<< /Type /Page /Parent {self.PAGES_ID} 0 R /MediaBox [0 0 {page_w:.2f} {page_h:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("ascii"))
+        self._page_ids.append(page_id)
+
+    def close(self):
+        """Ghi cây trang, Catalog, bảng xref và trailer rồi đóng file."""
+        if self._fp is None:
+            return
+        kids = " ".join(f"{pid} 0 R" for pid in self._page_ids)
+        self._write_object(self.PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode("ascii"))
+        self._write_object(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>".encode("ascii"))
+
+        xref_offset = self._fp.tell()
+        size = self._next_id
+        self._fp.write(f"xref\n0 {size}\n".encode("ascii"))
+        self._fp.write(b"0000000000 65535 f\r\n")
+        for obj_id in range(1, size):
+            self._fp.write(f"{self._offsets[obj_id]:010d} 00000 n\r\n".encode("ascii"))
+        self._fp.write(f"trailer\n<< /Size {size} /Root {self.CATALOG_ID} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+
+        self._fp.close()
+        self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+class _NoopSpan:
+    """Span rỗng dùng khi tắt tracing (1 instance dùng chung, không cấp phát)."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'ctx', 't0')
+
+    def __init__(self, tracer: 'Tracer', name: str, ctx: Optional[Dict[str, Any]]):
+        self.tracer = tracer
+        self.name = name
+        self.ctx = ctx
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._add(self.name, self.t0, time.perf_counter_ns(), self.ctx)
+        return False
+
+class _ContextSpan(_Span):
+    """Span gắn ngữ cảnh (tờ đang chấm, worker...) cho mọi span con trên cùng thread."""
+    __slots__ = ('previous', 'emit')
+
+    def __init__(self, tracer: 'Tracer', name: str, ctx: Dict[str, Any], emit: bool = True):
+        super().__init__(tracer, name, ctx)
+        self.emit = emit
+
+    def __enter__(self):
+        self.previous = getattr(self.tracer._local, 'ctx', None)
+        self.tracer._local.ctx = self.ctx
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        if self.emit:
+            super().__exit__(*exc)
+        self.tracer._local.ctx = self.previous
+        return False
+
+class Tracer:
+    """
+    Thu thập span thời gian của từng giai đoạn xử lý 1 tờ bài (read, decode, threshold,
+    marker_search, warp, timing_marks, density, decision, overlay, encode, write).
+
+    Khi tắt (mặc định), span() trả về span rỗng dùng chung -> chi phí gần như bằng 0.
+    Khi bật, mỗi span mang theo ngữ cảnh của tờ đang xử lý (tên, kích thước ảnh, worker)
+    và có thể xuất ra JSON lines hoặc Chrome trace (mở bằng chrome://tracing / Perfetto).
+
+    Cách dùng:
+        with tracer.sheet(img_path.name):
+            with tracer.span('decode'):
+                ...
+            tracer.annotate(width=w, height=h)
+    """
+
+    FORMATS = ('chrome', 'jsonl')
+
+    def __init__(self):
+        self.enabled = False
+        self.fmt = 'chrome'
+        self.output_dir = Path("logs/traces")
+        self.max_events = 500_000
+        self.dropped = 0
+        self._events: List[tuple] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+
+    def configure(self, cfg: Optional[Dict[str, Any]]):
+        """Áp dụng TRACE_CONFIG (enabled, format, output_dir, max_events)."""
+        cfg = cfg or {}
+        fmt = cfg.get('format', 'chrome')
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Định dạng trace không hỗ trợ: '{fmt}'")
+        self.fmt = fmt
+        self.output_dir = Path(cfg.get('output_dir', "logs/traces"))
+        self.max_events = int(cfg.get('max_events', 500_000))
+        self.enabled = bool(cfg.get('enabled', False))
+
+    # --- THU THẬP ---
+    def span(self, name: str):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, getattr(self._local, 'ctx', None))
+
+    def sheet(self, name: str):
+        """Span bao trùm 1 tờ bài; mọi span con trên thread này mang ngữ cảnh của tờ."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        ctx = {'sheet': name, 'worker': f"{os.getpid()}:{threading.current_thread().name}"}
+        return _ContextSpan(self, 'sheet', ctx)
+
+    def annotate(self, **attrs):
+        """Bổ sung thuộc tính cho ngữ cảnh hiện tại (VD: kích thước ảnh sau khi decode)."""
+        if self.enabled:
+            ctx = getattr(self._local, 'ctx', None)
+            if ctx is not None:
+                ctx.update(attrs)
+
+    def current_context(self) -> Optional[Dict[str, Any]]:
+        """Ngữ cảnh hiện tại, để chuyển sang thread khác (VD: ImageWriter)."""
+        if not self.enabled:
+            return None
+        return getattr(self._local, 'ctx', None)
+
+    def attach(self, ctx: Optional[Dict[str, Any]]):
+        """Gắn ngữ cảnh lấy từ thread khác cho các span trong khối with (không tạo span mới)."""
+        if not self.enabled or ctx is None:
+            return _NOOP_SPAN
+        return _ContextSpan(self, 'attach', ctx, emit=False)
+
+    def _add(self, name: str, t0: int, t1: int, ctx: Optional[Dict[str, Any]]):
+        thread = threading.current_thread()
+        event = (name, t0, t1, ctx, os.getpid(), thread.ident, thread.name)
+        with self._lock:
+            if len(self._events) >= self.max_events:
+                self.dropped += 1
+                return
+            self._events.append(event)
+
+    # --- XUẤT ---
+    def export(self, file_path: Optional[Path] = None, fmt: Optional[str] = None) -> Optional[Path]:
+        """Ghi các span đã thu thập ra file rồi xoá bộ đệm. Trả về đường dẫn file (None nếu rỗng)."""
+        with self._lock:
+            events, self._events = self._events, []
+            dropped, self.dropped = self.dropped, 0
+        if not events:
+            return None
+
+        fmt = fmt or self.fmt
+        if file_path is None:
+            ext = ".json" if fmt == 'chrome' else ".jsonl"
+            file_path = self.output_dir / f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+        file_path = Path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if fmt == 'chrome':
+            self._write_chrome(file_path, events, dropped)
+        else:
+            self._write_jsonl(file_path, events)
+        return file_path
+
+    def _write_jsonl(self, file_path: Path, events: List[tuple]):
+        with open(file_path, "w", encoding="utf-8") as f:
+            for name, t0, t1, ctx, pid, tid, thread_name in events:
+                record = {
+                    'name': name,
+                    'start_us': round((t0 - self._origin) / 1000, 1),
+                    'dur_us': round((t1 - t0) / 1000, 1),
+                    'pid': pid,
+                    'thread': thread_name
+                }
+                if ctx:
+                    record.update(ctx)
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _write_chrome(self, file_path: Path, events: List[tuple], dropped: int):
+        trace_events = []
+        thread_names = {}
+        for name, t0, t1, ctx, pid, tid, thread_name in events:
+            thread_names[(pid, tid)] = thread_name
+            trace_events.append({
+                'name': name, 'cat': 'omr', 'ph': 'X',
+                'ts': (t0 - self._origin) / 1000, 'dur': (t1 - t0) / 1000,
+                'pid': pid, 'tid': tid, 'args': ctx or {}
+            })
+        for (pid, tid), thread_name in thread_names.items():
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                                 'args': {'name': thread_name}})
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({'traceEvents': trace_events, 'otherData': {'dropped_events': dropped}}, f, ensure_ascii=False)
+
+# Singleton dùng chung cho toàn bộ pipeline (tắt mặc định)
+tracer = Tracer()
@@ -1,7 +1,20 @@
 """
 Package Workers: Chứa các luồng xử lý nền (Background Threads).
+Các lớp được import khi truy cập lần đầu (PEP 562).
 """
+from typing import TYPE_CHECKING
+from src.utils.lazy_import import lazy_exports
 
-from .scoring_worker import ScoringWorker
+_EXPORTS = {
+    'ScoringWorker': '.scoring_worker',
+    'ReportWorker': '.report_worker',
+    'PipelineStats': '.pipeline_stats',
+}
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
 
-__all__ = ['ScoringWorker']
\ No newline at end of file
+if TYPE_CHECKING:
+    from .scoring_worker import ScoringWorker
+    from .report_worker import ReportWorker
+    from .pipeline_stats import PipelineStats
+
+__all__ = ['ScoringWorker', 'ReportWorker', 'PipelineStats']
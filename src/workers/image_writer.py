@@ -0,0 +1,46 @@
+import queue
+from threading import Thread
+from typing import Any, Callable
+from src.utils import app_logger
+
+class ImageWriter(Thread):
+    """
+    Thread nền chuyên mã hoá & ghi ảnh kết quả xuống đĩa,
+    tách phần I/O ra khỏi vòng lặp xử lý ảnh của ScoringWorker.
+
+    Hàng đợi có giới hạn (max_pending) để tạo back-pressure: nếu đĩa chậm,
+    Worker sẽ chờ thay vì dồn hàng trăm ảnh chưa ghi trong RAM.
+    """
+
+    _STOP = object()
+
+    def __init__(self, max_pending: int = 8):
+        super().__init__(name="ImageWriter")
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max(1, max_pending))
+        self.daemon = True
+
+    @property
+    def pending(self) -> int:
+        """Số tác vụ ghi đang chờ trong hàng đợi."""
+        return self._queue.qsize()
+
+    def submit(self, fn: Callable[..., Any], *args):
+        """Đưa 1 tác vụ ghi vào hàng đợi (block nếu hàng đợi đầy)."""
+        self._queue.put((fn, args))
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception as e:
+                app_logger.error(f"Image writer error: {e}")
+
+    def close(self):
+        """Chờ ghi hết các ảnh còn trong hàng đợi rồi dừng thread."""
+        if self.is_alive():
+            self._queue.put(self._STOP)
+            self.join()
@@ -0,0 +1,109 @@
+import queue
+from threading import Thread
+from typing import Dict, List, Optional
+import numpy as np
+from src.utils import app_logger, tracer
+from src.utils.image_codec import ImageDecodePolicy
+from src.utils.page_source import ContainerReader, PageRef, SheetSource
+from .pipeline_stats import PipelineStats
+
+class LoadedPage:
+    """1 tờ đã đọc + giải mã (hoặc lỗi), chuyển từ PageReader sang ScoringWorker."""
+
+    __slots__ = ('source', 'image', 'decode_factor', 'size_bytes', 'stages', 'error')
+
+    def __init__(self, source: SheetSource, stages: Dict[str, float]):
+        self.source = source
+        self.image: Optional[np.ndarray] = None
+        self.decode_factor = 1
+        self.size_bytes: Optional[int] = None
+        self.stages = stages
+        self.error: Optional[str] = None
+
+    @property
+    def load_seconds(self) -> float:
+        """Tổng thời gian read + decode của tờ (giây)."""
+        return sum(self.stages.values()) / 1000
+
+class PageReader(Thread):
+    """
+    Thread nền đọc + giải mã trước các tờ bài (file ảnh, hoặc từng trang của file TIFF/PDF
+    nhiều trang) cho ScoringWorker, để giải mã chạy chồng lên phần nhận dạng.
+
+    Hàng đợi giới hạn `depth` tờ: bộ nhớ chỉ giữ vài trang đã giải mã, không bao giờ cả xấp.
+    Các trang liên tiếp của cùng 1 file dùng chung 1 ContainerReader (mở file 1 lần).
+    """
+
+    _END = object()
+
+    def __init__(self, sources: List[SheetSource], decode_policy: ImageDecodePolicy,
+                 stats: PipelineStats, depth: int = 2):
+        super().__init__(name="PageReader")
+        self.sources = sources
+        self.decode_policy = decode_policy
+        self.stats = stats
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max(1, depth))
+        self._container: Optional[ContainerReader] = None
+        self.daemon = True
+
+    @property
+    def pending(self) -> int:
+        """Số tờ đã giải mã đang chờ nhận dạng."""
+        return self._queue.qsize()
+
+    def __iter__(self):
+        """Các LoadedPage theo đúng thứ tự danh sách (dùng trên thread của ScoringWorker)."""
+        while True:
+            page = self._queue.get()
+            if page is self._END:
+                return
+            yield page
+
+    def run(self):
+        try:
+            for source in self.sources:
+                self._queue.put(self._load(source))
+        finally:
+            self._close_container()
+            self._queue.put(self._END)
+
+    def _load(self, source: SheetSource) -> LoadedPage:
+        page = LoadedPage(source, {})
+        try:
+            with tracer.sheet(source.name):
+                if isinstance(source, PageRef):
+                    self._load_page(page)
+                else:
+                    # read = I/O thư mục scan, decode = giải mã JPEG (thu nhỏ nếu ảnh quá lớn)
+                    with self.stats.measure('read', page.stages), tracer.span('read'):
+                        stream = np.fromfile(str(source), np.uint8)
+                    page.size_bytes = int(stream.size)
+                    with self.stats.measure('decode', page.stages), tracer.span('decode'):
+                        page.image, page.decode_factor = self.decode_policy.decode(stream)
+            if page.image is None:
+                raise ValueError("Không thể đọc file ảnh (File lỗi hoặc định dạng không hỗ trợ).")
+        except Exception as e:
+            page.image = None
+            page.error = str(e)
+        return page
+
+    def _load_page(self, page: LoadedPage):
+        """1 trang của file TIFF/PDF: JPEG nhúng được giải mã thu nhỏ như file JPEG, còn lại thu nhỏ sau giải mã."""
+        source: PageRef = page.source
+        with self.stats.measure('read', page.stages), tracer.span('read'):
+            if self._container is None or self._container.path != source.container:
+                self._close_container()
+                self._container = ContainerReader(source.container)
+                app_logger.debug("Opened page container: %s", source.container.name)
+        with self.stats.measure('decode', page.stages), tracer.span('decode'):
+            kind, data = self._container.read_page(source.index)
+            if kind == 'encoded':
+                page.size_bytes = len(data)
+                page.image, page.decode_factor = self.decode_policy.decode(np.frombuffer(data, np.uint8))
+            else:
+                page.image, page.decode_factor = self.decode_policy.fit(data)
+
+    def _close_container(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = None
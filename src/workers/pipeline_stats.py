@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+import numpy as np
+
+class PipelineStats:
+    """
+    Số liệu đo đạc của pipeline chấm điểm, cập nhật từ các thread Worker và đọc từ GUI.
+
+    - Thời gian từng giai đoạn (rolling window) -> p50/p95 theo ms.
+    - Tốc độ (tờ/giây) tính trên các tờ hoàn thành gần nhất -> ETA.
+    - Độ sâu các hàng đợi (đọc qua hàm probe, ví dụ ImageWriter.pending).
+
+    Giai đoạn 'read' là thời gian đọc file (thư mục share của máy scan),
+    'save' là thời gian mã hoá + ghi ảnh kết quả (đĩa), 'retry' là thời gian tier robust
+    (chỉ các tờ phải nhận dạng lại). Số tờ theo tier kết quả: tiers / escalated.
+    saves_failed: số tờ chấm được nhưng không ghi được ảnh kết quả.
+    """
+
+    STAGES = ('read', 'decode', 'warp', 'detect', 'retry', 'grade', 'render', 'save')
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Callable[[], int]] = {}
+        self.begin(0)
+
+    def begin(self, total: int):
+        """Bắt đầu 1 lượt chấm mới (xoá số liệu cũ)."""
+        with self._lock:
+            self._samples = {stage: deque(maxlen=self.window) for stage in self.STAGES}
+            self._finish_times = deque(maxlen=self.window)
+            self._queues = {}
+            self.total = total
+            self.done = 0
+            self.failed = 0
+            self.tiers: Dict[str, int] = {}
+            self.escalated = 0
+            self.saves_failed = 0
+            self.started_at = time.perf_counter()
+            self.finished_at: Optional[float] = None
+
+    def add_queue(self, name: str, probe: Callable[[], int]):
+        """Đăng ký 1 hàng đợi để hiển thị độ sâu."""
+        with self._lock:
+            self._queues[name] = probe
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    @contextmanager
+    def measure(self, stage: str, into: Optional[Dict[str, float]] = None):
+        """Đo thời gian 1 khối lệnh và ghi vào giai đoạn tương ứng (into: dict nhận thêm số ms của tờ hiện tại)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.record(stage, elapsed)
+            if into is not None:
+                into[stage] = round(elapsed * 1000, 2)
+
+    def sheet_done(self, success: bool):
+        with self._lock:
+            self.done += 1
+            if not success:
+                self.failed += 1
+            self._finish_times.append(time.perf_counter())
+
+    def tier_used(self, tier: str, escalated: bool):
+        """Ghi nhận tier cho kết quả của 1 tờ (escalated: đã phải chạy tier robust)."""
+        with self._lock:
+            self.tiers[tier] = self.tiers.get(tier, 0) + 1
+            if escalated:
+                self.escalated += 1
+
+    def save_failed(self):
+        """Ghi nhận 1 tờ không ghi được ảnh kết quả (kết quả chấm vẫn giữ)."""
+        with self._lock:
+            self.saves_failed += 1
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.perf_counter()
+
+    def snapshot(self) -> Dict:
+        """Ảnh chụp số liệu hiện tại (an toàn khi gọi từ thread GUI)."""
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+            finish_times = list(self._finish_times)
+            queues = dict(self._queues)
+            total, done, failed = self.total, self.done, self.failed
+            tiers, escalated = dict(self.tiers), self.escalated
+            saves_failed = self.saves_failed
+            end = self.finished_at or time.perf_counter()
+            elapsed = end - self.started_at
+
+        # Tốc độ trên cửa sổ trượt (phản ánh tình trạng hiện tại hơn là trung bình cả lượt)
+        if len(finish_times) >= 2 and finish_times[-1] > finish_times[0]:
+            rate = (len(finish_times) - 1) / (finish_times[-1] - finish_times[0])
+        else:
+            rate = done / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, total - done)
+        eta = remaining / rate if rate > 0 else None
+
+        stages = {}
+        for stage, values in samples.items():
+            if values:
+                p50, p95 = np.percentile(values, [50, 95]) * 1000
+                stages[stage] = (float(p50), float(p95))
+
+        queue_depths = {'files': remaining}
+        for name, probe in queues.items():
+            try:
+                queue_depths[name] = int(probe())
+            except Exception:
+                queue_depths[name] = -1
+
+        return {
+            'total': total, 'done': done, 'failed': failed,
+            'elapsed': elapsed, 'rate': rate, 'eta': eta,
+            'queues': queue_depths, 'stages': stages,
+            'tiers': tiers, 'escalated': escalated,
+            'saves_failed': saves_failed
+        }
+
+    @staticmethod
+    def format_snapshot(snap: Dict) -> str:
+        """Định dạng 2 dòng cho footer GUI / log."""
+        eta = snap['eta']
+        eta_text = "--:--" if eta is None else f"{int(eta // 60)}:{int(eta % 60):02d}"
+        queues = ", ".join(f"{name} {depth}" for name, depth in snap['queues'].items())
+        line1 = (f"{snap['done']}/{snap['total']} sheets | {snap['rate']:.1f} sheets/s | ETA {eta_text} | "
+                 f"failed {snap['failed']} | queues: {queues}")
+        if snap.get('saves_failed'):
+            line1 += f" | not saved {snap['saves_failed']}"
+        if snap.get('escalated'):
+            tiers = ", ".join(f"{tier} {count}" for tier, count in snap['tiers'].items())
+            line1 += f" | escalated {snap['escalated']} (tiers: {tiers})"
+        line2 = "p50/p95 ms: " + "  ".join(
+            f"{stage} {p50:.0f}/{p95:.0f}" for stage, (p50, p95) in snap['stages'].items()
+        )
+        return f"{line1}\n{line2}"
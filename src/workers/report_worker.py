@@ -0,0 +1,85 @@
+from threading import Thread
+from typing import List, TYPE_CHECKING, Optional, Dict, Any
+from pathlib import Path
+
+from src.core import ReportGenerator, OverlayCache
+from src.utils import app_logger
+
+# Xử lý circular import cho type hinting với lớp GUI chính
+if TYPE_CHECKING:
+    from src.ui.app_window import OMRApplication
+
+class ReportWorker(Thread):
+    """
+    Worker Thread chạy ngầm để xuất thẻ điểm hàng loạt.
+    Việc render thực tế được ReportGenerator phân phối lên ProcessPool,
+    thread này chỉ điều phối và báo tiến độ về giao diện.
+
+    export_mode: 'png' (mỗi học viên 1 file), 'pdf' (1 file PDF cho cả lớp) hoặc 'both'.
+    """
+
+    def __init__(self,
+                 gui_app: 'OMRApplication',
+                 results: List[Dict[str, Any]],
+                 max_workers: Optional[int] = None,
+                 overlay_cache: Optional[OverlayCache] = None,
+                 image_source_dir: Optional[Path] = None,
+                 export_mode: str = 'png',
+                 pdf_options: Optional[Dict[str, Any]] = None,
+                 output_cfg: Optional[Dict[str, Any]] = None):
+
+        super().__init__()
+        self.gui_app = gui_app
+        # Snapshot danh sách để người dùng vẫn có thể review trong lúc xuất
+        self.results = list(results)
+        self.max_workers = max_workers
+        self.overlay_cache = overlay_cache
+        self.image_source_dir = image_source_dir
+        self.export_mode = export_mode
+        self.pdf_options = pdf_options or {}
+        self.output_cfg = output_cfg
+        self.daemon = True
+
+    def _on_progress(self, done: int, total: int):
+        # Cập nhật giao diện (Thread-safe Call)
+        self.gui_app.master.after(0, self.gui_app.on_report_progress, done, total)
+
+    def run(self):
+        total = len(self.results)
+        success_count, output_path, error_msg = 0, None, None
+        stats = None
+
+        try:
+            report_gen = ReportGenerator(output_cfg=self.output_cfg)
+            if self.export_mode == 'png':
+                success_count, output_path = report_gen.generate_batch(
+                    self.results,
+                    progress_callback=self._on_progress,
+                    max_workers=self.max_workers,
+                    overlays=self.overlay_cache,
+                    image_source_dir=self.image_source_dir
+                )
+                stats = dict(report_gen.last_batch_stats)
+            else:
+                # 'both': file thẻ được ghi từ chính lần render của trang PDF (mỗi thẻ render 1 lần)
+                with_cards = self.export_mode == 'both'
+                success_count, output_path = report_gen.export_class_pdf(
+                    self.results,
+                    progress_callback=self._on_progress,
+                    max_workers=self.max_workers,
+                    overlays=self.overlay_cache,
+                    image_source_dir=self.image_source_dir,
+                    jpeg_quality=int(self.pdf_options.get('jpeg_quality', 85)),
+                    dpi=int(self.pdf_options.get('dpi', 150)),
+                    with_cards=with_cards
+                )
+                if with_cards and output_path is not None:
+                    stats = dict(report_gen.last_batch_stats)
+                    # Số thẻ có file (gồm cả thẻ không đổi) + thư mục, báo riêng với số trang PDF
+                    stats['cards'] = stats['rendered'] + stats['skipped']
+                    stats['cards_dir'] = str(output_path.parent)
+        except Exception as e:
+            error_msg = str(e)
+            app_logger.error(f"Report worker failed: {error_msg}")
+
+        self.gui_app.master.after(0, self.gui_app.on_reports_complete, success_count, total, output_path, error_msg, stats)
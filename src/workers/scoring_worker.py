@@ -1,13 +1,20 @@
 from threading import Thread
 from typing import List, TYPE_CHECKING, Optional, Dict, Any
 from pathlib import Path
-import cv2
 import numpy as np
+import os
+import threading
 import time
 
 # Import từ các package đã được tái cấu trúc
-from src.core import WarpingProcessor, OMREngine, GradeManager
-from src.utils import app_logger
+from src.core import WarpingProcessor, OMREngine, GradeManager, OverlayCache, BubbleAtlasStore, RobustRecognizer
+from src.core.bubble_atlas import build_atlas
+from src.utils import app_logger, tracer, metrics_log
+from src.utils.image_codec import ImageDecodePolicy
+from src.utils.page_source import SheetSource
+from .image_writer import ImageWriter
+from .page_reader import LoadedPage, PageReader
+from .pipeline_stats import PipelineStats
 
 # Xử lý circular import cho type hinting với lớp GUI chính
 if TYPE_CHECKING:
@@ -21,21 +28,38 @@ class ScoringWorker(Thread):
 
     def __init__(self, 
                  gui_app: 'OMRApplication', 
-                 image_files: List[Path], 
+                 image_files: List[SheetSource], 
                  warp_processor: WarpingProcessor, 
                  omr_engine: OMREngine, 
                  grade_manager: GradeManager,
                  answer_key: str, 
-                 result_dir: Path):
+                 result_dir: Path,
+                 overlay_cache: Optional[OverlayCache] = None,
+                 async_write: bool = True,
+                 stats: Optional[PipelineStats] = None,
+                 atlas_store: Optional[BubbleAtlasStore] = None):
         
         super().__init__()
         self.gui_app = gui_app
         self.image_files = image_files
         self.warp_processor = warp_processor
         self.omr_engine = omr_engine
+        # Tier robust: chỉ chạy lại khi tier nhanh lỗi hoặc độ tin cậy thấp
+        self.robust = RobustRecognizer(warp_processor, omr_engine, omr_engine.config)
+        # Giải mã thu nhỏ ảnh quá lớn so với ảnh warp (ảnh chụp điện thoại)
+        self.decode_policy = ImageDecodePolicy.from_config(omr_engine.config)
+        # Số tờ được đọc + giải mã trước trên thread PageReader
+        self.prefetch = int(omr_engine.config.get('decode', {}).get('prefetch', 2))
         self.grade_manager = grade_manager
         self.answer_key = answer_key
         self.result_dir = result_dir
+        self.overlay_cache = overlay_cache
+        # Mã hoá & ghi ảnh kết quả trên thread riêng (None nếu ghi đồng bộ)
+        self.image_writer: Optional[ImageWriter] = ImageWriter() if async_write else None
+        # Số liệu đo đạc (GUI đọc định kỳ để hiển thị tốc độ & độ trễ từng giai đoạn)
+        self.stats = stats or PipelineStats()
+        # Ảnh cắt các câu cần review (Review Queue của cả phiên)
+        self.atlas_store = atlas_store
         
         # Đặt thread là daemon để nó tự động tắt khi chương trình chính tắt
         self.daemon = True 
@@ -43,65 +67,204 @@ class ScoringWorker(Thread):
     def run(self):
         """
         Hàm chính thực thi khi thread bắt đầu (.start()).
-        Chạy quá trình chấm điểm tuần tự cho từng file.
+        Chạy quá trình chấm điểm tuần tự cho từng tờ (file ảnh hoặc trang của file TIFF/PDF);
+        đọc + giải mã chạy trước trên thread PageReader.
         """
         total_files = len(self.image_files)
         app_logger.info(f"Worker started. Processing {total_files} files...")
         
         start_time = time.time()
         success_count = 0
+        self.stats.begin(total_files)
+        if self.image_writer is not None:
+            self.stats.add_queue('write', lambda: self.image_writer.pending)
+            self.image_writer.start()
+        reader = PageReader(self.image_files, self.decode_policy, self.stats, depth=self.prefetch)
+        self.stats.add_queue('decoded', lambda: reader.pending)
+        reader.start()
         
-        for index, img_path in enumerate(self.image_files):
+        for index, page in enumerate(reader):
+            img_path = page.source
             result_dict = None
             error_msg = None
             base_name = img_path.stem
+            # Bản ghi metrics của tờ này (ghi khi xong, hoặc sau khi lưu ảnh nếu ghi ở thread nền)
+            metrics = self._new_metrics(page)
+            stages = metrics['stages']
+            pending_save = None
+            save_error = None
             
-            try:
-                file_start_time = time.perf_counter()
-                app_logger.debug(f"[{index+1}/{total_files}] Processing: {img_path.name}")
+            with tracer.sheet(img_path.name):
+                try:
+                    file_start_time = time.perf_counter()
+                    app_logger.debug("[%d/%d] Processing: %s", index + 1, total_files, img_path.name)
                 
-                # 1. Đọc ảnh
-                stream = np.fromfile(str(img_path), np.uint8)
-                img_bgr = cv2.imdecode(stream, cv2.IMREAD_UNCHANGED)
-                
-                if img_bgr is None:
-                    raise ValueError("Không thể đọc file ảnh (File lỗi hoặc định dạng không hỗ trợ).")
+                    # 1. Ảnh đã được PageReader đọc + giải mã (read / decode đo ở thread đó)
+                    if page.error is not None:
+                        raise ValueError(page.error)
+                    img_bgr = page.image
+                    page.image = None
+                    tracer.annotate(width=img_bgr.shape[1], height=img_bgr.shape[0], decode_factor=page.decode_factor)
+                    metrics['height'], metrics['width'] = img_bgr.shape[:2]
+                    metrics['decode_factor'] = page.decode_factor
 
-                # 2. Xử lý Warping (Căn chỉnh)
-                img_warped_bgr, img_warped_binary, img_warped_marker = self.warp_processor.process_warping(img_bgr)
-                
-                # 3. Xử lý OMR (Quét đáp án)
-                answers_list, image_with_grid, conf_stats = self.omr_engine.process_omr(
-                    self.answer_key,
-                    img_warped_marker,
-                    img_warped_binary, 
-                    img_warped_bgr
-                )
-
-                # 4. Chấm điểm
-                parts_stats = self.grade_manager.grade_answers(answers_list)
-
-                # 5. Lưu ảnh kết quả & Format dữ liệu
-                # Lưu ảnh có vẽ lưới chấm điểm để đối chiếu
-                self.grade_manager.save_result_image(base_name, image_with_grid, self.result_dir)
+                    # 2-3. Warping (căn chỉnh) + quét đáp án, tier robust nếu tier nhanh lỗi / kém tin cậy
+                    img_warped_bgr, detection, answers_list, conf_stats, tier, escalated = self._recognize(img_bgr, stages)
+                    metrics['tier'] = tier
+                    metrics['escalated'] = escalated
+                    self.stats.tier_used(tier, escalated)
+                    metrics['avg_conf'] = round(conf_stats['confidence'], 4)
+                    metrics['min_conf'] = round(conf_stats['lowest_conf'], 4)
+                    with self.stats.measure('render', stages):
+                        image_with_grid = self.omr_engine.render_overlay(self.answer_key, detection, img_warped_bgr)
+                        if self.atlas_store is not None:
+                            self.atlas_store.put(build_atlas(base_name, detection, img_warped_bgr, answers_list,
+                                                             conf_stats['confidences_list'],
+                                                             self.omr_engine.config.get('conf_threshold', 0.3)))
+
+                    # 4. Chấm điểm
+                    with self.stats.measure('grade', stages):
+                        parts_stats = self.grade_manager.grade_answers(answers_list)
+                    metrics['total'] = parts_stats.get('Total')
+
+                    # 5. Lưu ảnh kết quả & Format dữ liệu
+                    # Lưu ảnh có vẽ lưới chấm điểm để đối chiếu (mã hoá/ghi ở thread nền nếu bật,
+                    # gửi sau khi chốt bản ghi metrics của tờ)
+                    if self.image_writer is not None:
+                        pending_save = (base_name, image_with_grid, tracer.current_context())
+                    else:
+                        save_error = self._save_result_image(base_name, image_with_grid, stages=stages)
+                    # Giữ ảnh trong bộ nhớ để xuất báo cáo không phải đọc lại PNG
+                    if self.overlay_cache is not None:
+                        self.overlay_cache.put(base_name, image_with_grid)
                 
-                file_end_time = time.perf_counter()
-                process_duration = file_end_time - file_start_time
+                    file_end_time = time.perf_counter()
+                    process_duration = file_end_time - file_start_time + page.load_seconds
                 
-                # Tạo dict kết quả để hiển thị lên bảng
-                result_dict = self.grade_manager.format_result(base_name, parts_stats, answers_list, conf_stats, process_duration)
+                    # Tạo dict kết quả để hiển thị lên bảng
+                    result_dict = self.grade_manager.format_result(base_name, parts_stats, answers_list, conf_stats, process_duration)
                 
-                success_count += 1
+                    success_count += 1
             
-            except Exception as e:
-                error_msg = str(e)
-                app_logger.error(f"Error processing {img_path.name}: {error_msg}")
+                except Exception as e:
+                    error_msg = str(e)
+                    app_logger.error(f"Error processing {img_path.name}: {error_msg}")
+
+            self.stats.sheet_done(result_dict is not None)
+            self._finish_metrics(metrics, error_msg or save_error)
             
-            # Cập nhật giao diện (Thread-safe Call)
-            self.gui_app.master.after(0, self.gui_app.on_file_graded, img_path, result_dict, error_msg)
+            # Cập nhật giao diện (Thread-safe Call); tờ chấm được nhưng lỗi ghi ảnh vẫn giữ kết quả
+            self.gui_app.master.after(0, self.gui_app.on_file_graded, img_path, result_dict, error_msg or save_error)
 
+            if pending_save is not None:
+                # Bản ghi metrics được ghi ở thread nền sau khi lưu xong ảnh (kèm thời gian save / lỗi ghi).
+                # Gửi sau on_file_graded để trạng thái lỗi ghi (nếu có) hiển thị đè lên "Done"
+                self.image_writer.submit(self._write_result_image, img_path, result_dict, metrics, *pending_save)
+            else:
+                metrics_log.record(**metrics)
+
+        # Đợi ghi xong toàn bộ ảnh trước khi báo hoàn tất (Review cần đọc file)
+        if self.image_writer is not None:
+            self.image_writer.close()
+
+        self.stats.finish()
+        metrics_log.flush()
         elapsed_time = time.time() - start_time
-        app_logger.info(f"Worker finished. Success: {success_count}/{total_files}. Time: {elapsed_time:.2f}s")
+        app_logger.info(f"Worker finished. Success: {success_count}/{total_files}. "
+                        f"Result images not saved: {self.stats.saves_failed}. Time: {elapsed_time:.2f}s")
+        app_logger.info(f"Pipeline stats:\n{PipelineStats.format_snapshot(self.stats.snapshot())}")
+        if tracer.enabled:
+            trace_path = tracer.export()
+            app_logger.info(f"Trace exported: {trace_path}")
         
         # Thông báo hoàn tất quy trình
-        self.gui_app.master.after(0, self.gui_app.on_scoring_complete)
\ No newline at end of file
+        self.gui_app.master.after(0, self.gui_app.on_scoring_complete)
+
+    def _recognize(self, img_bgr: np.ndarray, stages: Dict[str, float]):
+        """
+        Nhận dạng 2 tầng. Tier 'fast' (pipeline cũ) chạy trước; lỗi hoặc độ tin cậy trung bình
+        dưới conf_floor -> chạy tier robust (giai đoạn 'retry'), giữ kết quả tốt hơn.
+        Trả về (img_warped_bgr, detection, answers, conf_stats, tier, escalated).
+        """
+        fast, fast_error = None, None
+        try:
+            with self.stats.measure('warp', stages):
+                img_warped_bgr, img_warped_binary, img_warped_marker = self.warp_processor.process_warping(img_bgr)
+            with self.stats.measure('detect', stages):
+                detection = self.omr_engine.detect(img_warped_marker, img_warped_binary)
+                answers_list, conf_stats = self.omr_engine.summarize(detection)
+            fast = (img_warped_bgr, detection, answers_list, conf_stats)
+            if not self.robust.needs_retry(conf_stats):
+                return (*fast, 'fast', False)
+        except Exception as e:
+            if not self.robust.enabled:
+                raise
+            fast_error = e
+
+        app_logger.debug("Escalating to robust tier (%s)",
+                         fast_error if fast_error is not None else f"avg conf {fast[3]['confidence']:.3f}")
+        with self.stats.measure('retry', stages):
+            robust = self.robust.recognize(img_bgr, fast[3]['confidence'] if fast is not None else -1.0)
+        if robust is not None:
+            label, warped, detection, answers_list, conf_stats = robust
+            app_logger.debug("Robust tier '%s' accepted (avg conf %.3f)", label, conf_stats['confidence'])
+            return warped[0], detection, answers_list, conf_stats, f"robust:{label}", True
+        if fast is None:
+            raise fast_error
+        return (*fast, 'fast', True)
+
+    def _save_result_image(self, base_name: str, image_with_grid: np.ndarray, trace_ctx: Optional[Dict[str, Any]] = None,
+                           stages: Optional[Dict[str, float]] = None) -> Optional[str]:
+        """
+        Mã hoá + ghi ảnh kết quả, đo thời gian giai đoạn 'save' (trace_ctx: ngữ cảnh tờ bài khi ghi ở thread nền).
+        Trả về thông báo lỗi nếu không ghi được (đã tính vào PipelineStats.saves_failed), None nếu thành công.
+        """
+        try:
+            with self.stats.measure('save', stages), tracer.attach(trace_ctx):
+                saved = self.grade_manager.save_result_image(base_name, image_with_grid, self.result_dir)
+            error = None if saved else "save: không ghi được ảnh kết quả"
+        except Exception as e:
+            error = f"save: {e}"
+        if error is not None:
+            self.stats.save_failed()
+            app_logger.error(f"Result image not saved for {base_name}: {error}")
+        return error
+
+    def _write_result_image(self, img_path: Path, result_dict: Dict[str, Any], metrics: Dict[str, Any],
+                            base_name: str, image_with_grid: np.ndarray, trace_ctx: Optional[Dict[str, Any]]):
+        """
+        Tác vụ của ImageWriter: lưu ảnh kết quả rồi ghi bản ghi metrics của tờ.
+        Lỗi ghi -> đánh dấu bản ghi metrics là lỗi và cập nhật lại dòng của tờ trên giao diện.
+        """
+        try:
+            error = self._save_result_image(base_name, image_with_grid, trace_ctx, metrics['stages'])
+            if error is not None:
+                metrics['ok'] = False
+                metrics['error'] = error
+                self.gui_app.master.after(0, self.gui_app.on_result_image_failed, img_path, result_dict, error)
+        finally:
+            metrics_log.record(**metrics)
+
+    def _new_metrics(self, page: LoadedPage) -> Dict[str, Any]:
+        """Khởi tạo bản ghi metrics cho 1 tờ bài (kèm thời gian read/decode đã đo ở PageReader)."""
+        # Xoá số marker của tờ trước (tờ lỗi sớm sẽ ghi 0 thay vì số cũ)
+        self.warp_processor.last_marker_count = 0
+        self.omr_engine.last_mark_counts = {'top': 0, 'left': 0}
+        return {
+            'session': self.result_dir.name,
+            'file': page.source.name,
+            'size_bytes': page.size_bytes,
+            'width': None, 'height': None,
+            'stages': dict(page.stages),
+            'worker': f"{os.getpid()}:{threading.current_thread().name}",
+            '_start': time.perf_counter() - page.load_seconds
+        }
+
+    def _finish_metrics(self, metrics: Dict[str, Any], error_msg: Optional[str]):
+        """Bổ sung số marker, lỗi, tổng thời gian vào bản ghi metrics sau khi xử lý xong tờ."""
+        metrics['duration_ms'] = round((time.perf_counter() - metrics.pop('_start')) * 1000, 2)
+        metrics['markers'] = self.warp_processor.last_marker_count
+        metrics['top_marks'] = self.omr_engine.last_mark_counts['top']
+        metrics['left_marks'] = self.omr_engine.last_mark_counts['left']
+        metrics['ok'] = error_msg is None
+        metrics['error'] = error_msg